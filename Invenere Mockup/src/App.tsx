@@ -9,6 +9,27 @@ interface SearchResult {
   relevance: number;
 }
 
+interface ApiResult {
+  text: string;
+  source: string;
+  metadata: { heading?: string | null };
+  relevance: number;
+}
+
+// Invenere search service (Invenere_Rag/serve.py)
+const API_URL = import.meta.env.VITE_INVENERE_API_URL ?? 'http://localhost:8000';
+
+const toSearchResult = (result: ApiResult): SearchResult => {
+  const parts = result.source.split(/[\\/]/);
+  return {
+    title: result.metadata.heading || parts[parts.length - 1],
+    description: result.text.length > 300 ? `${result.text.slice(0, 300)}…` : result.text,
+    url: `file://${result.source}`,
+    context: parts.slice(0, -1).join('/') || result.source,
+    relevance: result.relevance
+  };
+};
+
 function App() {
   const [searchQuery, setSearchQuery] = useState('');
   const [context, setContext] = useState<string[]>([]);
@@ -25,37 +46,26 @@ function App() {
     ]);
   }, []);
 
-  const handleSearch = (e: React.FormEvent) => {
+  const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
+    if (!searchQuery.trim()) return;
     setIsSearching(true);
-    // Simulate search delay and results
-    setTimeout(() => {
-      setSearchResults([
-        {
-          title: "React Hooks Documentation",
-          description: "Comprehensive guide to React Hooks including useState, useEffect, and custom hooks implementation. Learn best practices and common patterns.",
-          url: "https://react.dev/reference/react",
-          context: "React Documentation",
-          relevance: 0.95
-        },
-        {
-          title: "TypeScript Interface Guidelines",
-          description: "Learn how to properly define and use TypeScript interfaces. Includes examples of generic types and utility types.",
-          url: "https://www.typescript.org/docs",
-          context: "TypeScript Guidelines",
-          relevance: 0.88
-        },
-        {
-          title: "Project Configuration",
-          description: "Current project setup including Vite configuration, ESLint rules, and TypeScript compiler options.",
-          url: "/config",
-          context: "Current Project Files",
-          relevance: 0.82
-        }
-      ]);
+    try {
+      const response = await fetch(`${API_URL}/search`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query: searchQuery })
+      });
+      if (!response.ok) throw new Error(`Search failed: ${response.status}`);
+      const data: { results: ApiResult[] } = await response.json();
+      setSearchResults(data.results.map(toSearchResult));
+    } catch (error) {
+      console.error(error);
+      setSearchResults([]);
+    } finally {
       setIsSearching(false);
       setShowResults(true);
-    }, 1000);
+    }
   };
 
   return (
@@ -1,27 +1,36 @@
+import os
+
 import streamlit as st
+from rag_engine.llama_interface import LLM_ERRORS
+from rag_engine.memory import ConversationMemory, make_summarizer
 from rag_engine.rag_pipeline import RAGPipeline
 
 st.title("Invenere: Smart Enterprise Search")
 
 @st.cache_resource
 def load_pipeline():
-    return RAGPipeline()
+    # $INVENERE_TOKENIZER: Hugging Face tokenizer matching the LLM, for exact prompt budgets
+    return RAGPipeline(read_only=True, answer_cache=True, tokenizer_name=os.environ.get("INVENERE_TOKENIZER"))
 
 pipeline = load_pipeline()
 
-if "history" not in st.session_state:
-    st.session_state.history = []
+# Per session: a token-bounded window of turns plus a rolling summary of older ones
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(summarize=make_summarizer(pipeline.llm.generate))
+memory = st.session_state.memory
 
 query = st.text_input("Ask your question:")
 
 if st.button("Search") and query:
-    # Use conversation history if desired
-    answer, sources = pipeline.query(query, return_sources=True, history=st.session_state.history)
-
-    st.session_state.history.append((query, answer, sources))
+    tokens, sources = pipeline.query(query, return_sources=True, memory=memory, stream=True)
 
     st.write("### 🧠 LLaMA's Response")
-    st.write(answer)
+    try:
+        answer = st.write_stream(tokens)
+    except LLM_ERRORS as e:
+        st.error(f"❌ Error querying LLaMA: {e}")
+    else:
+        memory.add(query, answer, sources)
 
     st.write("### 📄 Source files used")
     for src in sources:
@@ -30,9 +39,9 @@ if st.button("Search") and query:
         else:
             st.markdown(f"- `{src}`")
 
-if st.session_state.history:
+if memory:
     st.write("## Previous Q&A")
-    for q, a, s in st.session_state.history[::-1]:
+    for q, a, s in memory.turns[::-1]:
         st.markdown(f"**Q:** {q}\n\n**A:** {a}")
         st.markdown("**Sources:**")
         for src in s:
@@ -40,3 +49,5 @@ if st.session_state.history:
                 st.markdown(f"- `{src.get('source', 'Unknown')}`")
             else:
                 st.markdown(f"- `{src}`")
+    if memory.summary:
+        st.markdown(f"**Earlier in this conversation:** {memory.summary}")
@@ -0,0 +1,133 @@
+# benchmarks/bench_chunker.py
+"""
+MB/s of the previous robust_chunker (copied below as legacy_robust_chunker)
+versus the current rag_engine.chunker, on synthetic documents with and
+without headings. Also reports chunk counts and the largest chunk in
+estimated tokens, since the legacy heading path had no size limit.
+
+The legacy function calls nltk.download on every document; pass
+--no-download to time only the chunking itself.
+
+Run from Invenere_Rag/:  python -m benchmarks.bench_chunker --docs 200 --sections 12
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+
+import nltk
+
+from benchmarks.synthetic import document
+from rag_engine.chunker import robust_chunker
+from rag_engine.context_builder import approximate_tokens
+
+def legacy_robust_chunker(
+    text: str,
+    max_length: int = 350,
+    overlap: int = 50,
+    heading_regex: str = r"(Section \d+|^# |\n\d+\.\s)"
+) -> List[Dict]:
+    """robust_chunker as it was before the rewrite, unchanged."""
+    chunks = []
+    used_headings = False
+
+    headings = [m.start() for m in re.finditer(heading_regex, text, re.MULTILINE)]
+    if len(headings) > 1:
+        used_headings = True
+        for i, start in enumerate(headings):
+            end = headings[i + 1] if i + 1 < len(headings) else len(text)
+            chunk_text = text[start:end].strip()
+            heading_lines = [l for l in chunk_text.splitlines() if l.strip()]
+            heading = heading_lines[0] if heading_lines else ""
+            chunks.append({
+                "text": chunk_text,
+                "metadata": {
+                    "heading": heading,
+                    "chunk_start": start,
+                    "chunk_end": end,
+                    "chunk_type": "heading"
+                }
+            })
+        return chunks
+
+    try:
+        import nltk
+        nltk.download('punkt', quiet=True)
+        from nltk.tokenize import sent_tokenize
+        sentences = sent_tokenize(text)
+        chunk = ""
+        sent_idx = 0
+        while sent_idx < len(sentences):
+            chunk_start_idx = sent_idx
+            chunk = sentences[sent_idx]
+            sent_idx += 1
+            while sent_idx < len(sentences) and len(chunk) + len(sentences[sent_idx]) < max_length:
+                chunk += " " + sentences[sent_idx]
+                sent_idx += 1
+            overlap_idx = max(0, sent_idx - overlap // 20)
+            chunks.append({
+                "text": chunk.strip(),
+                "metadata": {
+                    "heading": None,
+                    "chunk_start_sentence": chunk_start_idx,
+                    "chunk_end_sentence": sent_idx - 1,
+                    "chunk_type": "sentence"
+                }
+            })
+        if chunks:
+            return chunks
+    except Exception as e:
+        print("Sentence-based chunking failed:", e)
+
+    i = 0
+    n = len(text)
+    while i < n:
+        chunk_text = text[i:i + max_length]
+        chunks.append({
+            "text": chunk_text.strip(),
+            "metadata": {
+                "heading": None,
+                "chunk_start": i,
+                "chunk_end": min(i + max_length, n),
+                "chunk_type": "window"
+            }
+        })
+        i += max_length - overlap
+    return chunks
+
+def run(label, chunker, docs):
+    megabytes = sum(len(d.encode("utf-8")) for d in docs) / 1e6
+    start = time.perf_counter()
+    chunks = [c for d in docs for c in chunker(d)]
+    elapsed = time.perf_counter() - start
+    largest = max(approximate_tokens(c["text"]) for c in chunks)
+    print(f"{label:<28} {elapsed:8.2f}s {megabytes / elapsed:8.2f} MB/s "
+          f"{len(chunks):8d} chunks  max {largest} tokens")
+    return megabytes / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-download", action="store_true",
+                        help="Make nltk.download a no-op so the legacy path times chunking only")
+    args = parser.parse_args()
+
+    if args.no_download:
+        nltk.download = lambda *a, **k: False
+
+    for with_headings in (True, False):
+        rng = random.Random(args.seed)
+        docs = [document(rng, args.sections, with_headings) for _ in range(args.docs)]
+        size = sum(map(len, docs)) / 1e6
+        print(f"\n{'headings' if with_headings else 'plain text'}: {len(docs)} docs, {size:.1f} MB")
+        robust_chunker("Warm up. Loads the sentence splitter.")
+        legacy = run("legacy robust_chunker", legacy_robust_chunker, docs)
+        current = run("robust_chunker", robust_chunker, docs)
+        print(f"{'':<28} speedup x{current / legacy:.2f}")
+
+if __name__ == "__main__":
+    main()
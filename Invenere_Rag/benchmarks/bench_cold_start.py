@@ -0,0 +1,184 @@
+# benchmarks/bench_cold_start.py
+"""
+Cold start of a query process, each case in a fresh interpreter:
+
+- import: wall time of `import X` for rag_engine.rag_pipeline and the heavy
+  libraries it (no longer) pulls in at import;
+- lazy / preload / warm: process start until RAGPipeline(read_only=True) is
+  built, then the first and second retrieve(). lazy loads models on first
+  use, preload at construction, warm preloads from the local safetensors
+  copies in --model-dir (written by save_models.py when missing);
+- fork: one parent preloads and freezes the models, then forks --workers
+  children that each answer a query. Their private memory (USS) against a
+  separately started process shows what copy-on-write sharing saves.
+
+Run from Invenere_Rag/:
+    python -m benchmarks.bench_cold_start --model-dir /tmp/invenere_models --workers 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+IMPORTS = ("rag_engine.rag_pipeline", "sentence_transformers", "chromadb", "langchain", "nltk")
+QUERIES = ("how is the index configured", "which file formats are supported")
+
+def memory_mb() -> dict:
+    """RSS, PSS and private (USS) memory of this process, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(fields.get("Rss", 0.0)),
+        "pss_mb": round(fields.get("Pss", 0.0)),
+        "uss_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)),
+    }
+
+BUILD = r"""
+import json, sys
+from rag_engine.rag_pipeline import RAGPipeline
+persist_dir, n_docs = sys.argv[1], int(sys.argv[2])
+pipeline = RAGPipeline(persist_dir=persist_dir)
+topics = ["index configuration", "file formats", "vector search", "reranking", "sharding", "filters"]
+pipeline.index_documents([
+    (f"/bench/doc_{i}.txt", f"Document {i} explains {topics[i % len(topics)]} in detail, part {i}.",
+     {"source": f"/bench/doc_{i}.txt", "chunk_index": "0"})
+    for i in range(n_docs)
+])
+print(json.dumps({"chunks": pipeline.vector_store.count()}))
+"""
+
+START = r"""
+import json, sys, time
+started = time.perf_counter()
+from rag_engine.rag_pipeline import RAGPipeline
+imported = time.perf_counter()
+pipeline = RAGPipeline(read_only=True, persist_dir=sys.argv[1], preload=sys.argv[2] == "1")
+built = time.perf_counter()
+pipeline.retrieve(sys.argv[3])
+first = time.perf_counter()
+pipeline.retrieve(sys.argv[4])
+second = time.perf_counter()
+from benchmarks.bench_cold_start import memory_mb
+print(json.dumps({
+    "import_s": imported - started, "construct_s": built - imported,
+    "first_query_s": first - built, "second_query_s": second - first, **memory_mb()
+}))
+"""
+
+FORK = r"""
+import json, os, sys, time
+from rag_engine.rag_pipeline import RAGPipeline, preload_models
+from benchmarks.bench_cold_start import memory_mb
+persist_dir, workers = sys.argv[1], int(sys.argv[2])
+preload_models(freeze=True)
+children = []
+for w in range(workers):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        started = time.perf_counter()
+        pipeline = RAGPipeline(read_only=True, persist_dir=persist_dir)
+        pipeline.retrieve(sys.argv[3])
+        result = {"ready_and_first_query_s": time.perf_counter() - started, **memory_mb()}
+        os.write(write, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write)
+    children.append((pid, read))
+results = []
+for pid, read in children:
+    with os.fdopen(read) as f:
+        results.append(json.loads(f.read()))
+    os.waitpid(pid, 0)
+print(json.dumps({"parent": memory_mb(), "workers": results}))
+"""
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(script, *args, env=None, cwd=REPO):
+    """
+    Runs script in a fresh interpreter. cwd is where relative paths (the
+    embedding cache) end up; the repo stays importable from anywhere.
+    """
+    env = dict(env or os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO, env.get("PYTHONPATH")]))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", script, *map(str, args)],
+        capture_output=True, text=True, env=env, cwd=cwd
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr[-2000:])
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    output["process_s"] = time.perf_counter() - started
+    return output
+
+def import_seconds(module: str):
+    try:
+        return run(f"import time; s = time.perf_counter(); import {module}; "
+                   f"import json; print(json.dumps({{'s': time.perf_counter() - s}}))")["s"]
+    except RuntimeError:
+        return None  # Not installed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-dir", default=None, help="Local model copies for the warm case (saved if missing)")
+    parser.add_argument("--work-dir", default="/tmp/bench_cold_start")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = {"imports": {}, "starts": {}}
+    for module in IMPORTS:
+        seconds = import_seconds(module)
+        results["imports"][module] = None if seconds is None else round(seconds, 3)
+        print(f"import {module:<24} " + ("not installed" if seconds is None else f"{seconds:6.2f}s"))
+
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    persist_dir = os.path.join(args.work_dir, "store")
+    os.makedirs(persist_dir)
+    run(BUILD, persist_dir, args.docs, cwd=args.work_dir)
+
+    env = dict(os.environ)
+    env.pop("INVENERE_MODEL_DIR", None)
+    cases = [("lazy", "0", env), ("preload", "1", env)]
+    if args.model_dir:
+        if not os.path.isdir(args.model_dir):
+            subprocess.run([sys.executable, "save_models.py", args.model_dir], check=True, env=env, cwd=REPO)
+        cases.append(("warm", "1", dict(env, INVENERE_MODEL_DIR=args.model_dir)))
+    for name, preload, case_env in cases:
+        # Own directory, so no case finds the queries in another's embedding cache
+        case_dir = os.path.join(args.work_dir, name)
+        os.makedirs(case_dir)
+        r = run(START, persist_dir, preload, *QUERIES, env=case_env, cwd=case_dir)
+        results["starts"][name] = {k: round(v, 3) if isinstance(v, float) else v for k, v in r.items()}
+        ready = r["import_s"] + r["construct_s"]
+        print(f"{name:<8} ready {ready:6.2f}s  first query {r['first_query_s']:6.2f}s  "
+              f"second {r['second_query_s'] * 1000:7.1f}ms  process {r['process_s']:6.2f}s  "
+              f"RSS {r['rss_mb']:5d} MB  USS {r['uss_mb']:5d} MB")
+
+    fork_dir = os.path.join(args.work_dir, "fork")
+    os.makedirs(fork_dir)
+    forked = run(FORK, persist_dir, args.workers, QUERIES[0], env=env, cwd=fork_dir)
+    results["fork"] = forked
+    uss = [w["uss_mb"] for w in forked["workers"]]
+    separate = results["starts"]["preload"]["uss_mb"]
+    print(f"fork     {args.workers} workers: USS per worker {min(uss)}-{max(uss)} MB "
+          f"(separate process {separate} MB), parent RSS {forked['parent']['rss_mb']} MB; "
+          f"{args.workers} workers total {forked['parent']['rss_mb'] + sum(uss)} MB "
+          f"vs {args.workers * results['starts']['preload']['rss_mb']} MB separately")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_embedding.py
+"""
+Chunks/sec of the plain SentenceTransformer.encode path versus
+Embedder.embed_bulk (length-bucketed, optionally multi-process).
+The embedding cache is disabled so every run measures the model.
+
+Run from Invenere_Rag/:  python -m benchmarks.bench_embedding --chunks 5000 --workers 1 4
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import mixed_length_chunks
+from rag_engine.embedder import Embedder
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.2f}s {n / elapsed:10.1f} chunks/sec")
+    return n / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--token-budget", type=int, default=16384)
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--onnx-file", default=None)
+    args = parser.parse_args()
+
+    chunks = mixed_length_chunks(args.chunks)
+    print(f"{len(chunks)} chunks, {sum(map(len, chunks)) / len(chunks):.0f} chars avg")
+
+    baseline = Embedder(cache_dir=None)
+    # Warm up so model load and first-call overhead are not measured
+    baseline.model.encode(chunks[:64], show_progress_bar=False)
+    base_rate = timed(
+        "current path (encode, input order)",
+        lambda: baseline.model.encode(chunks, convert_to_numpy=True, show_progress_bar=False),
+        len(chunks)
+    )
+
+    for workers in args.workers:
+        embedder = Embedder(cache_dir=None, workers=workers, backend=args.backend, onnx_file=args.onnx_file)
+        embedder.embed_bulk(chunks[:64 * workers], token_budget=args.token_budget)  # Starts and warms the pool
+        rate = timed(
+            f"embed_bulk ({args.backend}, {workers} worker(s))",
+            lambda: embedder.embed_bulk(chunks, token_budget=args.token_budget),
+            len(chunks)
+        )
+        print(f"{'':<40} speedup x{rate / base_rate:.2f}")
+        embedder.close()
+
+if __name__ == "__main__":
+    main()
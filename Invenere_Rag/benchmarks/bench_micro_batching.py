@@ -0,0 +1,73 @@
+# benchmarks/bench_micro_batching.py
+"""
+Query embedding + reranking throughput with and without micro-batching at
+1, 8 and 64 concurrent clients. Each client loops: embed one query, rerank
+10 passages for it (the per-request model work of RAGPipeline.retrieve).
+Caches are disabled/bypassed so every request reaches the models.
+
+Run from Invenere_Rag/:  python -m benchmarks.bench_micro_batching --window-ms 5
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.load_test import percentile
+from benchmarks.synthetic import mixed_length_chunks, sentence
+from rag_engine.embedder import Embedder
+from rag_engine.reranker import Reranker
+
+def run(embedder, reranker, clients, requests_per_client, passages, seed=0):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(n):
+        rng = random.Random(seed + n)
+        for _ in range(requests_per_client):
+            query = sentence(rng, 4, 10)  # Fresh text, so no cache hits
+            start = time.perf_counter()
+            embedder.embed_query(query)
+            reranker.rerank(query, rng.sample(passages, 10), top_n=5)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, percentile(latencies, 50), percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--requests", type=int, default=400, help="Total requests per run")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--embed-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    args = parser.parse_args()
+
+    passages = [(text, {}) for text in mixed_length_chunks(500, seed=1)]
+    setups = {
+        "per-request": (
+            Embedder(args.embed_model, cache_dir=None),
+            Reranker(args.rerank_model, cache_size=0, min_dense_score=None),
+        ),
+        f"micro-batched ({args.window_ms:g}ms)": (
+            Embedder(args.embed_model, cache_dir=None, micro_batch_ms=args.window_ms),
+            Reranker(args.rerank_model, cache_size=0, min_dense_score=None, micro_batch_ms=args.window_ms),
+        ),
+    }
+    for embedder, reranker in setups.values():
+        run(embedder, reranker, 4, 5, passages)  # Warm-up
+
+    for clients in args.clients:
+        for label, (embedder, reranker) in setups.items():
+            qps, p50, p99 = run(embedder, reranker, clients, max(1, args.requests // clients), passages)
+            print(f"clients={clients:<3} {label:<24} {qps:8.1f} req/s  p50={p50:7.1f}ms  p99={p99:7.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_sharding.py
+"""
+Hybrid search latency and indexing throughput of one VectorStore against
+ShardedVectorStore with N worker processes, as the corpus grows.
+
+Chunks are synthetic (clustered unit vectors from bench_vector_backends,
+text drawn from a Zipf vocabulary so BM25 postings have realistic skew);
+queries pair a vector with three vocabulary words.
+
+Run from Invenere_Rag/:
+    python -m benchmarks.bench_sharding --sizes 50000 200000 --shards 4 --backend quantized
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from benchmarks.bench_vector_backends import vector_block
+from rag_engine.sharded_store import ShardedVectorStore
+from rag_engine.vector_store import VectorStore
+
+BLOCK = 20_000
+
+def chunk_texts(seed: int, start: int, n: int, vocabulary: int = 50_000, words: int = 60):
+    rng = np.random.default_rng([seed, start, 1])
+    ranks = np.minimum(rng.zipf(1.2, size=(n, words)), vocabulary)
+    return [" ".join(f"t{r}" for r in row) for row in ranks]
+
+def fill(store, size: int, dim: int, seed: int) -> float:
+    """Adds chunks up to size; returns chunks/s."""
+    start_time = time.perf_counter()
+    done = store.count()
+    for start in range(done, size, BLOCK):
+        n = min(BLOCK, size - start)
+        store.add_bulk(
+            [f"/bench/dir{(start + i) % 7}/doc_{(start + i) // 20}.txt_{(start + i) % 20}" for i in range(n)],
+            vector_block(seed, dim, start, n),
+            chunk_texts(seed, start, n),
+            [{"source": f"/bench/dir{(start + i) % 7}/doc_{(start + i) // 20}.txt", "chunk_index": str((start + i) % 20)}
+             for i in range(n)]
+        )
+    added = size - done
+    return added / max(time.perf_counter() - start_time, 1e-9)
+
+def measure(store, dim: int, seed: int, n_queries: int, top_k: int = 10):
+    vectors = vector_block(seed, dim, 2 ** 40, n_queries)
+    rng = np.random.default_rng([seed, 2])
+    latencies = []
+    for i, vector in enumerate(vectors):
+        query = " ".join(f"t{r}" for r in np.minimum(rng.zipf(1.3, size=3), 50_000))
+        start = time.perf_counter()
+        store.hybrid_search(query, vector, top_k=top_k)
+        if i >= 5:  # Warm-up
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="quantized", help="Dense backend of the stores")
+    parser.add_argument("--work-dir", default="/tmp/bench_sharding")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    stores = {
+        "single": VectorStore(persist_dir=os.path.join(args.work_dir, "single"), backend=args.backend),
+        f"{args.shards}_shards": ShardedVectorStore(
+            os.path.join(args.work_dir, "sharded"), shards=args.shards, backend=args.backend
+        ),
+    }
+    results = []
+    for size in sorted(args.sizes):
+        for name, store in stores.items():
+            throughput = fill(store, size, args.dim, args.seed)
+            p50, p99 = measure(store, args.dim, args.seed, args.queries)
+            results.append({"size": size, "store": name, "index_chunks_per_s": round(throughput),
+                            "hybrid_p50_ms": round(p50, 3), "hybrid_p99_ms": round(p99, 3)})
+            print(f"{size:>9} chunks  {name:<10} index {throughput:8.0f} chunks/s  "
+                  f"hybrid p50 {p50:7.2f}ms  p99 {p99:7.2f}ms")
+    stores[f"{args.shards}_shards"].close()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"shards": args.shards, "backend": args.backend, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
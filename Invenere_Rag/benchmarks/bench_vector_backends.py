@@ -0,0 +1,173 @@
+# benchmarks/bench_vector_backends.py
+"""
+Chroma versus the quantized (int8 IVF, memory-mapped) backend on the same
+vectors: build time and peak RSS of the writer, disk use, and, in a fresh
+read-only process, open time, query p50/p99, recall@10 against exact
+search, and RSS after the queries. The store's files are evicted from
+the page cache before that process starts, so file-backed RSS counts what
+the queries actually touched rather than what the build left cached.
+
+Vectors are unit-norm and clustered (topics plus noise) so the IVF lists
+see realistic structure; they are regenerated from the seed in each
+process instead of being passed around.
+
+Run from Invenere_Rag/:
+    python -m benchmarks.bench_vector_backends --vectors 1000000 --dim 384 --work-dir /tmp/bench_backends
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BLOCK = 50_000
+
+def peak_rss_mb() -> float:
+    """
+    This process's peak RSS. Read from /proc (VmHWM) rather than getrusage,
+    whose ru_maxrss survives exec and would report the parent's peak.
+    """
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def vector_block(seed: int, dim: int, start: int, n: int, topics: int = 2000) -> np.ndarray:
+    centers = np.random.default_rng(seed).standard_normal((topics, dim), dtype=np.float32)
+    rng = np.random.default_rng([seed, start])
+    vectors = centers[rng.integers(0, topics, n)] + 0.8 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def queries(seed: int, dim: int, n: int) -> np.ndarray:
+    return vector_block(seed, dim, 2 ** 40, n)  # A block no corpus reaches
+
+def exact_top_k(args, k: int = 10) -> np.ndarray:
+    q = queries(args.seed, args.dim, args.queries)
+    best_scores = np.full((len(q), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(q), k), dtype=np.int64)
+    for start in range(0, args.vectors, BLOCK):
+        n = min(BLOCK, args.vectors - start)
+        scores = q @ vector_block(args.seed, args.dim, start, n).T
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + n), (len(q), n))], axis=1)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+BUILD = r"""
+import json, sys, time
+from benchmarks.bench_vector_backends import BLOCK, peak_rss_mb, vector_block
+from rag_engine.vector_store import VectorStore
+backend, persist_dir, n_vectors, dim, seed = sys.argv[1], sys.argv[2], *map(int, sys.argv[3:6])
+start = time.perf_counter()
+store = VectorStore(persist_dir=persist_dir, backend=backend)
+for offset in range(0, n_vectors, BLOCK):
+    n = min(BLOCK, n_vectors - offset)
+    store.add_bulk(
+        [f"v{offset + i}" for i in range(n)],
+        vector_block(seed, dim, offset, n),
+        [f"synthetic chunk {offset + i}" for i in range(n)],
+        [{"source": f"/bench/doc_{(offset + i) // 20}.txt", "chunk_index": str((offset + i) % 20)} for i in range(n)]
+    )
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "max_rss_mb": peak_rss_mb()}))
+"""
+
+QUERY = r"""
+import json, sys, time
+from benchmarks.bench_vector_backends import peak_rss_mb, queries
+from rag_engine.vector_store import VectorStore
+persist_dir, dim, seed, n_queries = sys.argv[1], *map(int, sys.argv[2:5])
+rss_start = peak_rss_mb()
+start = time.perf_counter()
+store = VectorStore(persist_dir=persist_dir, read_only=True)
+store.count()
+open_seconds = time.perf_counter() - start
+found, latencies = [], []
+for q in queries(seed, dim, n_queries):
+    start = time.perf_counter()
+    hits = store.search([q], top_k=10)
+    latencies.append((time.perf_counter() - start) * 1000)
+    found.append([int(doc_id[1:]) for doc_id in (meta["chunk_id"] for _, meta in hits)])
+print(json.dumps({
+    "open_seconds": open_seconds, "latencies_ms": latencies, "found": found,
+    "max_rss_mb": peak_rss_mb(), "start_rss_mb": rss_start,
+}))
+"""
+
+def run(script, *args):
+    result = subprocess.run(
+        [sys.executable, "-c", script, *map(str, args)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def evict(path: str):
+    """Drops path's files from the page cache (clean pages only, hence the sync)."""
+    os.sync()
+    for root, _, files in os.walk(path):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "quantized"])
+    parser.add_argument("--work-dir", default="/tmp/bench_backends")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    print(f"Exact top-10 for {args.queries} queries over {args.vectors} vectors...")
+    truth = exact_top_k(args)
+    results = {}
+    for backend in args.backends:
+        persist_dir = os.path.join(args.work_dir, backend)
+        shutil.rmtree(persist_dir, ignore_errors=True)
+        build = run(BUILD, backend, persist_dir, args.vectors, args.dim, args.seed)
+        evict(persist_dir)
+        served = run(QUERY, persist_dir, args.dim, args.seed, args.queries)
+        recall = np.mean([len(set(f) & set(t.tolist())) / 10 for f, t in zip(served["found"], truth)])
+        latencies = sorted(served["latencies_ms"])
+        results[backend] = {
+            "build_seconds": round(build["seconds"], 2),
+            "build_peak_rss_mb": round(build["max_rss_mb"]),
+            "disk_mb": round(disk_mb(persist_dir)),
+            "open_seconds": round(served["open_seconds"], 3),
+            "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+            "query_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+            "recall@10": round(float(recall), 4),
+            "serving_peak_rss_mb": round(served["max_rss_mb"]),
+        }
+        r = results[backend]
+        print(f"{backend:<10} build {r['build_seconds']:8.1f}s  build RSS {r['build_peak_rss_mb']:6d} MB  "
+              f"disk {r['disk_mb']:6d} MB  open {r['open_seconds']:6.2f}s  p50 {r['query_p50_ms']:7.2f}ms  "
+              f"p99 {r['query_p99_ms']:7.2f}ms  recall@10 {r['recall@10']:.3f}  "
+              f"serving RSS {r['serving_peak_rss_mb']:6d} MB")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"vectors": args.vectors, "dim": args.dim, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
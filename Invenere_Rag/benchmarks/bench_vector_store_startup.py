@@ -0,0 +1,79 @@
+# benchmarks/bench_vector_store_startup.py
+"""
+VectorStore startup time and peak RSS on a large collection: the old
+full-id-scan startup versus the current writer and read-only modes.
+Each measurement runs in a fresh interpreter.
+
+Run from Invenere_Rag/:
+    python -m benchmarks.bench_vector_store_startup --chunks 1000000 --persist-dir /tmp/bench_chroma
+The collection is built on the first run and reused afterwards.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from rag_engine.vector_store import VectorStore
+
+MEASURE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+mode, persist_dir = sys.argv[1], sys.argv[2]
+if mode == "legacy":
+    import chromadb
+    client = chromadb.PersistentClient(path=persist_dir)
+    collection = client.get_collection("mydocs")
+    ids = set(collection.get()["ids"])
+else:
+    from rag_engine.vector_store import VectorStore
+    store = VectorStore(persist_dir=persist_dir, read_only=(mode == "read_only"))
+    store.count()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def build(persist_dir: str, chunks: int, dim: int, batch: int = 5000):
+    store = VectorStore(persist_dir=persist_dir)
+    have = store.count()
+    if have >= chunks:
+        return
+    print(f"Building collection: {have} -> {chunks} chunks")
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for offset in range(have, chunks, batch):
+        n = min(batch, chunks - offset)
+        files = [f"/bench/doc_{(offset + i) // 20}.txt" for i in range(n)]
+        store.add(
+            rng.standard_normal((n, dim), dtype=np.float32),
+            [f"synthetic chunk {offset + i} part PN-{offset + i:07d}" for i in range(n)],
+            files,
+            metadatas=[{"chunk_index": (offset + i) % 20} for i in range(n)]
+        )
+    print(f"Built in {time.perf_counter() - start:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--persist-dir", default="/tmp/bench_chroma")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    build(args.persist_dir, args.chunks, args.dim)
+    for mode in ("legacy", "writer", "read_only"):
+        runs = [
+            json.loads(subprocess.run(
+                [sys.executable, "-c", MEASURE, mode, args.persist_dir],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1])
+            for _ in range(args.repeat)
+        ]
+        best = min(runs, key=lambda r: r["seconds"])
+        print(f"{mode:<10} startup {best['seconds']:8.2f}s  peak RSS {best['max_rss_mb']:8.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/load_test.py
+"""
+Load test for the search service (serve.py): N concurrent clients issue
+/search or /answer requests for a fixed time; reports QPS, p50/p99 latency
+and, for /answer, p50/p99 time to first token.
+
+Against a running service:
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --endpoint search --concurrency 1 8 32
+Self-contained (starts the stub LLM and a uvicorn server on an existing index):
+    python -m benchmarks.load_test --launch --endpoint answer --concurrency 1 8 32
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from benchmarks.stub_ollama import start_stub_server
+
+QUERIES = [
+    "what is the travel policy",
+    "expense limit for hotels",
+    "who approves invoices over budget",
+    "laptop security requirements",
+    "how long are contracts retained",
+    "incident escalation procedure",
+    "onboarding checklist for new employees",
+    "quarterly revenue forecast review",
+]
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def client(url, endpoint, deadline, results, errors, seed):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=120)
+    i = seed
+    while time.perf_counter() < deadline:
+        body = json.dumps({"query": QUERIES[i % len(QUERIES)]})
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("POST", f"/{endpoint}", body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            if response.status != 200:
+                response.read()
+                errors.append(response.status)
+                continue
+            first_token = None
+            if endpoint == "answer":
+                for line in response:
+                    if first_token is None and line.startswith(b"event: token"):
+                        first_token = time.perf_counter() - start
+            else:
+                response.read()
+            results.append((time.perf_counter() - start, first_token))
+        except Exception as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=120)
+
+def run(url, endpoint, concurrency, duration):
+    results, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(url, endpoint, deadline, results, errors, n))
+        for n in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies = [r[0] * 1000 for r in results]
+    ttfts = [r[1] * 1000 for r in results if r[1] is not None]
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(errors),
+        "qps": len(results) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+    if ttfts:
+        report["ttft_p50_ms"] = percentile(ttfts, 50)
+        report["ttft_p99_ms"] = percentile(ttfts, 99)
+    return report
+
+def wait_ready(url, timeout=300):
+    parsed = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=5)
+            conn.request("GET", "/status")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Service at {url} did not become ready")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["search", "answer"], default="search")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--launch", action="store_true", help="Start the stub LLM and a local uvicorn server")
+    parser.add_argument("--service-workers", type=int, default=1)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--output", default=None, help="Write the reports as JSON here")
+    args = parser.parse_args()
+
+    service = None
+    if args.launch:
+        stub, stub_url = start_stub_server(token_delay=args.token_delay, first_token_delay=0.2)
+        port = urlparse(args.url).port or 8000
+        service = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "serve:app", "--port", str(port),
+             "--workers", str(args.service_workers), "--log-level", "warning"],
+            env={**os.environ, "OLLAMA_HOST": stub_url}
+        )
+    try:
+        wait_ready(args.url)
+        reports = []
+        for concurrency in args.concurrency:
+            report = run(args.url, args.endpoint, concurrency, args.duration)
+            reports.append(report)
+            line = (f"{args.endpoint:<7} c={concurrency:<4} qps={report['qps']:8.1f}  "
+                    f"p50={report['p50_ms']:8.1f}ms  p99={report['p99_ms']:8.1f}ms  errors={report['errors']}")
+            if "ttft_p50_ms" in report:
+                line += f"  ttft p50={report['ttft_p50_ms']:.1f}ms p99={report['ttft_p99_ms']:.1f}ms"
+            print(line)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(reports, f, indent=2)
+    finally:
+        if service:
+            service.terminate()
+            service.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+# benchmarks/retrieval_bench.py
+"""
+Retrieval quality and latency regression suite. For each corpus size it
+indexes a seeded synthetic corpus through the real chunker and
+RAGPipeline.index_documents, runs a labelled query set through
+RAGPipeline.retrieve, and reports:
+
+    quality   recall@k, MRR and nDCG@k of the final (reranked) results
+    latency   index build time, query p50/p99 (plus per-stage p50s), and
+              end-to-end answer p50/p99 against a stub LLM
+    memory    peak RSS of the process that built and queried the index
+
+Every document describes one made-up entity ("Velorakin") in sections,
+one per attribute ("Section 3 Backup retention"). Each section contains a
+single fact sentence carrying a unique value; a query asks for one
+attribute of one entity. A result is fully relevant (grade 2) when it
+contains the fact, partly relevant (grade 1) when it comes from the
+entity's document. Labels follow the text, not chunk ids, so they stay
+valid when chunker settings change.
+
+Each size runs in a fresh process, so sizes do not share caches or RSS.
+Results are written as JSON; pass an earlier file as --baseline to flag
+quality drops and p99 increases (exit status 1 on regression).
+
+Run from Invenere_Rag/:
+    python -m benchmarks.retrieval_bench --sizes 10k 100k --embedder hashing --output bench.json
+    python -m benchmarks.retrieval_bench --sizes 10k --baseline bench.json --max-length 500
+"""
+
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.load_test import percentile
+from benchmarks.synthetic import sentence
+
+SYLLABLES = "ka ro vel tin mar sol pe dri qua lum ben hox zir fa nel tor gue yas wil om".split()
+ATTRIBUTES = (
+    "travel expense limit", "hotel reimbursement cap", "invoice approval threshold",
+    "backup retention period", "laptop encryption standard", "incident escalation contact",
+    "onboarding checklist owner", "contract renewal deadline", "vendor payment terms",
+    "server patch window", "release freeze date", "audit review cycle",
+    "data retention policy", "access review frequency", "support response time",
+    "budget approval limit", "training completion deadline", "payroll cutoff day",
+    "remote work allowance", "security awareness course", "disaster recovery target",
+    "customer refund window", "procurement card limit", "password rotation interval",
+)
+QUERY_TEMPLATES = (
+    "What is the {attribute} for {entity}?",
+    "{entity} {attribute}",
+    "Which {attribute} applies to {entity}?",
+    "Tell me the {attribute} of {entity}",
+)
+SECTIONS_PER_DOC = (4, 10)
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+def entity(doc_id: int) -> str:
+    """Unique made-up name per document: doc_id in base-len(SYLLABLES) syllables."""
+    parts, n = [], doc_id
+    for _ in range(4):
+        n, digit = divmod(n, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    while n:
+        n, digit = divmod(n, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    return "".join(parts).capitalize()
+
+def fact_value(rng: random.Random, doc_id: int, section: int) -> str:
+    return f"{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}-{doc_id:07d}{section:02d}"
+
+def document(doc_id: int, seed: int, with_headings: bool = True) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    The text of document doc_id and its (attribute, fact value) per section.
+    Fully determined by (doc_id, seed), so labels can be rebuilt without
+    keeping the corpus around.
+    """
+    rng = random.Random(seed * 1_000_003 + doc_id)
+    name = entity(doc_id)
+    attributes = rng.sample(ATTRIBUTES, rng.randint(*SECTIONS_PER_DOC))
+    parts, facts = [], []
+    for n, attribute in enumerate(attributes, 1):
+        value = fact_value(rng, doc_id, n)
+        facts.append((attribute, value))
+        sentences = [sentence(rng) for _ in range(rng.randint(2, 10))]
+        sentences.insert(rng.randint(0, len(sentences)), f"The {attribute} for {name} is {value}.")
+        if with_headings:
+            parts.append(f"Section {n} {attribute.capitalize()}")
+        parts.append(" ".join(sentences))
+    return "\n".join(parts), facts
+
+def source(doc_id: int) -> str:
+    return f"/bench/corpus/{entity(doc_id)}.txt"
+
+def iter_corpus(n_docs: int, seed: int, with_headings: bool) -> Iterator[Tuple[str, str]]:
+    for doc_id in range(n_docs):
+        yield source(doc_id), document(doc_id, seed, with_headings)[0]
+
+def make_queries(n_docs: int, n_queries: int, seed: int, with_headings: bool) -> List[Dict]:
+    rng = random.Random(seed + 7)
+    queries = []
+    for doc_id in rng.sample(range(n_docs), min(n_queries, n_docs)):
+        _, facts = document(doc_id, seed, with_headings)
+        attribute, value = rng.choice(facts)
+        template = rng.choice(QUERY_TEMPLATES)
+        queries.append({
+            "query": template.format(attribute=attribute, entity=entity(doc_id)),
+            "source": source(doc_id),
+            "value": value,
+            "doc_id": doc_id,
+        })
+    return queries
+
+def docs_for_chunks(target_chunks: int, seed: int, with_headings: bool, chunker) -> int:
+    """Number of documents that chunk into about target_chunks chunks."""
+    sample = 200
+    chunks = sum(len(chunker(document(doc_id, seed, with_headings)[0])) for doc_id in range(sample))
+    return max(1, round(target_chunks * sample / chunks))
+
+class HashingEmbedder:
+    """
+    Model-free stand-in for Embedder: signed feature hashing of lowercased
+    words and word bigrams, L2-normalized. Deterministic and fast enough to
+    index a million chunks, so store/search/rerank changes can be measured
+    without the embedding model dominating (or being downloaded).
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.cache = None
+
+    @staticmethod
+    @functools.lru_cache(maxsize=500_000)
+    def _feature(token: str) -> Tuple[int, float]:
+        h = zlib.crc32(token.encode("utf-8"))
+        return h >> 1, (1.0 if h & 1 else -1.0)
+
+    def embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(chunks), self.dim), dtype=np.float32)
+        for row, text in enumerate(chunks):
+            words = re.findall(r"\w+", text.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._feature(token)
+                vectors[row, index % self.dim] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_chunks([query])[0]
+
+    def embed_bulk(self, chunks: List[str], **_) -> np.ndarray:
+        return self.embed_chunks(chunks)
+
+    def close(self):
+        pass
+
+class RetrievalOrderReranker:
+    """Stand-in for Reranker that keeps the retrieval order (no cross-encoder)."""
+
+    def rerank(self, query, passages, top_n=3, boost_on_heading=True, latency_budget_ms=None):
+        return [(text, meta, -float(rank)) for rank, (text, meta) in enumerate(passages[:top_n])]
+
+def grade(result: Dict, query: Dict) -> int:
+    if result["metadata"].get("source") != query["source"]:
+        return 0
+    return 2 if query["value"] in result["text"] else 1
+
+def score_query(results: List[Dict], query: Dict, ks: List[int], doc_chunks: int) -> Dict[str, float]:
+    grades = [grade(result, query) for result in results]
+    first = next((rank for rank, g in enumerate(grades, 1) if g == 2), None)
+    scores = {"mrr": 1.0 / first if first else 0.0}
+    ideal = [2] + [1] * max(0, doc_chunks - 1)
+    for k in ks:
+        scores[f"recall@{k}"] = 1.0 if first and first <= k else 0.0
+        dcg = sum((2 ** g - 1) / math.log2(rank + 1) for rank, g in enumerate(grades[:k], 1))
+        idcg = sum((2 ** g - 1) / math.log2(rank + 1) for rank, g in enumerate(ideal[:k], 1))
+        scores[f"ndcg@{k}"] = dcg / idcg
+    return scores
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def make_pipeline(config: Dict, persist_dir: str, llm_host: str):
+    from rag_engine.embedder import Embedder
+    from rag_engine.llama_interface import OllamaClient
+    from rag_engine.rag_pipeline import RAGPipeline
+    from rag_engine.reranker import Reranker
+
+    if config["embedder"] == "hashing":
+        embedder = HashingEmbedder(config["hash_dim"])
+    else:
+        embedder = Embedder(config["embedder"], cache_dir=None)  # Timings must not depend on earlier runs
+    if config["reranker"] == "none":
+        reranker = RetrievalOrderReranker()
+    else:
+        reranker = Reranker(config["reranker"], cache_size=0, heading_boost=config["heading_boost"])
+    pipeline = RAGPipeline(
+        persist_dir=persist_dir, embedder=embedder, reranker=reranker, llm_model="stub",
+        vector_backend=config["backend"]
+    )
+    pipeline.llm = OllamaClient(model="stub", host=llm_host)
+    return pipeline
+
+def run_size(config: Dict, target_chunks: int) -> Dict:
+    """
+    Builds and queries one corpus size; runs in its own process.
+    """
+    from benchmarks.stub_ollama import start_stub_server
+    from rag_engine.chunker import robust_chunker
+    from rag_engine.indexer import stream_index
+    from rag_engine.timing import StageTimer
+
+    chunker = functools.partial(
+        robust_chunker, max_length=config["max_length"], overlap=config["overlap"], max_tokens=config["max_tokens"]
+    )
+    seed, with_headings = config["seed"], not config["no_headings"]
+    n_docs = docs_for_chunks(target_chunks, seed, with_headings, chunker)
+    persist_dir = tempfile.mkdtemp(prefix="invenere-bench-", dir=config["work_dir"])
+    server, llm_host = start_stub_server(token_delay=config["token_delay"])
+    try:
+        pipeline = make_pipeline(config, persist_dir, llm_host)
+
+        start = time.perf_counter()
+        stats = stream_index(
+            pipeline, iter_corpus(n_docs, seed, with_headings),
+            batch_size=config["batch_size"], chunker=chunker
+        )
+        pipeline.flush()
+        build_seconds = time.perf_counter() - start
+
+        queries = make_queries(n_docs, config["queries"], seed, with_headings)
+        ks = [k for k in config["ks"] if k <= config["final_k"]]
+
+        def retrieve(query, timer=None):
+            return pipeline.retrieve(
+                query["query"], top_k=config["top_k"], final_k=config["final_k"],
+                use_hybrid=not config["dense_only"], timer=timer
+            )
+
+        for query in queries[:config["warmup"]]:
+            retrieve(query)
+
+        latencies, stage_samples, totals = [], {}, {}
+        for query in queries:
+            timer = StageTimer("bench", metrics=None, sample_rate=0)
+            start = time.perf_counter()
+            results = retrieve(query, timer)
+            latencies.append((time.perf_counter() - start) * 1000)
+            for stage, seconds in timer.stages.items():
+                stage_samples.setdefault(stage, []).append(seconds * 1000)
+            doc_chunks = len(chunker(document(query["doc_id"], seed, with_headings)[0]))
+            for name, value in score_query(results, query, ks, doc_chunks).items():
+                totals[name] = totals.get(name, 0.0) + value
+
+        answer_latencies, first_token = [], []
+        for query in queries[:config["answers"]]:
+            timer = StageTimer("bench", metrics=None, sample_rate=0)
+            start = time.perf_counter()
+            answer = "".join(pipeline.query(query["query"], top_k=config["top_k"], final_k=config["final_k"],
+                                            use_hybrid=not config["dense_only"], stream=True, timer=timer))
+            answer_latencies.append((time.perf_counter() - start) * 1000)
+            first_token.append(timer.stages.get("llm_first_token", 0.0) * 1000)
+            if answer.startswith("❌"):
+                raise RuntimeError(f"Stub LLM call failed: {answer}")
+
+        pipeline.embedder.close()
+        return {
+            "target_chunks": target_chunks,
+            "documents": n_docs,
+            "chunks": stats["chunks"],
+            "build_seconds": round(build_seconds, 3),
+            "build_chunks_per_s": round(stats["chunks"] / build_seconds, 1),
+            "quality": {name: round(total / len(queries), 4) for name, total in sorted(totals.items())},
+            "query_ms": {
+                "count": len(latencies),
+                "p50": round(percentile(latencies, 50), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "mean": round(sum(latencies) / len(latencies), 3),
+            },
+            "stage_p50_ms": {stage: round(percentile(v, 50), 3) for stage, v in stage_samples.items()},
+            "answer_ms": {
+                "count": len(answer_latencies),
+                "p50": round(percentile(answer_latencies, 50), 3),
+                "p99": round(percentile(answer_latencies, 99), 3),
+                "first_token_p50": round(percentile(first_token, 50), 3),
+            } if answer_latencies else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+    finally:
+        server.shutdown()
+        if not config["keep"]:
+            shutil.rmtree(persist_dir, ignore_errors=True)
+        else:
+            print(f"Kept index at {persist_dir}")
+
+def _child(config: Dict, target_chunks: int, results):
+    try:
+        results.put(run_size(config, target_chunks))
+    except BaseException as e:
+        results.put({"target_chunks": target_chunks, "error": f"{type(e).__name__}: {e}"})
+        raise
+
+def run_isolated(config: Dict, target_chunks: int) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_child, args=(config, target_chunks, results))
+    process.start()
+    # A child killed outright (OOM killer, segfault) never puts a result, so
+    # poll rather than block on the queue forever
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        try:
+            result = results.get(timeout=1.0)  # Put just before it exited
+        except queue.Empty:
+            result = {"target_chunks": target_chunks, "error": f"benchmark process died (exit code {process.exitcode})"}
+        break
+    process.join()
+    return result
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: Dict, baseline: Dict, max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """
+    Regressions of report against baseline, matched by target size:
+    an absolute drop in any quality metric above max_quality_drop, or a
+    relative query p99 increase above max_latency_increase.
+    """
+    regressions = []
+    previous = {r["target_chunks"]: r for r in baseline.get("results", []) if "error" not in r}
+    for result in report["results"]:
+        old = previous.get(result["target_chunks"])
+        if old is None or "error" in result:
+            continue
+        size = result["target_chunks"]
+        for name, value in result["quality"].items():
+            before = old["quality"].get(name)
+            if before is not None and before - value > max_quality_drop:
+                regressions.append(f"{size} chunks: {name} {before:.4f} -> {value:.4f}")
+        before, after = old["query_ms"]["p99"], result["query_ms"]["p99"]
+        if before and (after - before) / before > max_latency_increase:
+            regressions.append(f"{size} chunks: query p99 {before:.1f}ms -> {after:.1f}ms")
+    return regressions
+
+def print_result(result: Dict):
+    if "error" in result:
+        print(f"{result['target_chunks']:>9} chunks  FAILED: {result['error']}")
+        return
+    quality = "  ".join(f"{name}={value:.3f}" for name, value in result["quality"].items())
+    print(f"{result['chunks']:>9} chunks  build {result['build_seconds']:8.1f}s "
+          f"({result['build_chunks_per_s']:.0f}/s)  query p50 {result['query_ms']['p50']:.1f}ms "
+          f"p99 {result['query_ms']['p99']:.1f}ms  peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"{'':>17}{quality}")
+    stages = "  ".join(f"{stage}={ms:.1f}" for stage, ms in result["stage_p50_ms"].items())
+    print(f"{'':>17}stage p50 ms: {stages}")
+    if result["answer_ms"]:
+        answer = result["answer_ms"]
+        print(f"{'':>17}answer (stub LLM) p50 {answer['p50']:.1f}ms p99 {answer['p99']:.1f}ms "
+              f"first token p50 {answer['first_token_p50']:.1f}ms")
+
+def parse_size(value: str) -> int:
+    value = value.lower()
+    if value in SIZES:
+        return SIZES[value]
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1_000)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1_000_000)
+    return int(value)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k", "1m"], help="Corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--answers", type=int, default=20, help="Queries also answered end to end (stub LLM)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedder", default="all-MiniLM-L6-v2",
+                        help="SentenceTransformer model, or 'hashing' for the model-free embedder")
+    parser.add_argument("--hash-dim", type=int, default=256)
+    parser.add_argument("--reranker", default="cross-encoder/ms-marco-MiniLM-L-6-v2",
+                        help="CrossEncoder model, or 'none' to keep the retrieval order")
+    parser.add_argument("--heading-boost", type=float, default=0.3)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--final-k", type=int, default=5)
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--backend", choices=["chroma", "quantized"], default="chroma", help="Vector backend")
+    parser.add_argument("--dense-only", action="store_true", help="Skip BM25 (use_hybrid=False)")
+    parser.add_argument("--max-length", type=int, default=350, help="robust_chunker max_length")
+    parser.add_argument("--overlap", type=int, default=50, help="robust_chunker overlap")
+    parser.add_argument("--max-tokens", type=int, default=256, help="robust_chunker max_tokens")
+    parser.add_argument("--no-headings", action="store_true", help="Corpus without section headings")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub LLM seconds per token")
+    parser.add_argument("--work-dir", default=None, help="Where the temporary indexes are built")
+    parser.add_argument("--keep", action="store_true", help="Keep the built indexes")
+    parser.add_argument("--output", default="retrieval_bench.json")
+    parser.add_argument("--baseline", default=None, help="Earlier output to compare against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.01)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25, help="Relative p99 increase")
+    args = parser.parse_args()
+
+    config = {
+        name: getattr(args, name) for name in (
+            "queries", "warmup", "answers", "seed", "embedder", "hash_dim", "reranker", "heading_boost",
+            "top_k", "final_k", "ks", "backend", "dense_only", "max_length", "overlap", "max_tokens", "no_headings",
+            "batch_size", "token_delay", "work_dir", "keep",
+        )
+    }
+    report = {
+        "benchmark": "retrieval",
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in config.items() if k not in ("work_dir", "keep")},
+        "results": [],
+    }
+    for size in args.sizes:
+        target = parse_size(size)
+        print(f"\n=== {target} chunks ===")
+        result = run_isolated(config, target)
+        print_result(result)
+        report["results"].append(result)
+        with open(args.output, "w", encoding="utf-8") as f:  # Keep finished sizes if a later one dies
+            json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    failed = any("error" in r for r in report["results"])
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("Note: baseline was run with a different configuration.")
+        regressions = compare(report, baseline, args.max_quality_drop, args.max_latency_increase)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print(f"No regressions against {args.baseline}.")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/stub_ollama.py
+"""
+Stand-in for the Ollama server API: POST /api/generate with "stream" true
+or false, answering with a canned reply one token at a time. Lets the LLM
+client, the search service and load tests run without a model. The model
+ERROR_MODEL fails like a model that breaks mid-answer: an "error" event
+after the first token when streaming, an "error" reply otherwise.
+
+Run from Invenere_Rag/:  python -m benchmarks.stub_ollama --port 11434 --token-delay 0.02
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "This is a stub answer generated for benchmarking the Invenere pipeline."
+ERROR_MODEL = "stub-error"
+ERROR = "model runner has unexpectedly stopped"
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+    token_delay = 0.0
+    first_token_delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests += 1
+        tokens = [word + " " for word in REPLY.split()]
+        failing = body.get("model") == ERROR_MODEL
+        time.sleep(self.first_token_delay)
+        if not body.get("stream", True):
+            time.sleep(self.token_delay * len(tokens))
+            reply = {"error": ERROR} if failing else {"model": body.get("model"), "response": "".join(tokens), "done": True}
+            payload = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"response": t, "done": False} for t in tokens] + [{"response": "", "done": True}]
+        if failing:
+            events = events[:1] + [{"error": ERROR, "done": True}]
+        try:
+            for event in events:
+                line = json.dumps(event).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+                if not event.get("done"):
+                    time.sleep(self.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client stopped reading mid-stream
+
+def start_stub_server(port: int = 0, token_delay: float = 0.0, first_token_delay: float = 0.0):
+    """
+    Starts the stub on a background thread. Returns (server, host_url);
+    server.requests counts requests served, server.connections connections
+    accepted, server.shutdown() stops it.
+    """
+    handler = type("Handler", (StubOllamaHandler,), {
+        "token_delay": token_delay, "first_token_delay": first_token_delay
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, args.token_delay, args.first_token_delay)
+    print(f"Stub Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
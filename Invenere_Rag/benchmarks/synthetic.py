@@ -0,0 +1,44 @@
+# benchmarks/synthetic.py
+
+import random
+from typing import List
+
+WORDS = (
+    "policy travel expense hotel limit approval manager invoice vendor contract "
+    "retention security access laptop onboarding benefits payroll quarter revenue "
+    "forecast compliance audit incident escalation procedure review document "
+    "section budget reimbursement receipt deadline department project milestone "
+    "risk customer support release deployment server backup archive training"
+).split()
+
+def sentence(rng: random.Random, min_words: int = 6, max_words: int = 24) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+def paragraph(rng: random.Random, min_sentences: int = 2, max_sentences: int = 8) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(min_sentences, max_sentences)))
+
+def document(rng: random.Random, sections: int = 6, with_headings: bool = True) -> str:
+    parts = []
+    for n in range(1, sections + 1):
+        if with_headings:
+            parts.append(f"Section {n} {rng.choice(WORDS).capitalize()}")
+        parts.append(paragraph(rng, 2, 12))
+    return "\n".join(parts)
+
+def mixed_length_chunks(n: int, seed: int = 0) -> List[str]:
+    """
+    Chunks with the length spread the chunker produces: mostly ~350-char
+    sentence chunks, some short fragments and some long heading sections.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.2:
+            chunks.append(sentence(rng, 3, 8))
+        elif kind < 0.85:
+            chunks.append(paragraph(rng, 2, 4)[:350])
+        else:
+            chunks.append(paragraph(rng, 10, 40))
+    return chunks
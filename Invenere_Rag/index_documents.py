@@ -1,55 +1,96 @@
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+import argparse
+
 from rag_engine.rag_pipeline import RAGPipeline
-from rag_engine.chunker import robust_chunker        # <- Import robust chunker!
-from rag_engine.parser import load_documents_from_desktop
-
-BATCH_SIZE = 200
-
-def batch_index():
-    print("Loading documents from Desktop...")
-    docs = load_documents_from_desktop()
-    total = len(docs)
-    print(f"Found {total} files to index.")
-    batches = [docs[i:i+BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
-
-    pipeline = RAGPipeline()
-
-    for batch_num, batch in enumerate(batches, start=1):
-        print(f"\nProcessing batch {batch_num}/{len(batches)}...")
-        all_chunks = []
-        all_filepaths = []
-        all_metadatas = []
-
-        for item in batch:
-            try:
-                file_path, text = item[:2]
-                if text and len(text.strip()) > 0:
-                    chunk_dicts = robust_chunker(text)
-                    for chunk_dict in chunk_dicts:
-                        all_chunks.append(chunk_dict['text'])
-                        all_filepaths.append(file_path)
-                        all_metadatas.append(chunk_dict.get('metadata', {}))
-                else:
-                    print(f"Skipped empty file: {file_path}")
-            except Exception as e:
-                print(f"Skipping {item}: {e}")
-
-        if not all_chunks:
-            print(f"No valid files found in batch {batch_num}, skipping batch.")
-            continue
-
-        try:
-            # Update your pipeline.index_documents to accept metadatas!
-            pipeline.index_documents(
-                list(zip(all_filepaths, all_chunks, all_metadatas))
-            )
-            print(f"Batch {batch_num} complete with {len(all_chunks)} chunks.")
-        except Exception as e:
-            print(f"Batch {batch_num} failed: {e}")
-            continue
+from rag_engine.extraction import ExtractionCache
+from rag_engine.indexer import incremental_index
+from rag_engine.manifest import Manifest
+from rag_engine.parser import default_roots
+from rag_engine.sharded_store import PARTITIONS, ShardedVectorStore
+from rag_engine.timing import StageTimer
+from rag_engine.vector_backends import BACKENDS
+
+BATCH_SIZE = 2000  # chunks per embed/write batch
+
+def batch_index(roots=None, workers=None, batch_size=BATCH_SIZE, queue_size=4, full=False, embed_workers=1,
+                extract_timeout=120.0, extract_memory_mb=2048, extraction_cache="./extraction_cache", profile=False,
+                vector_backend=None, shards=None, shard_by="hash", rebuild_shard=None):
+    roots = roots or default_roots()
+    print(f"Indexing documents from: {', '.join(roots)}")
+
+    pipeline = RAGPipeline(
+        embed_workers=embed_workers, vector_backend=vector_backend,
+        shards=shards, shard_by=shard_by, shard_roots=roots if shards or shard_by == "root" else None
+    )
+    if rebuild_shard is not None:
+        reset_shard(pipeline.vector_store, rebuild_shard)
+    timer = StageTimer("index")
+    stats = incremental_index(
+        pipeline, roots, full=full, workers=workers,
+        batch_size=batch_size, queue_size=queue_size,
+        extraction_cache=ExtractionCache(extraction_cache) if extraction_cache else None,
+        extract_timeout=extract_timeout, extract_memory_mb=extract_memory_mb or None,
+        timer=timer
+    )
+    pipeline.flush()
+    record = timer.finish(**stats)
+    print(f"\nIndexed {stats['chunks']} chunks from {stats['files']} files "
+          f"in {stats['batches']} batches ({stats['failed_batches']} failed); "
+          f"removed {stats['deleted_files']} deleted files.")
+    if profile:
+        seconds = record["wall_ms"] / 1000
+        print(f"\n{timer.breakdown()}")
+        if seconds:
+            print(f"{timer.counts.get('parsed_files', 0) / seconds:.1f} files/s, "
+                  f"{timer.counts.get('parsed_bytes', 0) / seconds / 1e6:.2f} MB/s parsed, "
+                  f"{stats['chunks'] / seconds:.0f} chunks/s indexed")
+    pipeline.embedder.close()
+    return stats
+
+def reset_shard(store, shard):
+    """
+    Empties one shard and forgets its files in the manifest, so the run that
+    follows re-indexes exactly that shard's files.
+    """
+    if not isinstance(store, ShardedVectorStore):
+        raise SystemExit("--rebuild-shard needs a sharded store")
+    store.reset_shard(shard)
+    manifest = Manifest(os.path.join(store.persist_dir, "manifest.json"))
+    forgotten = [path for path in list(manifest.entries) if store.shard_for(path) == shard]
+    for path in forgotten:
+        manifest.remove(path)
+    manifest.save()
+    print(f"Shard {shard} emptied; re-indexing its {len(forgotten)} files.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index documents into the Invenere vector store.")
+    parser.add_argument("roots", nargs="*", help="Directories to index (default: $INVENERE_ROOTS or ~/Desktop)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks per embedding batch")
+    parser.add_argument("--queue-size", type=int, default=4, help="Chunk batches buffered ahead of the embedder")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Embedding processes (useful on CPU-only hosts)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-index every file")
+    parser.add_argument("--extract-timeout", type=float, default=120.0, help="Seconds allowed to extract one file")
+    parser.add_argument("--extract-memory-mb", type=int, default=2048, help="Memory per extraction worker (0: no limit)")
+    parser.add_argument("--extraction-cache", default="./extraction_cache",
+                        help="Cache directory for extracted PDF/DOCX text ('' to disable)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="Dense index for a new store (default: chroma); existing stores keep theirs")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Create a new store as this many shards, each served by its own process")
+    parser.add_argument("--shard-by", choices=PARTITIONS, default="hash",
+                        help="Place files by a hash of their path or by indexing root (one shard per root)")
+    parser.add_argument("--rebuild-shard", type=int, default=None, help="Empty and re-index one shard")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage time breakdown at the end")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    batch_index()
+    args = parse_args()
+    batch_index(
+        args.roots or None, args.workers, args.batch_size, args.queue_size, args.full, args.embed_workers,
+        args.extract_timeout, args.extract_memory_mb, args.extraction_cache, args.profile,
+        args.backend, args.shards, args.shard_by, args.rebuild_shard
+    )
     print("\nIndexing complete! You can now run queries instantly.")
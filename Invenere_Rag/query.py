@@ -1,85 +1,82 @@
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-from rag_engine.rag_pipeline import RAGPipeline
-
-# LangChain imports
-from langchain.llms import Ollama
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+import argparse
+from functools import lru_cache
 
-llama = Ollama(model="llama3:3.2")  # Update as needed
-
-# Entity extraction prompt and chain
-entity_extract_prompt = PromptTemplate(
-    input_variables=["answer_text"],
-    template=(
-        "Extract the main methods, techniques, entities, or key concepts listed or described in the following answer. "
-        "Return them as a comma-separated list (no explanations):\n\n"
-        "{answer_text}\n\nList:"
-    )
-)
-entity_extract_chain = LLMChain(llm=llama, prompt=entity_extract_prompt)
-
-# Enhanced query rewriting prompt and chain
-enhance_prompt = PromptTemplate(
-    input_variables=["original_query", "recent_history", "entity_list"],
-    template=(
-        "Rewrite the user's question to be explicit and maximally useful for document retrieval. "
-        "Use recent conversation to clarify the topic. "
-        "If the question contains vague terms, use the supplied entity list in the rewritten query.\n\n"
-        "Recent history:\n{recent_history}\n\nOriginal query: {original_query}\n\nEntity list: {entity_list}\n\nEnhanced query:"
+from rag_engine.llama_interface import LLM_ERRORS
+from rag_engine.memory import ConversationMemory, make_summarizer
+from rag_engine.query_planner import QueryPlanner
+from rag_engine.rag_pipeline import RAGPipeline
+from rag_engine.timing import StageTimer
+
+@lru_cache(maxsize=None)
+def langchain_llm():
+    """
+    LLaMA through LangChain with the entity extraction and query rewriting
+    chains. Imported on first use (the first follow-up question), not at
+    startup: LangChain alone takes seconds to import.
+    """
+    from langchain.llms import Ollama
+    from langchain.prompts import PromptTemplate
+    from langchain.chains import LLMChain
+
+    llama = Ollama(model="llama3:3.2")  # Update as needed
+
+    # Entity extraction prompt and chain
+    entity_extract_prompt = PromptTemplate(
+        input_variables=["answer_text"],
+        template=(
+            "Extract the main methods, techniques, entities, or key concepts listed or described in the following answer. "
+            "Return them as a comma-separated list (no explanations):\n\n"
+            "{answer_text}\n\nList:"
+        )
     )
-)
-enhance_chain = LLMChain(llm=llama, prompt=enhance_prompt)
-
-# Answer prompt and chain
-answer_prompt = PromptTemplate(
-    input_variables=["context", "query"],
-    template=(
-        "You are an expert assistant. Use only the provided context to answer the user's question. "
-        "If the answer is not in the context, say 'Not enough information.'\n\n"
-        "Context:\n{context}\n\n"
-        "User Query: {query}\n\n"
-        "Answer:"
+    entity_extract_chain = LLMChain(llm=llama, prompt=entity_extract_prompt)
+
+    # Enhanced query rewriting prompt and chain
+    enhance_prompt = PromptTemplate(
+        input_variables=["original_query", "recent_history", "entity_list"],
+        template=(
+            "Rewrite the user's question to be explicit and maximally useful for document retrieval. "
+            "Use recent conversation to clarify the topic. "
+            "If the question contains vague terms, use the supplied entity list in the rewritten query.\n\n"
+            "Recent history:\n{recent_history}\n\nOriginal query: {original_query}\n\nEntity list: {entity_list}\n\nEnhanced query:"
+        )
     )
+    enhance_chain = LLMChain(llm=llama, prompt=enhance_prompt)
+    return llama, entity_extract_chain, enhance_chain
+
+arg_parser = argparse.ArgumentParser(description="Interactive search over the Invenere index.")
+arg_parser.add_argument("--profile", action="store_true", help="Print a per-stage latency breakdown after each answer")
+arg_parser.add_argument(
+    "--tokenizer", default=os.environ.get("INVENERE_TOKENIZER"),
+    help="Hugging Face tokenizer matching the LLM, for exact prompt budgets (default: $INVENERE_TOKENIZER)"
 )
-answer_chain = LLMChain(llm=llama, prompt=answer_prompt)
+args = arg_parser.parse_args()
 
-pipeline = RAGPipeline()
-print("✅ Vector store loaded from ChromaDB. Ready for search.")
+pipeline = RAGPipeline(read_only=True, tokenizer_name=args.tokenizer)
+print("✅ Ready for search (models load with the first question).")
 
-history = []
-MAX_TURNS = 10
-summary = ""
+# Token-bounded window of recent turns; older ones are summarized in the background
+memory = ConversationMemory(summarize=make_summarizer(lambda prompt: langchain_llm()[0](prompt)), window_tokens=600)
 
-def summarize_history(history):
-    conversation = "\n".join([f"Q: {q}\nA: {a}" for q, a in history])
-    prompt = (
-        "Summarize the following conversation briefly, capturing all key topics discussed so far:\n\n"
-        f"{conversation}\n\nSummary:"
-    )
-    return llama(prompt)
-
-def enhance_query_with_entities(original_query, history):
-    recent = ""
-    last_answer = ""
-    if history:
-        recent = "\n".join([f"Q: {q}\nA: {a}" for q, a in history[-3:]])
-        last_answer = history[-1][1] if history else ""
-    vague_terms = ["these", "them", "those", "the above", "such methods", "those methods"]
-    needs_entity = any(term in original_query.lower() for term in vague_terms)
-    entity_list = ""
-    if needs_entity and last_answer:
-        entity_list = entity_extract_chain.run(answer_text=last_answer).strip()
+def rewrite_query(original_query, recent_history, entity_list):
+    if entity_list:
         print("Extracted entities for query rewriting:", entity_list)
-    enhanced = enhance_chain.run(
+    _, _, enhance_chain = langchain_llm()
+    return enhance_chain.run(
         original_query=original_query,
-        recent_history=recent,
+        recent_history=recent_history,
         entity_list=entity_list
     ).strip()
-    print("Enhanced query:", enhanced)
-    return enhanced if enhanced else original_query
+
+# Retrieval starts on the raw query while the rewrite (if the query needs one) runs
+planner = QueryPlanner(
+    pipeline,
+    rewrite=rewrite_query,
+    extract_entities=lambda answer_text: langchain_llm()[1].run(answer_text=answer_text)
+)
 
 def print_metadata(src):
     if isinstance(src, dict):
@@ -99,35 +96,54 @@ while True:
         break
 
     if query.strip().lower() == "exit":
+        planner.close()
+        memory.close()
         break
 
-    # --- 1. Enhance the query using LLaMA + LangChain ---
-    enhanced_query = enhance_query_with_entities(query, history)
-    print(f"\n🔍 Enhanced query: {enhanced_query}\n")
-
-    # --- 2. RAG retrieval step ---
-    retrieved_context, sources = pipeline.query(
-        enhanced_query, return_sources=True, history=history
-    )
+    timer = StageTimer("query")
 
-    # --- 3. Answer generation using LangChain LLMChain ---
-    response = answer_chain.run(context=retrieved_context, query=enhanced_query)
+    # --- 1-2. Retrieval on the raw query, alongside the LLaMA rewrite when needed ---
+    enhanced_query, chunks, plan = planner.retrieve(query, memory=memory, timer=timer)
+    if plan["used_rewrite"]:
+        print(f"\n🔍 Enhanced query: {enhanced_query}\n")
+    else:
+        print(f"\n🔍 Query used as is ({plan['reason']})\n")
 
+    # --- 3. The one answer generation of the turn, streamed token by token ---
+    context_report = {}
+    prompt = pipeline.build_prompt(enhanced_query, chunks, memory=memory, report=context_report, timer=timer)
     print("\n🧠 LLaMA's Response:\n")
-    print(response)
+    response = ""
+    try:
+        for token in pipeline.generate(prompt, stream=True, timer=timer):
+            print(token, end="", flush=True)
+            response += token
+    except LLM_ERRORS as e:
+        # No answer to remember; the session goes on with the next question
+        print(f"\n❌ Error querying LLaMA: {e}")
+        timer.finish(query=query, error=type(e).__name__)
+        continue
+    response = response.strip()
+    print()
     print("\n📄 Source files and metadata used:")
-    for src in sources:
-        print_metadata(src)
-
-    # --- 4. Update conversation history ---
-    history.append((query, response))
+    for chunk in chunks:
+        print_metadata(chunk["metadata"])
+    if args.profile:
+        print(f"\n{timer.breakdown()}")
+        print(f"📦 Prompt {context_report['prompt_tokens']} tokens; context {context_report['used_tokens']}/"
+              f"{context_report['budget_tokens']} from {context_report['chunks_used']}/{context_report['chunks_in']} chunks "
+              f"({context_report['trimmed']} trimmed, {context_report['dropped_duplicate']} duplicates dropped)")
+    else:
+        print(f"\n⏱  {timer.report()}")
 
-    # --- 5. Summarize history if memory too long ---
-    if len(history) > 2 * MAX_TURNS:
-        summary = summarize_history(history[:-MAX_TURNS])
-        history = history[-MAX_TURNS:]
+    # --- 4. Update conversation memory (summaries and entities run in the background) ---
+    memory.add(query, response, [chunk["metadata"].get("source") for chunk in chunks])
+    planner.observe_answer(response)  # Entities ready before the follow-up arrives
+    timer.finish(query=query)
 
-    # --- 6. Print conversation history for debugging ---
+    # --- 5. Print conversation memory for debugging ---
     print("\nConversation History:")
-    for i, (q, a) in enumerate(history[-MAX_TURNS:], 1):
+    if memory.summary:
+        print(f"Summary: {memory.summary}\n")
+    for i, (q, a, _) in enumerate(memory.turns, 1):
         print(f"{i}. Q: {q}\n   A: {a}\n")
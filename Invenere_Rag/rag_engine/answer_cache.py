@@ -0,0 +1,123 @@
+# rag_engine/answer_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+import numpy as np
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed by the query embedding. A lookup is a hit
+    when a stored query is at least `threshold` cosine-similar to the new one
+    and its entry has not expired. The index is an in-memory matrix of unit
+    vectors scanned with one matrix-vector product: exact, and well under a
+    millisecond at the few thousand entries this cache is meant to hold.
+    Entries are dropped by LRU, by TTL, and whenever a source file they were
+    answered from is re-indexed or deleted.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 2000, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim), row = slot
+        self._live = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()  # slot -> entry, LRU order
+        self._by_source: Dict[str, Set[int]] = {}
+        # Entries only match lookups of the same partition (e.g. retrieval settings)
+        self._partition = np.full(max_entries, -1, dtype=np.int64)
+        self._partition_ids: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, query_vector: np.ndarray, partition: Hashable = None) -> Optional[dict]:
+        """
+        Returns the best matching live entry ({"query", "answer", "sources",
+        "similarity", ...}) stored under the same partition, or None.
+        """
+        with self._lock:
+            partition_id = self._partition_ids.get(partition)
+            if self._vectors is None or not self._entries or partition_id is None:
+                self.misses += 1
+                return None
+            query = self._normalize(query_vector)
+            similarities = self._vectors @ query
+            similarities[~self._live | (self._partition != partition_id)] = -1.0
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            entry = self._entries.get(slot)
+            if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+                self._drop(slot)
+                entry = None
+            if entry is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return dict(entry, similarity=similarity)
+
+    def store(self, query_vector: np.ndarray, query: str, answer: str, sources: List[str], partition: Hashable = None):
+        with self._lock:
+            vector = self._normalize(query_vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            slot = int(np.argmin(self._live))  # First free slot
+            self._vectors[slot] = vector
+            self._live[slot] = True
+            self._partition[slot] = self._partition_ids.setdefault(partition, len(self._partition_ids))
+            self._entries[slot] = {
+                "query": query, "answer": answer, "sources": list(sources), "created": time.time()
+            }
+            for source in set(sources):
+                self._by_source.setdefault(source, set()).add(slot)
+
+    def invalidate_sources(self, sources: Optional[Iterable[str]]):
+        """
+        Drops every entry answered from one of sources; None drops everything.
+        """
+        with self._lock:
+            if sources is None:
+                slots = list(self._entries)
+            else:
+                slots = set()
+                for source in sources:
+                    slots.update(self._by_source.get(source, ()))
+            for slot in slots:
+                self._drop(slot)
+                self.invalidations += 1
+
+    def _drop(self, slot: int):
+        entry = self._entries.pop(slot, None)
+        self._live[slot] = False
+        if entry:
+            for source in set(entry["sources"]):
+                slots = self._by_source.get(source)
+                if slots:
+                    slots.discard(slot)
+                    if not slots:
+                        del self._by_source[source]
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
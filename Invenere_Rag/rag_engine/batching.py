@@ -0,0 +1,74 @@
+# rag_engine/batching.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls. Items that
+    arrive within max_wait_ms of the first one (up to max_batch of them) are
+    passed together to fn(items) -> results on a dedicated thread, and each
+    caller gets its own result back. Under load, one model forward pass
+    serves many requests. The window is only waited out when the previous
+    batch was shared or more items are already queued, so a lone caller is
+    dispatched immediately.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        name: str = "invenere-batcher"
+    ):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._last_batch_size = 0
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            busy = self._last_batch_size > 1 or not self._queue.empty()
+            deadline = time.perf_counter() + (self.max_wait if busy else 0.0)
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._last_batch_size = len(batch)
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
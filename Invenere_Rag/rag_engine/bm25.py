@@ -0,0 +1,205 @@
+# rag_engine/bm25.py
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from rag_engine.sqlite_db import connect
+
+# Keeps part numbers, versions and codes whole ("ab-1234", "v2.1", "iso_27001")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+_SQL_BATCH = 900
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with what which who how when where why do does".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Compound tokens like "AB-1234" are kept whole and
+    also split into their parts, so "AB-1234", "ab1234"-style partial queries
+    and "AB 1234" all have something to match.
+    """
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses ranked id lists: score(id) = sum over lists of 1 / (k + rank).
+    Returns (id, score) sorted by score descending.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """
+    Inverted BM25 index persisted in SQLite, updated incrementally as chunks
+    are added or deleted. Postings are clustered by term, and document
+    frequencies and corpus length are maintained on write, so a query reads
+    only the postings of its own terms.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.5, read_only: bool = False):
+        """read_only: open an existing index with mode=ro (a missing one is created as usual)."""
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio  # Terms in more than this share of chunks carry ~no signal
+        self._lock = threading.Lock()
+        self.read_only = read_only and os.path.exists(path)
+        self.db = connect(path, self.read_only)
+        if self.read_only:
+            return
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT, doc_id TEXT, tf INTEGER, PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO stats VALUES ('n_docs', 0), ('total_length', 0);
+        """)
+        self.db.commit()
+
+    def _stats(self) -> Tuple[int, int]:
+        stats = dict(self.db.execute("SELECT name, value FROM stats"))
+        return stats["n_docs"], stats["total_length"]
+
+    def count(self) -> int:
+        return self._stats()[0]
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        """
+        Indexes (id, text) pairs. Ids already in the index are replaced.
+        """
+        with self._lock:
+            self._delete(ids)
+            postings = []
+            df = Counter()
+            docs = []
+            total = 0
+            for doc_id, text in zip(ids, texts):
+                tf = Counter(tokenize(text))
+                length = sum(tf.values())
+                docs.append((doc_id, length))
+                total += length
+                for term, count in tf.items():
+                    postings.append((term, doc_id, count))
+                    df[term] += 1
+            self.db.executemany("INSERT INTO docs VALUES (?, ?)", docs)
+            self.db.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            self.db.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items()
+            )
+            self.db.execute("UPDATE stats SET value = value + ? WHERE name = 'n_docs'", (len(docs),))
+            self.db.execute("UPDATE stats SET value = value + ? WHERE name = 'total_length'", (total,))
+            self.db.commit()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            self._delete(list(ids))
+            self.db.commit()
+
+    def _delete(self, ids: Sequence[str]):
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = list(ids[start:start + _SQL_BATCH])
+            placeholders = ",".join("?" * len(batch))
+            docs = self.db.execute(
+                f"SELECT id, length FROM docs WHERE id IN ({placeholders})", batch
+            ).fetchall()
+            if not docs:
+                continue
+            present = [doc_id for doc_id, _ in docs]
+            placeholders = ",".join("?" * len(present))
+            df = self.db.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE doc_id IN ({placeholders}) GROUP BY term", present
+            ).fetchall()
+            self.db.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, t) for t, n in df])
+            self.db.execute("DELETE FROM terms WHERE df <= 0")
+            self.db.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", present)
+            self.db.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", present)
+            self.db.execute("UPDATE stats SET value = value - ? WHERE name = 'n_docs'", (len(docs),))
+            self.db.execute(
+                "UPDATE stats SET value = value - ? WHERE name = 'total_length'",
+                (sum(length for _, length in docs),)
+            )
+
+    def term_stats(self, terms: Sequence[str]) -> Tuple[int, int, Dict[str, int]]:
+        """
+        (n_docs, total_length, {term: df}) for the given terms: what scoring
+        needs from the corpus. Shards add theirs up so every shard scores
+        with the same, global, statistics.
+        """
+        terms = list(terms)
+        with self._lock:
+            n_docs, total_length = self._stats()
+            if not terms:
+                return n_docs, total_length, {}
+            placeholders = ",".join("?" * len(terms))
+            dfs = dict(self.db.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms))
+        return n_docs, total_length, dfs
+
+    def search(
+        self, query: str, top_k: int = 10, stats: Tuple[int, int, Dict[str, int]] = None,
+        ids: Sequence[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Returns up to top_k (id, bm25_score), best first. stats overrides
+        this index's own term_stats() (e.g. with totals over all shards).
+        ids restricts scoring to those documents (a metadata pre-filter);
+        postings of terms more frequent than the candidates are looked up
+        per candidate instead of read in full.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        n_docs, total_length, dfs = stats or self.term_stats(terms)
+        if not n_docs:
+            return []
+        avg_length = total_length / n_docs
+        allowed = None if ids is None else set(ids)
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for term in terms:
+                df = dfs.get(term, 0)
+                if not df or (df > self.max_df_ratio * n_docs and len(dfs) > 1):
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in self._postings(term, allowed, df):
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def _postings(self, term: str, allowed: Optional[Set[str]], df: int):
+        """(doc_id, tf, length) of term's postings, limited to allowed if given."""
+        query = "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?"
+        if allowed is None:
+            return self.db.execute(query, (term,)).fetchall()
+        if len(allowed) >= df:
+            return [row for row in self.db.execute(query, (term,)) if row[0] in allowed]
+        candidates = list(allowed)
+        rows = []
+        for start in range(0, len(candidates), _SQL_BATCH):
+            batch = candidates[start:start + _SQL_BATCH]
+            rows.extend(self.db.execute(
+                f"{query} AND p.doc_id IN ({','.join('?' * len(batch))})", [term] + batch
+            ))
+        return rows
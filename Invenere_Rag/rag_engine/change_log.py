@@ -0,0 +1,53 @@
+# rag_engine/change_log.py
+
+import os
+import threading
+from typing import Iterable, List, Tuple
+
+from rag_engine.sqlite_db import connect
+
+class ChangeLog:
+    """
+    Append-only log of source files whose chunks were written or deleted,
+    shared through SQLite by the indexing and serving processes. Readers keep
+    the last sequence number they saw and ask for what changed since.
+    """
+
+    def __init__(self, path: str, keep: int = 100_000, read_only: bool = False):
+        """read_only: open an existing log with mode=ro (a missing one is created as usual)."""
+        self.keep = keep
+        self._lock = threading.Lock()
+        self.read_only = read_only and os.path.exists(path)
+        self.db = connect(path, self.read_only)
+        if not self.read_only:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT)")
+            self.db.commit()
+
+    def record(self, sources: Iterable[str]):
+        sources = sorted(set(sources))
+        if not sources:
+            return
+        with self._lock:
+            self.db.executemany("INSERT INTO changes (source) VALUES (?)", [(s,) for s in sources])
+            self.db.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (self.keep,))
+            self.db.commit()
+
+    def latest(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def since(self, seq: int) -> Tuple[int, List[str]]:
+        """
+        Returns (latest_seq, sources changed after seq). If seq is older than
+        the retained log, the sources list is None: the caller missed changes
+        and should treat everything as stale.
+        """
+        with self._lock:
+            oldest = self.db.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = self.db.execute("SELECT seq, source FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        if not rows:
+            return seq, []
+        if oldest is not None and oldest > seq + 1:
+            return rows[-1][0], None
+        return rows[-1][0], sorted({source for _, source in rows})
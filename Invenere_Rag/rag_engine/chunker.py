@@ -1,96 +1,253 @@
 # rag_engine/chunker.py
-import nltk
-nltk.download('punkt', quiet=True)
 
 import re
-from typing import List, Dict
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_HEADING_REGEX = r"(Section \d+|^# |\n\d+\.\s)"
+DEFAULT_MAX_TOKENS = 256  # all-MiniLM-L6-v2 truncates input beyond 256 word pieces
+
+# Same word/punctuation pieces as context_builder.approximate_tokens (4/3 tokens per piece)
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_WORD_CHAR = re.compile(r"\w\w")
+# Used when no punkt model is installed: a sentence ends at . ! ? (plus closing
+# quotes/brackets) followed by whitespace and something that can start a sentence
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+_punkt = None
+_punkt_loaded = False
+_punkt_lock = threading.Lock()
+
+@lru_cache(maxsize=16)
+def _compile_heading(pattern: str) -> "re.Pattern":
+    return re.compile(pattern, re.MULTILINE)
+
+def _load_punkt():
+    """
+    The punkt sentence tokenizer, loaded once per process from local NLTK
+    data. Nothing is downloaded: install it ahead of time with
+    `python -m nltk.downloader punkt_tab`. None if it is not available.
+    """
+    global _punkt, _punkt_loaded
+    if _punkt_loaded:
+        return _punkt
+    with _punkt_lock:
+        if not _punkt_loaded:
+            try:
+                from nltk.tokenize.punkt import PunktTokenizer  # NLTK >= 3.8.2 (punkt_tab)
+                _punkt = PunktTokenizer("english")
+            except Exception:
+                try:
+                    import nltk
+                    _punkt = nltk.data.load("tokenizers/punkt/english.pickle")
+                except Exception:
+                    print("NLTK punkt data not found; using the regex sentence splitter.")
+                    _punkt = None
+            _punkt_loaded = True
+    return _punkt
+
+def sentence_spans(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (start, end) character offsets of the sentences in text[start:end].
+    """
+    end = len(text) if end is None else end
+    punkt = _load_punkt()
+    if punkt is not None:
+        for s, e in punkt.span_tokenize(text[start:end]):
+            yield start + s, start + e
+        return
+    for m in _SENTENCE_BOUNDARY.finditer(text, start, end):
+        if m.start() > start:
+            yield start, m.start()
+        start = m.end()
+    if start < end:
+        yield start, end
+
+def _count_pieces(text: str, start: int, end: int) -> int:
+    return len(_PIECES.findall(text, start, end))
+
+def _inside_word(text: str, pos: int) -> bool:
+    return pos > 0 and _WORD_CHAR.match(text, pos - 1, pos + 1) is not None
+
+def _max_pieces(max_tokens: int) -> int:
+    return max(1, max_tokens * 3 // 4)
+
+def _max_chars(max_tokens: int) -> int:
+    # About 4 characters per token: bounds chunks whose pieces are few but
+    # long (base64, URLs, CJK runs), which the piece count cannot see
+    return max(1, max_tokens * 4)
+
+def _split_span(
+    text: str, start: int, end: int, max_chars: int, max_pieces: int, overlap: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Hard split of one over-long span on word/punctuation boundaries, with
+    up to `overlap` characters repeated between consecutive windows. A
+    single piece longer than max_chars (a URL, a base64 blob) is cut by
+    characters.
+    """
+    pieces = []
+    for m in _PIECES.finditer(text, start, end):
+        pieces.extend((s, min(s + max_chars, m.end())) for s in range(m.start(), m.end(), max_chars))
+    i = 0
+    while i < len(pieces):
+        j = i
+        while (j + 1 < len(pieces) and j + 1 - i < max_pieces
+               and pieces[j + 1][1] - pieces[i][0] <= max_chars):
+            j += 1
+        yield pieces[i][0], pieces[j][1]
+        if j + 1 >= len(pieces):
+            break
+        # Overlap only as far as still leaves room for the next piece, so
+        # every window moves on (a huge next piece gets none)
+        k = j + 1
+        while (k - 1 > i and pieces[j][1] - pieces[k - 1][0] <= overlap
+               and pieces[j + 1][1] - pieces[k - 1][0] <= max_chars and j + 2 - k < max_pieces):
+            k -= 1
+        i = k
+
+def _pack_sentences(
+    text: str, spans: Iterable[Tuple[int, int]], max_chars: int, max_pieces: int, overlap: int
+) -> Iterator[Tuple[int, int, int, int, int]]:
+    """
+    Greedily packs consecutive sentences into chunks of at most max_chars
+    characters and max_pieces pieces. The next chunk starts with the trailing
+    whole sentences of the previous one that fit in `overlap` characters, or
+    failing that, the last sentence's final words within `overlap`.
+    Yields (start, end, first_sentence, last_sentence, pieces).
+    """
+    window: List[Tuple[int, int, int, int]] = []  # (start, end, pieces, sentence index)
+    pieces = 0
+    for idx, (s, e) in enumerate(spans):
+        n = _count_pieces(text, s, e)
+        if not n:
+            continue
+        if window and (e - window[0][0] > max_chars or pieces + n > max_pieces):
+            yield window[0][0], window[-1][1], window[0][3], window[-1][3], pieces
+            last_end = window[-1][1]
+            k = len(window)
+            while k - 1 >= 1 and last_end - window[k - 1][0] <= overlap:
+                k -= 1
+            if k == len(window) and overlap > 0:
+                # No whole sentence fits: carry the tail of the last one instead
+                ls, le, _, lidx = window[-1]
+                cut = max(ls, le - overlap)
+                tail = [m.start() for m in _PIECES.finditer(text, cut, le)]
+                if tail and tail[0] == cut and _inside_word(text, cut):
+                    tail.pop(0)
+                if tail and tail[0] > ls:
+                    window[-1] = (tail[0], le, len(tail), lidx)
+                    k -= 1
+            window = window[k:]
+            pieces = sum(w[2] for w in window)
+            while window and (e - window[0][0] > max_chars or pieces + n > max_pieces):
+                pieces -= window.pop(0)[2]
+        window.append((s, e, n, idx))
+        pieces += n
+    if window:
+        yield window[0][0], window[-1][1], window[0][3], window[-1][3], pieces
+
+def _chunk(text: str, start: int, end: int, metadata: Dict) -> Optional[Dict]:
+    """
+    A chunk dict for text[start:end] with surrounding whitespace trimmed, so
+    chunk_start/chunk_end point exactly at the chunk text.
+    """
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start == end:
+        return None
+    metadata.update(chunk_start=start, chunk_end=end)
+    return {"text": text[start:end], "metadata": metadata}
+
+def _bounded_chunks(
+    text: str, start: int, end: int, max_chars: int, max_pieces: int, overlap: int,
+    heading: Optional[str], chunk_type: str
+) -> Iterator[Dict]:
+    """
+    Sentence-packed chunks of text[start:end]; a single sentence over the
+    limits is cut into "window" chunks.
+    """
+    packed = _pack_sentences(text, sentence_spans(text, start, end), max_chars, max_pieces, overlap)
+    for s, e, first, last, pieces in packed:
+        if pieces <= max_pieces and e - s <= max_chars:
+            meta = {"heading": heading, "chunk_type": chunk_type}
+            if chunk_type == "sentence":
+                meta.update(chunk_start_sentence=first, chunk_end_sentence=last)
+            chunk = _chunk(text, s, e, meta)
+            if chunk:
+                yield chunk
+            continue
+        for ws, we in _split_span(text, s, e, max_chars, max_pieces, overlap):
+            chunk = _chunk(text, ws, we, {"heading": heading, "chunk_type": "window"})
+            if chunk:
+                yield chunk
+
+def _first_line(text: str, start: int, end: int) -> str:
+    while start < end and text[start].isspace():
+        start += 1
+    newline = text.find("\n", start, end)
+    return text[start:newline if newline != -1 else end].strip()
+
+def iter_chunks(
+    text: str,
+    max_length: int = 350,
+    overlap: int = 50,
+    heading_regex: str = DEFAULT_HEADING_REGEX,
+    max_tokens: int = DEFAULT_MAX_TOKENS
+) -> Iterator[Dict]:
+    """
+    Streams {"text", "metadata"} chunks of text, in document order.
+    1. With two or more headings: one chunk per heading section; sections
+       over max_tokens are split on sentences, keeping the heading metadata.
+       Text before the first heading becomes its own section.
+    2. Otherwise: sentences packed up to max_length characters.
+    3. Sentences over the limits are cut on word boundaries ("window").
+    No chunk exceeds max_tokens (estimated as in approximate_tokens) or
+    4 * max_tokens characters.
+    Consecutive split chunks share up to `overlap` characters.
+    Every chunk has chunk_start/chunk_end character offsets into text.
+    """
+    max_pieces = _max_pieces(max_tokens)
+    max_chars = _max_chars(max_tokens)
+    headings = [m.start() for m in _compile_heading(heading_regex).finditer(text)]
+
+    if len(headings) > 1:
+        preamble = bool(text[:headings[0]].strip())
+        bounds = ([0] if preamble else []) + headings + [len(text)]
+        for i in range(len(bounds) - 1):
+            start, end = bounds[i], bounds[i + 1]
+            heading = None if preamble and i == 0 else _first_line(text, start, end)
+            if end - start <= max_chars and _count_pieces(text, start, end) <= max_pieces:
+                chunk = _chunk(text, start, end, {"heading": heading, "chunk_type": "heading"})
+                if chunk:
+                    yield chunk
+            else:
+                yield from _bounded_chunks(
+                    text, start, end, max_chars, max_pieces, overlap, heading, "heading"
+                )
+        return
+
+    yield from _bounded_chunks(text, 0, len(text), min(max_length, max_chars), max_pieces, overlap, None, "sentence")
 
 def robust_chunker(
     text: str,
     max_length: int = 350,
     overlap: int = 50,
-    heading_regex: str = r"(Section \d+|^# |\n\d+\.\s)"
+    heading_regex: str = DEFAULT_HEADING_REGEX,
+    max_tokens: int = DEFAULT_MAX_TOKENS
 ) -> List[Dict]:
     """
-    Robust chunker: 
+    Robust chunker:
     1. Split by headings (if present, using heading_regex),
-    2. Fallback: sentence-based chunking (if long enough),
-    3. Fallback: sliding window by characters.
-    Adds metadata: heading (if any), chunk_start, chunk_end.
-    Returns list of dicts: {"text": ..., "metadata": ...}
+    2. Fallback: sentence-based chunking,
+    3. Fallback: word-boundary windows for over-long sentences.
+    Adds metadata: heading (if any), chunk_start, chunk_end, chunk_type.
+    Returns list of dicts: {"text": ..., "metadata": ...}; see iter_chunks.
     """
-    chunks = []
-    used_headings = False
-
-    # 1. Try section/heading-based chunking
-    headings = [m.start() for m in re.finditer(heading_regex, text, re.MULTILINE)]
-    if len(headings) > 1:
-        used_headings = True
-        for i, start in enumerate(headings):
-            end = headings[i + 1] if i + 1 < len(headings) else len(text)
-            chunk_text = text[start:end].strip()
-            # Extract heading (first non-empty line)
-            heading_lines = [l for l in chunk_text.splitlines() if l.strip()]
-            heading = heading_lines[0] if heading_lines else ""
-            chunks.append({
-                "text": chunk_text,
-                "metadata": {
-                    "heading": heading,
-                    "chunk_start": start,
-                    "chunk_end": end,
-                    "chunk_type": "heading"
-                }
-            })
-        return chunks
-
-    # 2. Fallback: sentence-based chunking (using nltk)
-    try:
-        import nltk
-        nltk.download('punkt', quiet=True)
-        from nltk.tokenize import sent_tokenize
-        sentences = sent_tokenize(text)
-        chunk = ""
-        sent_idx = 0
-        while sent_idx < len(sentences):
-            chunk_start_idx = sent_idx
-            chunk = sentences[sent_idx]
-            sent_idx += 1
-            # Add sentences until we hit max_length
-            while sent_idx < len(sentences) and len(chunk) + len(sentences[sent_idx]) < max_length:
-                chunk += " " + sentences[sent_idx]
-                sent_idx += 1
-            # Overlap: backtrack by N sentences if possible
-            overlap_idx = max(0, sent_idx - overlap // 20)
-            chunks.append({
-                "text": chunk.strip(),
-                "metadata": {
-                    "heading": None,
-                    "chunk_start_sentence": chunk_start_idx,
-                    "chunk_end_sentence": sent_idx - 1,
-                    "chunk_type": "sentence"
-                }
-            })
-        if chunks:
-            return chunks
-    except Exception as e:
-        print("Sentence-based chunking failed:", e)
-
-    # 3. Fallback: sliding window by characters
-    i = 0
-    n = len(text)
-    while i < n:
-        chunk_text = text[i:i + max_length]
-        chunks.append({
-            "text": chunk_text.strip(),
-            "metadata": {
-                "heading": None,
-                "chunk_start": i,
-                "chunk_end": min(i + max_length, n),
-                "chunk_type": "window"
-            }
-        })
-        i += max_length - overlap
-    return chunks
+    return list(iter_chunks(text, max_length, overlap, heading_regex, max_tokens))
 
 # Example function for your pipeline (for plain text docs)
 def chunk_text(doc_text: str) -> List[str]:
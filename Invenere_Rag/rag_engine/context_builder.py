@@ -0,0 +1,169 @@
+# rag_engine/context_builder.py
+
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+def approximate_tokens(text: str) -> int:
+    """
+    Tokenizer-free estimate: BPE vocabularies average about 4/3 tokens per
+    word or punctuation mark in English prose.
+    """
+    return (len(_PIECES.findall(text)) * 4 + 2) // 3
+
+# Share of the prompt budget filled when tokens are only estimated: the
+# estimate runs low on code, numbers and non-English text
+APPROXIMATE_BUDGET_SHARE = 0.85
+
+def make_token_counter(tokenizer_name: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Token counter for the answering LLM. tokenizer_name is a Hugging Face
+    tokenizer matching the Ollama model (e.g. the Llama 3 tokenizer); without
+    one, or if it cannot be loaded, a word-based estimate is used.
+    """
+    if tokenizer_name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            print(f"Could not load tokenizer {tokenizer_name} ({e}); estimating token counts.")
+    return approximate_tokens
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _span(meta: Dict) -> Optional[Tuple[str, int, int]]:
+    """
+    The chunk's position in its file: character offsets, or sentence
+    indices for sentence chunks. Metadata values may be stringified.
+    """
+    for kind, start_key, end_key in (
+        ("chars", "chunk_start", "chunk_end"),
+        ("sentences", "chunk_start_sentence", "chunk_end_sentence"),
+    ):
+        start, end = _as_int(meta.get(start_key)), _as_int(meta.get(end_key))
+        if start is not None and end is not None:
+            return kind, start, end
+    return None
+
+def _span_overlap(span: Tuple[str, int, int], other: Tuple[str, int, int]) -> float:
+    """Share of the shorter of two spans that the other covers (sentence ends are inclusive)."""
+    inclusive = 1 if span[0] == "sentences" else 0
+    shared = min(span[2], other[2]) - max(span[1], other[1]) + inclusive
+    shorter = min(span[2] - span[1], other[2] - other[1]) + inclusive
+    return max(0, shared) / shorter if shorter > 0 else 0.0
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+class ContextBuilder:
+    """
+    Packs ranked chunks into a token budget for the answer prompt. Chunks are
+    taken best first; near-duplicates (windows of the same file that mostly
+    overlap, or mostly the same text) are dropped; a chunk that does not fit whole is
+    cut down to its sentences that share the most terms with the query.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int] = approximate_tokens,
+        min_chunk_tokens: int = 32,
+        duplicate_similarity: float = 0.6,
+        duplicate_overlap: float = 0.5
+    ):
+        """
+        duplicate_overlap: share of the shorter of two same-file spans that
+        must overlap for it to count as a duplicate; neighbouring chunks
+        share a small overlap and are both kept.
+        """
+        self.count_tokens = count_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.duplicate_similarity = duplicate_similarity
+        self.duplicate_overlap = duplicate_overlap
+
+    @staticmethod
+    def format_chunk(text: str, meta: Dict) -> str:
+        if meta.get("heading"):
+            return f"[Section: {meta['heading']}] {text}"
+        return text
+
+    def _is_duplicate(self, meta: Dict, shingles, selected) -> bool:
+        span = _span(meta)
+        for other_meta, other_shingles in selected:
+            if span and meta.get("source") and meta.get("source") == other_meta.get("source"):
+                other_span = _span(other_meta)
+                if other_span and other_span[0] == span[0] and _span_overlap(span, other_span) >= self.duplicate_overlap:
+                    return True
+            union = len(shingles | other_shingles)
+            if union and len(shingles & other_shingles) / union >= self.duplicate_similarity:
+                return True
+        return False
+
+    def _trim(self, query: str, text: str, budget: int) -> Optional[str]:
+        sentences = [s for s in _SENTENCE_END.split(text) if s.strip()]
+        query_terms = set(_WORD.findall(query.lower()))
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: len(query_terms & set(_WORD.findall(sentences[i].lower()))),
+            reverse=True
+        )
+        keep = []
+        used = 0
+        for i in ranked:
+            cost = self.count_tokens(sentences[i]) + 1
+            if used + cost > budget:
+                continue
+            keep.append(i)
+            used += cost
+        if used < self.min_chunk_tokens:
+            return None
+        return " … ".join(sentences[i] for i in sorted(keep))
+
+    def build(self, query: str, chunks: List[Dict], budget_tokens: int) -> Tuple[str, Dict]:
+        """
+        chunks: retrieve() results ({"text", "metadata", ...}), best first.
+        Returns (context, report); report records the budget use and why
+        chunks were left out.
+        """
+        report = {
+            "budget_tokens": budget_tokens, "used_tokens": 0, "chunks_in": len(chunks),
+            "chunks_used": 0, "trimmed": 0, "dropped_duplicate": 0, "dropped_budget": 0,
+        }
+        pieces = []
+        selected = []
+        remaining = budget_tokens
+        separator_tokens = self.count_tokens("\n\n")
+        for chunk in chunks:
+            text, meta = chunk["text"], chunk["metadata"]
+            shingles = _shingles(text)
+            if self._is_duplicate(meta, shingles, selected):
+                report["dropped_duplicate"] += 1
+                continue
+            if remaining < self.min_chunk_tokens:
+                report["dropped_budget"] += 1
+                continue
+            piece = self.format_chunk(text, meta)
+            cost = self.count_tokens(piece) + separator_tokens
+            if cost > remaining:
+                heading_cost = cost - self.count_tokens(text)
+                trimmed = self._trim(query, text, remaining - heading_cost)
+                if trimmed is None:
+                    report["dropped_budget"] += 1
+                    continue
+                piece = self.format_chunk(trimmed, meta)
+                cost = self.count_tokens(piece) + separator_tokens
+                report["trimmed"] += 1
+            pieces.append(piece)
+            selected.append((meta, shingles))
+            remaining -= cost
+            report["used_tokens"] += cost
+            report["chunks_used"] += 1
+        return "\n\n".join(pieces), report
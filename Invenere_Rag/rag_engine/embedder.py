@@ -1,16 +1,168 @@
 # rag_engine/embedder.py
 
-from sentence_transformers import SentenceTransformer
-from typing import List
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
 import numpy as np
 
+from rag_engine.batching import MicroBatcher
+from rag_engine.embedding_cache import EmbeddingCache
+from rag_engine.model_registry import MODELS
+
+_worker_model = None
+
+def _init_worker(model_name: str, backend: str, onnx_file: Optional[str], threads: int):
+    global _worker_model
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = MODELS.get("sentence_transformer", model_name, backend=backend, onnx_file=onnx_file)
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+def length_buckets(lengths: List[int], token_budget: int = 16384, max_batch: int = 256) -> List[List[int]]:
+    """
+    Groups item indices into batches of similar length. Items are sorted by
+    length and each batch takes as many as fit token_budget padded tokens
+    (batch size * longest item), so short chunks run in large batches and long
+    ones in small batches, with little padding in either.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        # Sorted ascending, so the current item is the longest in the batch
+        if batch and ((len(batch) + 1) * max(lengths[i], 1) > token_budget or len(batch) >= max_batch):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
 class Embedder:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: Optional[str] = "./embedding_cache",
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+        workers: int = 1,
+        micro_batch_ms: Optional[float] = None
+    ):
+        """
+        cache_dir: where the persistent embedding cache lives; None disables it.
+        backend/onnx_file: SentenceTransformer backend, e.g. "onnx" with a
+        quantized int8 export. workers: processes used by embed_bulk.
+        micro_batch_ms: if set, concurrent embed_query calls arriving within
+        this window are embedded in one forward pass.
+        The model itself is loaded on first use (see model_registry), and
+        shared with every other Embedder of the process using it.
+        """
+        self.model_name = model_name
+        self.backend = backend
+        self.onnx_file = onnx_file
+        self.workers = max(1, workers)
+        cache_name = model_name if backend == "torch" else f"{model_name}-{backend}-{onnx_file or 'default'}"
+        self.cache = EmbeddingCache(cache_name, cache_dir=cache_dir) if cache_dir else None
+        self._pool = None
+        self._query_batcher = (
+            MicroBatcher(self.embed_chunks, max_wait_ms=micro_batch_ms, name="invenere-embed-batcher")
+            if micro_batch_ms else None
+        )
+
+    @property
+    def model(self):
+        return MODELS.get("sentence_transformer", self.model_name, backend=self.backend, onnx_file=self.onnx_file)
+
+    def _encode(self, chunks: List[str]) -> np.ndarray:
+        return self.model.encode(chunks, convert_to_numpy=True, show_progress_bar=len(chunks) > 256)
 
     def embed_chunks(self, chunks: List[str]) -> np.ndarray:
         """
         Converts a list of text chunks into vector embeddings.
         Returns a NumPy array of shape (n_chunks, embedding_dim).
+        Cached chunks are served from the embedding cache; only the misses
+        (deduplicated) are sent to the model.
+        """
+        return self._embed_cached(chunks, self._encode)
+
+    def embed_query(self, query: str) -> np.ndarray:
         """
-        return self.model.encode(chunks, convert_to_numpy=True, show_progress_bar=True)
+        Embeds one query string and returns its (embedding_dim,) vector,
+        coalesced with concurrent callers when micro-batching is on.
+        """
+        if self._query_batcher is not None:
+            return self._query_batcher(query)
+        return self.embed_chunks([query])[0]
+
+    def embed_bulk(self, chunks: List[str], token_budget: int = 16384, max_batch: int = 256) -> np.ndarray:
+        """
+        Bulk-indexing variant of embed_chunks: buckets chunks by token length,
+        sizes each batch to token_budget, and spreads batches over self.workers
+        processes. Rows come back in the original order.
+        """
+        return self._embed_cached(
+            chunks, lambda texts: self._encode_bucketed(texts, token_budget, max_batch)
+        )
+
+    def _embed_cached(self, chunks: List[str], encode) -> np.ndarray:
+        if self.cache is None or not chunks:
+            return encode(chunks)
+
+        vectors, missing = self.cache.get_many(chunks)
+        if missing:
+            unique_texts = list(dict.fromkeys(chunks[i] for i in missing))
+            encoded = encode(unique_texts)
+            self.cache.put_many(unique_texts, encoded)
+            by_text = dict(zip(unique_texts, encoded))
+            for i in missing:
+                vectors[i] = by_text[chunks[i]]
+        return np.stack(vectors).astype(np.float32, copy=False)
+
+    def _encode_bucketed(self, chunks: List[str], token_budget: int, max_batch: int) -> np.ndarray:
+        if not chunks:
+            return self.model.encode(chunks, convert_to_numpy=True, show_progress_bar=False)
+        max_len = self.model.max_seq_length
+        lengths = [
+            len(ids) for ids in
+            self.model.tokenizer(chunks, add_special_tokens=True, truncation=True, max_length=max_len)["input_ids"]
+        ]
+        batches = length_buckets(lengths, token_budget=token_budget, max_batch=max_batch)
+        texts = [[chunks[i] for i in batch] for batch in batches]
+
+        if self.workers > 1:
+            results = self._get_pool().map(_encode_in_worker, texts)
+        else:
+            results = (
+                self.model.encode(t, batch_size=len(t), convert_to_numpy=True, show_progress_bar=False)
+                for t in texts
+            )
+
+        output = None
+        for batch, vectors in zip(batches, results):
+            if output is None:
+                output = np.empty((len(chunks), vectors.shape[1]), dtype=np.float32)
+            output[batch] = vectors
+        return output
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),  # fork + torch threads can deadlock
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.onnx_file, threads)
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
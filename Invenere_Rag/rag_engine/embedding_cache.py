@@ -0,0 +1,204 @@
+# rag_engine/embedding_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+_SQL_BATCH = 900  # Stay under SQLite's bound-parameter limit
+_GROW_ROWS = 65536
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one model, keyed by the hash of the normalized
+    chunk text. Vectors live in a memory-mapped float16/float32 matrix
+    (vectors.bin), the key -> row index and LRU clock in SQLite (index.sqlite),
+    with a small in-memory LRU in front. Once max_rows is reached, the least
+    recently used rows are evicted and their slots reused.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str = "./embedding_cache",
+        dtype: str = "float16",
+        max_rows: int = 2_000_000,
+        memory_items: int = 10_000
+    ):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.max_rows = max_rows
+        self.memory_items = memory_items
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.bin")
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._vectors = None
+        self._mapped_rows = 0
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+
+        self.db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER, last_used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+        meta = dict(self.db.execute("SELECT name, value FROM meta"))
+        if "dim" in meta:
+            self.dim = int(meta["dim"])
+            if meta.get("dtype") != self.dtype.name:
+                self.dtype = np.dtype(meta["dtype"])  # The file on disk decides
+
+    def _map(self, min_rows: int = 0):
+        """
+        (Re)maps vectors.bin, growing the file if it is smaller than min_rows.
+        Other processes may have grown it too, so the size is taken from disk.
+        """
+        row_bytes = self.dim * self.dtype.itemsize
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = size // row_bytes
+        if rows < min_rows:
+            rows = min(self.max_rows, max(min_rows, rows + _GROW_ROWS))
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        if rows and rows != self._mapped_rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(rows, self.dim))
+            self._mapped_rows = rows
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        Batched lookup. Returns (vectors, missing): vectors[i] is a float32 array
+        or None, and missing lists the indices of texts not in the cache.
+        """
+        keys = [text_key(t) for t in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            pending = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            if pending and self.dim is not None:
+                pending_keys = list(pending)
+                rows = {}
+                for start in range(0, len(pending_keys), _SQL_BATCH):
+                    batch = pending_keys[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.update(self.db.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch
+                    ))
+                if rows:
+                    self._map(max(rows.values()) + 1 if max(rows.values()) >= self._mapped_rows else 0)
+                    hit_keys = list(rows)
+                    matrix = np.asarray(self._vectors[[rows[k] for k in hit_keys]], dtype=np.float32)
+                    for key, vector in zip(hit_keys, matrix):
+                        self._remember(key, vector)
+                        for i in pending[key]:
+                            found[i] = vector
+                    now = time.time_ns()
+                    self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in hit_keys])
+                    self.db.commit()
+
+        missing = [i for i, vector in enumerate(found) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """
+        Stores vectors (n, dim) for texts, evicting least recently used rows if
+        the cache is full.
+        """
+        unique = {}
+        for text, vector in zip(texts, vectors):
+            unique[text_key(text)] = vector
+        if not unique:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dtype', ?)", (self.dtype.name,))
+                self.db.commit()
+
+            # Row allocation happens inside one write transaction, so several
+            # processes can share a cache directory safely.
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(unique)
+                existing = set()
+                for start in range(0, len(keys), _SQL_BATCH):
+                    batch = keys[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    existing.update(k for (k,) in self.db.execute(
+                        f"SELECT key FROM entries WHERE key IN ({placeholders})", batch
+                    ))
+                keys = [k for k in keys if k not in existing][:self.max_rows]
+
+                next_row = int(dict(self.db.execute("SELECT name, value FROM meta")).get("next_row", 0))
+                fresh = min(len(keys), self.max_rows - next_row)
+                rows = list(range(next_row, next_row + fresh))
+                evict = len(keys) - fresh
+                if evict:
+                    victims = self.db.execute(
+                        "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (evict,)
+                    ).fetchall()
+                    self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+                    rows.extend(row for _, row in victims)
+                    for k, _ in victims:
+                        self._memory.pop(k, None)
+                keys = keys[:len(rows)]
+
+                if keys:
+                    self._map(max(rows) + 1)
+                    self._vectors[rows] = np.stack([unique[k] for k in keys]).astype(self.dtype)
+                    self._vectors.flush()
+                    now = time.time_ns()
+                    self.db.executemany(
+                        "INSERT INTO entries VALUES (?, ?, ?)",
+                        [(k, row, now) for k, row in zip(keys, rows)]
+                    )
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('next_row', ?)", (str(next_row + fresh),)
+                    )
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            for k in keys:
+                self._remember(k, np.asarray(unique[k], dtype=np.float32))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "rows": self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+        }
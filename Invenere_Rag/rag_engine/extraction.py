@@ -0,0 +1,318 @@
+# rag_engine/extraction.py
+
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from bisect import bisect_right
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: no address-space limit, timeouts still apply
+    resource = None
+
+EXTRACTOR_VERSION = 1  # Bump when extracted text changes; old cache entries are then ignored
+# Formats with pages; also the only ones cached, plain text is cheaper to re-read than to decompress
+PAGED_EXTS = (".pdf", ".docx")
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """
+    Text of each PDF page in order. Only one page object is alive at a time.
+    """
+    import fitz
+    doc = fitz.open(file_path)
+    try:
+        for page_number in range(doc.page_count):
+            page = doc.load_page(page_number)
+            yield page.get_text()
+            del page
+    finally:
+        doc.close()
+
+def iter_docx_pages(file_path: str) -> Iterator[str]:
+    """
+    DOCX has no fixed pages; pages are split at explicit page breaks and at
+    the break positions Word saved when the file was last rendered.
+    """
+    import docx
+    document = docx.Document(file_path)
+    lines: List[str] = []
+    for para in document.paragraphs:
+        if lines and para._p.xpath("./w:r/w:lastRenderedPageBreak | ./w:r/w:br[@w:type='page']"):
+            yield "\n".join(lines)
+            lines = []
+        lines.append(para.text)
+    yield "\n".join(lines)
+
+def iter_pages(file_path: str) -> Iterator[str]:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".pdf":
+        yield from iter_pdf_pages(file_path)
+    elif ext == ".docx":
+        yield from iter_docx_pages(file_path)
+    elif ext in (".txt", ".md"):
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            yield f.read()
+    else:
+        # An error, not an empty document, so the file is not recorded as indexed
+        raise ValueError(f"Unsupported file format: {file_path}")
+
+def join_pages(pages: List[str]) -> Tuple[str, List[int]]:
+    """
+    The document text (pages joined by newlines, as the old extractors did)
+    and the character offset at which each page starts.
+    """
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1
+    return "\n".join(pages), offsets
+
+def page_at(page_offsets: List[int], char_offset: int) -> int:
+    """1-based page number containing char_offset."""
+    return max(1, bisect_right(page_offsets, char_offset))
+
+class ExtractionCache:
+    """
+    Extracted pages of binary documents as gzip-compressed JSON, keyed by
+    the file's SHA-256, so a re-index (or a renamed/copied file) skips
+    parsing entirely. Entries are immutable; the directory can be deleted
+    at any time.
+    """
+
+    def __init__(self, cache_dir: str = "./extraction_cache", compresslevel: int = 6):
+        self.cache_dir = cache_dir
+        self.compresslevel = compresslevel
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f"{sha256}.v{EXTRACTOR_VERSION}.json.gz")
+
+    def get(self, sha256: str) -> Optional[List[str]]:
+        try:
+            with gzip.open(self._path(sha256), "rt", encoding="utf-8") as f:
+                pages = json.load(f)["pages"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages
+
+    def put(self, sha256: str, pages: List[str]):
+        path = self._path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=self.compresslevel) as f:
+            json.dump({"pages": pages}, f)
+        os.replace(tmp_path, path)
+
+def _file_size(file_path: str) -> int:
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+def _mapped_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _limit_memory(memory_limit_mb: Optional[int]):
+    """
+    Caps the worker's address space at what it already maps (the
+    interpreter and its imports) plus memory_limit_mb, so a runaway document fails
+    with MemoryError instead of exhausting the machine.
+    """
+    if not memory_limit_mb or resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = _mapped_bytes() + memory_limit_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        print(f"Could not limit extraction memory: {e}")
+
+def _worker_main(conn, memory_limit_mb: Optional[int], max_chars: int):
+    # One file at a time: receives a path, streams ("page", text) messages and
+    # finishes with ("done", (truncated, seconds)) or ("error", message). None stops it.
+    _limit_memory(memory_limit_mb)
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if file_path is None:
+            return
+        try:
+            started = time.perf_counter()
+            chars, truncated = 0, False
+            for page in iter_pages(file_path):
+                conn.send(("page", page))
+                chars += len(page)
+                if chars >= max_chars:
+                    truncated = True
+                    break
+            conn.send(("done", (truncated, time.perf_counter() - started)))
+        except MemoryError:
+            conn.send(("error", f"memory limit of {memory_limit_mb} MB exceeded"))
+        except Exception as e:
+            conn.send(("error", str(e) or type(e).__name__))
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb: Optional[int], max_chars: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_limit_mb, max_chars),
+            name="invenere-extract", daemon=True
+        )
+        self.process.start()
+        child_conn.close()  # So a dead worker shows up as EOF on self.conn
+        self.file_path: Optional[str] = None
+        self.sha256: Optional[str] = None
+        self.pages: List[str] = []
+        self.deadline = 0.0
+
+    def assign(self, file_path: str, sha256: Optional[str], timeout: float):
+        self.file_path, self.sha256, self.pages = file_path, sha256, []
+        self.deadline = time.monotonic() + timeout
+        self.conn.send(file_path)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+def extract_pages(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    timeout: float = 120.0,
+    memory_limit_mb: Optional[int] = 2048,
+    max_chars: int = 20_000_000,
+    cache: Optional[ExtractionCache] = None,
+    hashes: Optional[Dict[str, str]] = None,
+    timer=None
+) -> Iterator[Tuple[str, Optional[List[str]]]]:
+    """
+    Extracts paths in long-lived worker processes and yields (path, pages)
+    as each file finishes (completion order). Each worker handles one file
+    at a time, so at most `workers` files are in flight. A file that runs
+    past `timeout` seconds gets its worker killed; so does a worker that
+    crashes (e.g. in MuPDF). Either way a fresh worker takes the next file. Failed files are reported
+    and yielded with pages None, unlike documents without text (an empty
+    list), so callers can retry them. Text beyond max_chars per file is dropped.
+    PDF/DOCX pages are read from and written to `cache` when given, keyed
+    by hashes[path] or the file's SHA-256. timer (a StageTimer) gets the
+    workers' parse seconds and parsed_files/parsed_bytes/parse_cache_hits.
+    """
+    from rag_engine.manifest import file_hash
+
+    workers = workers or os.cpu_count() or 1
+    # Not fork: the indexer runs threads (watcher, embedding, timers), and a
+    # child forked while one of them holds a lock can deadlock on it
+    ctx = multiprocessing.get_context(
+        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    pool: List[_Worker] = []
+    idle: List[_Worker] = []
+    path_iter = iter(paths)
+    exhausted = False
+
+    def cache_key(file_path: str) -> Optional[str]:
+        if cache is None or not file_path.lower().endswith(PAGED_EXTS):
+            return None
+        try:
+            return (hashes or {}).get(file_path) or file_hash(file_path)
+        except OSError:
+            return None
+
+    def retire(worker: _Worker) -> str:
+        worker.kill()
+        pool.remove(worker)
+        return worker.file_path
+
+    try:
+        while True:
+            while not exhausted and (idle or len(pool) < workers):
+                try:
+                    file_path = next(path_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                sha256 = cache_key(file_path)
+                if sha256:
+                    pages = cache.get(sha256)
+                    if pages is not None:
+                        if timer:
+                            timer.count("parse_cache_hits")
+                        yield file_path, pages
+                        continue
+                if not idle:
+                    worker = _Worker(ctx, memory_limit_mb, max_chars)
+                    pool.append(worker)
+                else:
+                    worker = idle.pop()
+                worker.assign(file_path, sha256, timeout)
+
+            busy = [w for w in pool if w.file_path is not None]
+            if not busy:
+                break
+            remaining = min(w.deadline for w in busy) - time.monotonic()
+            ready = wait([w.conn for w in busy], timeout=max(0.0, remaining))
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        kind, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        code = worker.process.exitcode
+                        print(f"⚠️ Skipping {worker.file_path}: extraction worker exited (code {code})")
+                        yield retire(worker), None
+                        continue
+                    if kind != "page":
+                        file_path, sha256, pages = worker.file_path, worker.sha256, worker.pages
+                        worker.file_path, worker.pages = None, []
+                        idle.append(worker)
+                        if kind == "error":
+                            print(f"⚠️ Skipping {file_path} due to error: {payload}")
+                            pages = None
+                        else:
+                            truncated, seconds = payload
+                            if truncated:
+                                print(f"⚠️ {file_path}: text truncated at {max_chars} characters")
+                            if sha256:
+                                cache.put(sha256, pages)
+                            if timer:
+                                timer.record("parse", seconds)
+                                timer.count("parsed_files")
+                                timer.count("parsed_bytes", _file_size(file_path))
+                        yield file_path, pages
+                        continue
+                    worker.pages.append(payload)
+                if time.monotonic() >= worker.deadline:
+                    print(f"⚠️ Skipping {worker.file_path}: extraction timed out after {timeout:.0f}s")
+                    yield retire(worker), None
+    finally:
+        for worker in pool:
+            if worker.file_path is None:
+                worker.stop()
+            else:
+                worker.kill()
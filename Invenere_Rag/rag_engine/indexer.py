@@ -0,0 +1,232 @@
+# rag_engine/indexer.py
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rag_engine.chunker import robust_chunker
+from rag_engine.extraction import ExtractionCache, page_at
+from rag_engine.manifest import Manifest
+from rag_engine.parser import discover_files, iter_documents
+
+_DONE = object()
+
+def chunk_document(
+    file_path: str,
+    text: str,
+    chunker: Callable = robust_chunker,
+    page_offsets: Optional[List[int]] = None
+) -> List[Tuple[str, str, dict]]:
+    """
+    Chunks one document into (file_path, chunk_text, chunk_metadata) triples.
+    Each chunk's metadata gets chunk_index, its position within the file, which
+    the vector store uses for stable per-file chunk ids. With page_offsets
+    (from the parser), chunks also get the page and page_end they span.
+    """
+    triples = []
+    for chunk_dict in chunker(text):
+        if chunk_dict["text"]:
+            metadata = dict(chunk_dict.get("metadata", {}))
+            metadata["chunk_index"] = len(triples)
+            if page_offsets and "chunk_start" in metadata:
+                metadata["page"] = page_at(page_offsets, metadata["chunk_start"])
+                metadata["page_end"] = page_at(page_offsets, max(metadata["chunk_start"], metadata["chunk_end"] - 1))
+            triples.append((file_path, chunk_dict["text"], metadata))
+    return triples
+
+def iter_chunk_batches(
+    documents: Iterable[Tuple],
+    batch_size: int = 2000,
+    chunker: Callable = robust_chunker,
+    timer=None
+) -> Iterator[List[Tuple[str, str, dict]]]:
+    """
+    Consumes a (path, text[, page_offsets]) stream and yields lists of chunk
+    triples holding roughly batch_size chunks. A file's chunks never straddle
+    two batches. timer (a StageTimer) gets the chunk stage.
+    """
+    batch = []
+    for item in documents:
+        file_path, text = item[:2]
+        page_offsets = item[2] if len(item) > 2 else None
+        try:
+            if not text or not text.strip():
+                print(f"Skipped empty file: {file_path}")
+                continue
+            start = time.perf_counter()
+            chunks = chunk_document(file_path, text, chunker, page_offsets)
+            if timer:
+                timer.record("chunk", time.perf_counter() - start)
+                timer.count("chunks", len(chunks))
+                timer.count("text_chars", len(text))
+            batch.extend(chunks)
+        except Exception as e:
+            print(f"Skipping {file_path}: {e}")
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_index(
+    pipeline,
+    documents: Iterable[Tuple],
+    batch_size: int = 2000,
+    queue_size: int = 4,
+    chunker: Callable = robust_chunker,
+    replace: bool = False,
+    on_indexed: Optional[Callable[[List[Tuple[str, str, dict]]], None]] = None,
+    timer=None
+) -> Dict[str, int]:
+    """
+    Indexes a document stream with parsing/chunking on a producer thread and
+    embedding/writing on the caller's thread, connected by a bounded queue.
+    When embedding falls behind, the producer blocks, which in turn stops new
+    files from being submitted to the parser pool, so peak memory depends on
+    queue_size * batch_size and the parser's in-flight window only.
+    Each batch's write is committed while the next batch is embedded.
+    replace is passed to pipeline.index_documents; on_indexed is called with
+    each batch after it has been written. timer (a StageTimer) gets the
+    chunk, embed and write stages.
+    """
+    batches = queue.Queue(maxsize=queue_size)
+    errors = []
+
+    def produce():
+        try:
+            for batch in iter_chunk_batches(documents, batch_size=batch_size, chunker=chunker, timer=timer):
+                batches.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            batches.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="invenere-ingest", daemon=True)
+    producer.start()
+
+    stats = {"batches": 0, "files": 0, "chunks": 0, "failed_batches": 0}
+
+    def finish(future, batch, batch_num):
+        try:
+            future.result()
+            if on_indexed:
+                on_indexed(batch)
+            stats["chunks"] += len(batch)
+            stats["files"] += len({file_path for file_path, _, _ in batch})
+            print(f"Batch {batch_num} complete with {len(batch)} chunks.")
+        except Exception as e:
+            stats["failed_batches"] += 1
+            print(f"Batch {batch_num} failed: {e}")
+
+    # The write of batch N overlaps the embedding of batch N + 1
+    pending = None
+    while True:
+        batch = batches.get()
+        if batch is _DONE:
+            break
+        stats["batches"] += 1
+        try:
+            future = pipeline.index_documents(batch, replace=replace, wait=False, timer=timer)
+        except Exception as e:
+            stats["failed_batches"] += 1
+            print(f"Batch {stats['batches']} failed: {e}")
+            continue
+        if pending:
+            finish(*pending)
+        pending = (future, batch, stats["batches"])
+    if pending:
+        finish(*pending)
+
+    producer.join()
+    if errors:
+        raise errors[0]
+    return stats
+
+def sync_files(
+    pipeline,
+    manifest: Manifest,
+    changed: Dict[str, dict],
+    deleted: List[str],
+    workers: Optional[int] = None,
+    batch_size: int = 2000,
+    queue_size: int = 4,
+    extraction_cache: Optional[ExtractionCache] = None,
+    extract_timeout: float = 120.0,
+    extract_memory_mb: Optional[int] = 2048,
+    timer=None
+) -> Dict[str, int]:
+    """
+    Applies a manifest diff: chunks of deleted files are removed, changed
+    files ({path: {"mtime", "size", "sha256"}}) are re-parsed and their
+    chunks replaced. The manifest is saved as batches land, so an
+    interrupted run resumes where it stopped.
+    Extraction runs under extract_timeout seconds and extract_memory_mb per
+    file; extraction_cache lets unchanged PDF/DOCX content skip parsing.
+    timer (a StageTimer) gets the parse, chunk, embed and write stages.
+    """
+    if deleted:
+        pipeline.delete_files(deleted)
+        for file_path in deleted:
+            manifest.remove(file_path)
+        manifest.save()
+
+    def record(batch):
+        counts = {}
+        for file_path, _, _ in batch:
+            counts[file_path] = counts.get(file_path, 0) + 1
+        for file_path, chunks in counts.items():
+            manifest.update(file_path, chunks=chunks, **changed.pop(file_path))
+        manifest.save()
+
+    stats = {"batches": 0, "files": 0, "chunks": 0, "failed_batches": 0}
+    failed = set()
+    if changed:
+        documents = iter_documents(
+            list(changed), max_workers=workers, timeout=extract_timeout,
+            memory_limit_mb=extract_memory_mb, cache=extraction_cache,
+            hashes={file_path: info["sha256"] for file_path, info in changed.items()},
+            timer=timer, on_failed=failed.add
+        )
+        stats = stream_index(
+            pipeline, documents, batch_size=batch_size, queue_size=queue_size,
+            replace=True, on_indexed=record, timer=timer
+        )
+        # Failed extractions keep their old chunks and stay out of the
+        # manifest, so the next run tries them again
+        for file_path in failed:
+            changed.pop(file_path, None)
+        if not stats["failed_batches"]:
+            # Whatever is left produced no text; record it so it is not re-parsed
+            # every run, and drop any chunks it had before it became empty.
+            if changed:
+                pipeline.delete_files(list(changed))
+            for file_path, info in changed.items():
+                manifest.update(file_path, chunks=0, **info)
+    manifest.save()
+    stats["deleted_files"] = len(deleted)
+    stats["failed_files"] = len(failed)
+    return stats
+
+def incremental_index(
+    pipeline,
+    roots: Iterable[str],
+    manifest: Optional[Manifest] = None,
+    full: bool = False,
+    **options
+) -> Dict[str, int]:
+    """
+    Brings the collection in line with the files under roots, touching only
+    what changed since the last run according to the manifest: new and modified
+    files are re-parsed and their chunks replaced, deleted files have their
+    chunks removed. With full=True every file is treated as changed.
+    options (workers, batch_size, extraction limits, timer...) go to sync_files.
+    """
+    roots = list(roots)
+    if manifest is None:
+        manifest = Manifest(os.path.join(pipeline.vector_store.persist_dir, "manifest.json"))
+    changed, deleted = manifest.diff(discover_files(roots), roots=roots, force=full)
+    print(f"{len(changed)} new or modified files, {len(deleted)} deleted files.")
+    return sync_files(pipeline, manifest, changed, deleted, **options)
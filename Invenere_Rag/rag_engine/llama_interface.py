@@ -1,18 +1,153 @@
-import subprocess
+# rag_engine/llama_interface.py
+
+import http.client
+import json
+import os
+import queue
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+DEFAULT_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+
+class OllamaError(RuntimeError):
+    pass
+
+# What a call can raise when the server is down, drops the connection or
+# answers with an error; callers streaming an answer catch these
+LLM_ERRORS = (OSError, http.client.HTTPException, OllamaError)
+
+class OllamaClient:
+    """
+    Client for the Ollama server API (/api/generate) over a small pool of
+    keep-alive HTTP connections, so a call costs one request on a warm socket
+    instead of spawning `ollama run`.
+    """
+
+    def __init__(
+        self,
+        model: str = "llama3",
+        host: str = DEFAULT_HOST,
+        pool_size: int = 4,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 300.0,
+        num_ctx: Optional[int] = None,
+        keep_alive: Optional[str] = "30m",
+        options: Optional[Dict] = None
+    ):
+        """
+        read_timeout: max wait between two streamed chunks (not the whole answer).
+        num_ctx / options: passed as Ollama model options.
+        keep_alive: how long the server keeps the model loaded after a call.
+        """
+        parsed = urlparse(host if "://" in host else f"http://{host}")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 11434
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.options = dict(options or {})
+        if num_ctx:
+            self.options["num_ctx"] = num_ctx
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+            conn.connect()
+            conn.sock.settimeout(self.read_timeout)
+            return conn
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[Dict]) -> bytes:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        merged = {**self.options, **(options or {})}
+        if merged:
+            payload["options"] = merged
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return json.dumps(payload).encode("utf-8")
+
+    def _request(self, body: bytes):
+        # A pooled connection may have been closed by the server while idle;
+        # retry once on a fresh one before giving up.
+        for attempt in range(2):
+            conn = self._connect()
+            try:
+                conn.request("POST", "/api/generate", body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                detail = response.read().decode("utf-8", "replace")
+                self._release(conn)
+                raise OllamaError(f"Ollama returned HTTP {response.status}: {detail}")
+            return conn, response
+
+    def generate_stream(self, prompt: str, options: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Yields response tokens as the server produces them.
+        """
+        conn, response = self._request(self._payload(prompt, True, options))
+        finished = False
+        try:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get("error"):
+                    raise OllamaError(event["error"])
+                if event.get("response"):
+                    yield event["response"]
+                if event.get("done"):
+                    finished = True
+                    break
+        finally:
+            # Only a fully read response leaves the connection reusable
+            if finished and response.read() == b"":
+                self._release(conn)
+            else:
+                conn.close()
+
+    def generate(self, prompt: str, options: Optional[Dict] = None) -> str:
+        conn, response = self._request(self._payload(prompt, False, options))
+        try:
+            event = json.loads(response.read())
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        if event.get("error"):
+            raise OllamaError(event["error"])
+        return event.get("response", "").strip()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+_clients: Dict[str, OllamaClient] = {}
+
+def get_client(model: str = "llama3") -> OllamaClient:
+    if model not in _clients:
+        _clients[model] = OllamaClient(model=model)
+    return _clients[model]
 
 def query_llama(prompt: str, model: str = "llama3") -> str:
     try:
-        print("Calling ollama with prompt:", repr(prompt))
-        result = subprocess.run(
-            ["ollama", "run", model],
-            input=prompt,
-            text=True,
-            capture_output=True
-        )
-        print("STDOUT:", result.stdout)
-        print("STDERR:", result.stderr)
-        print("RETURN CODE:", result.returncode)
-        return result.stdout.strip()
+        return get_client(model).generate(prompt)
     except Exception as e:
         print("Error querying LLaMA:", e)
         return f"❌ Error querying LLaMA: {e}"
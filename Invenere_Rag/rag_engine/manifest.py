@@ -0,0 +1,98 @@
+# rag_engine/manifest.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    SHA-256 of the file contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _under_roots(file_path: str, roots: Iterable[str]) -> bool:
+    path = Path(file_path)
+    for root in roots:
+        root_path = Path(root).expanduser()
+        if path == root_path or root_path in path.parents:
+            return True
+    return False
+
+class Manifest:
+    """
+    Persistent record of what has been indexed, keyed by file path:
+    {path: {"mtime": float, "size": int, "sha256": str, "chunks": int}}.
+    """
+
+    def __init__(self, path: str = "./chroma_db/manifest.json"):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)  # Atomic: a crash never leaves a half-written manifest
+
+    def get(self, file_path: str) -> Optional[dict]:
+        return self.entries.get(file_path)
+
+    def update(self, file_path: str, mtime: float, size: int, sha256: str, chunks: int):
+        self.entries[file_path] = {"mtime": mtime, "size": size, "sha256": sha256, "chunks": chunks}
+
+    def remove(self, file_path: str):
+        self.entries.pop(file_path, None)
+
+    def paths_under(self, roots: Iterable[str]) -> List[str]:
+        """
+        Recorded paths inside any of the given directories.
+        """
+        roots = list(roots)
+        return [file_path for file_path in self.entries if _under_roots(file_path, roots)]
+
+    def diff(
+        self,
+        file_paths: Iterable[str],
+        roots: Optional[Iterable[str]] = None,
+        force: bool = False
+    ) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Compares the files currently on disk against the manifest.
+        Returns (changed, deleted): changed maps new/modified paths to their
+        {"mtime", "size", "sha256"}; deleted lists manifest paths (under roots,
+        if given) that no longer exist. Files whose mtime and size match are not
+        read at all; files that were only touched get their stat refreshed.
+        With force=True every existing file is reported as changed.
+        """
+        changed = {}
+        seen = set()
+        for file_path in file_paths:
+            seen.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entry = None if force else self.entries.get(file_path)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            sha256 = file_hash(file_path)
+            if entry and entry["sha256"] == sha256:
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                continue
+            changed[file_path] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha256}
+
+        deleted = [
+            file_path for file_path in self.entries
+            if file_path not in seen and (roots is None or _under_roots(file_path, roots))
+        ]
+        return changed, deleted
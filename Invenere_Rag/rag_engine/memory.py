@@ -0,0 +1,165 @@
+# rag_engine/memory.py
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from rag_engine.context_builder import approximate_tokens
+
+# (question, answer, sources)
+Turn = Tuple[str, str, list]
+
+def format_turns(turns) -> str:
+    return "\n".join(f"Q: {turn[0]}\nA: {turn[1]}" for turn in turns)
+
+def make_summarizer(generate: Callable[[str], str], max_words: int = 150) -> Callable[[str, list], str]:
+    """
+    Summary updater for ConversationMemory from an LLM call (prompt -> text),
+    e.g. OllamaClient.generate: folds the turns leaving the window into the
+    running summary.
+    """
+    def summarize(summary: str, turns: list) -> str:
+        prompt = (
+            f"Update the summary of a conversation with the turns below. Keep every key topic, method and "
+            f"conclusion discussed so far, in at most {max_words} words. Reply with the summary only.\n\n"
+            f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{format_turns(turns)}\n\nUpdated summary:"
+        )
+        return generate(prompt).strip()
+    return summarize
+
+class ConversationMemory:
+    """
+    Session memory of a conversation: the latest turns, up to window_tokens,
+    plus a rolling summary of everything older. Turns pushed out of the
+    window are folded into the summary by one background LLM call, started
+    after the turn has been answered, so a turn never waits for it; until it
+    returns, the evicted turns are shown verbatim. The formatted history
+    block is cached and only rebuilt when the memory changes, so its cost
+    does not grow with the length of the conversation.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str, list], str]] = None,
+        window_tokens: int = 600,
+        max_pending_tokens: int = 2000,
+        count_tokens: Callable[[str], int] = approximate_tokens
+    ):
+        """
+        summarize(summary, turns) returns the new summary (see
+        make_summarizer); without one, evicted turns are simply dropped.
+        window_tokens: budget of the verbatim turns. The newest turn is always
+        kept, whatever its size.
+        max_pending_tokens: evicted turns kept while summaries fail or lag;
+        the oldest are dropped beyond it.
+        """
+        self.summarize = summarize
+        self.window_tokens = window_tokens
+        self.max_pending_tokens = max_pending_tokens
+        self.count_tokens = count_tokens
+        self.summary = ""
+        self._turns: "deque[Tuple[Turn, int]]" = deque()  # (turn, tokens)
+        self._pending: "deque[Tuple[Turn, int]]" = deque()  # Evicted, not yet in the summary
+        self._window_used = 0
+        self._pending_used = 0
+        self._version = 0
+        self._session = 0  # Bumped by clear()
+        self._blocks = {}  # turns -> (version, block)
+        self._summarizing = None
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="invenere-memory")
+
+    @property
+    def turns(self) -> List[Turn]:
+        """Turns in the window, oldest first, as history lists elsewhere expect them."""
+        with self._lock:
+            return [turn for turn, _ in self._turns]
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __bool__(self) -> bool:
+        return bool(self._turns or self._pending or self.summary)
+
+    def add(self, query: str, answer: str, sources: list = None):
+        """Records a finished turn; a summary update may start in the background."""
+        turn = (query, answer, list(sources or []))
+        tokens = self.count_tokens(format_turns([turn])) + 1
+        with self._lock:
+            self._turns.append((turn, tokens))
+            self._window_used += tokens
+            while self._window_used > self.window_tokens and len(self._turns) > 1:
+                evicted = self._turns.popleft()
+                self._window_used -= evicted[1]
+                if self.summarize is not None:
+                    self._pending.append(evicted)
+                    self._pending_used += evicted[1]
+            while self._pending_used > self.max_pending_tokens and self._pending:
+                self._pending_used -= self._pending.popleft()[1]
+            self._version += 1
+            self._schedule()
+
+    def _schedule(self):
+        if self._pending and (self._summarizing is None or self._summarizing.done()):
+            self._summarizing = self._executor.submit(self._fold, list(self._pending))
+
+    def _fold(self, batch: List[Tuple[Turn, int]]):
+        session = self._session
+        try:
+            summary = self.summarize(self.summary, [turn for turn, _ in batch])
+        except Exception as e:
+            print(f"Could not update the conversation summary: {e}")
+            return
+        with self._lock:
+            if session != self._session:
+                return  # Cleared meanwhile
+            # Turns evicted while the call ran stay pending for the next one
+            folded = {id(item) for item in batch}
+            while self._pending and id(self._pending[0]) in folded:
+                self._pending_used -= self._pending.popleft()[1]
+            self.summary = summary
+            self._version += 1
+            if self._pending:  # This call is still the running one, so _schedule() would wait for it
+                self._summarizing = self._executor.submit(self._fold, list(self._pending))
+
+    def block(self, turns: int = None) -> str:
+        """
+        The history as prompt text: summary, evicted turns not yet summarized,
+        then the window (only its last `turns` turns if given). Cached.
+        """
+        with self._lock:
+            cached = self._blocks.get(turns)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+            window = [turn for turn, _ in self._turns]
+            if turns is not None:
+                window = window[-turns:] if turns else []
+            earlier = format_turns(turn for turn, _ in self._pending) if turns is None else ""
+            parts = []
+            if self.summary and turns is None:
+                parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+            if earlier or window:
+                parts.append("\n".join(p for p in (earlier, format_turns(window)) if p))
+            text = "\n\n".join(parts)
+            self._blocks[turns] = (self._version, text)
+            return text
+
+    def wait(self, timeout: float = None):
+        """Blocks until the summary has caught up with the evicted turns (or fails to)."""
+        future = None
+        while self._summarizing is not None and self._summarizing is not future:
+            future = self._summarizing
+            future.result(timeout=timeout)
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+            self._pending.clear()
+            self._window_used = self._pending_used = 0
+            self.summary = ""
+            self._version += 1
+            self._session += 1
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,197 @@
+# rag_engine/metadata_index.py
+
+import datetime
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from rag_engine.sqlite_db import connect
+
+_SQL_BATCH = 900
+# Fields with their own column and index; any other field is read from the JSON
+INDEXED_FIELDS = ("source", "source_dir", "ext", "modified", "page")
+OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$prefix", "$under")
+_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# (field, operator, value)
+Condition = Tuple[str, str, object]
+
+def derived_fields(source: str) -> Dict[str, str]:
+    """Directory and lowercased extension of a source path, for filtering."""
+    return {"source_dir": os.path.dirname(source), "ext": os.path.splitext(source)[1].lower()}
+
+def _typed(value):
+    """Dates and datetimes (or ISO strings of them) become epoch seconds, like "modified"."""
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    if isinstance(value, datetime.date):
+        return int(datetime.datetime(value.year, value.month, value.day).timestamp())
+    return value
+
+def _modified(value):
+    """A "modified" filter value as epoch seconds; strings must be ISO dates or datetimes."""
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Invalid date {value!r} for 'modified'; expected an ISO date such as 2024-01-31") from None
+    return _typed(value)
+
+def parse_filters(filters: Optional[Dict]) -> List[Condition]:
+    """
+    Validates a filter dict into conditions, all of which must hold:
+
+        {"ext": ".pdf",                                   # equality
+         "ext": {"$in": [".pdf", ".docx"]},               # $in / $nin
+         "modified": {"$gte": "2024-01-01"},              # $gt $gte $lt $lte $ne
+         "source_dir": {"$under": "/home/me/reports"},    # the folder or below it
+         "heading": {"$prefix": "Installation"}}          # string prefix
+
+    Values of "modified" may be ISO dates, dates or datetimes.
+    """
+    conditions = []
+    for field, spec in (filters or {}).items():
+        if not _FIELD.match(field):
+            raise ValueError(f"Invalid filter field {field!r}")
+        ops = spec if isinstance(spec, dict) else {"$eq": spec}
+        for op, value in ops.items():
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown filter operator {op!r} on {field!r}; expected one of {', '.join(OPERATORS)}")
+            typed = _modified if field == "modified" else _typed
+            if op in ("$in", "$nin"):
+                if not isinstance(value, (list, tuple, set)) or not value:
+                    raise ValueError(f"{op} on {field!r} needs a non-empty list")
+                value = [typed(v) for v in value]
+            elif op in ("$prefix", "$under"):
+                if field == "modified":
+                    # Stored as epoch seconds: a string range would match nothing
+                    raise ValueError(f"{op} does not apply to 'modified'; use $gte/$lt with ISO dates")
+                if not isinstance(value, str):
+                    raise ValueError(f"{op} on {field!r} needs a string")
+            else:
+                value = typed(value)
+            conditions.append((field, op, value))
+    return conditions
+
+def _condition_sql(field: str, op: str, value) -> Tuple[str, List]:
+    column = field if field in INDEXED_FIELDS else "json_extract(metadata, ?)"
+    params = [] if field in INDEXED_FIELDS else [f'$."{field}"']
+    if op in ("$in", "$nin"):
+        marks = ",".join("?" * len(value))
+        return f"{column} {'NOT ' if op == '$nin' else ''}IN ({marks})", params + list(value)
+    if op == "$prefix":
+        # A range, so an indexed column answers it from the index
+        return f"({column} >= ? AND {column} < ?)", params + [value] + params + [value + "\U0010ffff"]
+    if op == "$under":
+        folder = value.rstrip("/\\") or value
+        return (
+            f"({column} = ? OR ({column} >= ? AND {column} < ?))",
+            params + [folder] + params + [folder + os.sep] + params + [folder + os.sep + "\U0010ffff"]
+        )
+    sql_op = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+    return f"{column} {sql_op} ?", params + [value]
+
+def conditions_sql(conditions: Sequence[Condition]) -> Tuple[str, List]:
+    parts, params = [], []
+    for condition in conditions:
+        sql, condition_params = _condition_sql(*condition)
+        parts.append(sql)
+        params.extend(condition_params)
+    return " AND ".join(parts) or "1", params
+
+class MetadataIndex:
+    """
+    Secondary index of chunk metadata in SQLite, next to the BM25 index:
+    one row per chunk with typed, indexed columns for the fields filters
+    use most (source, source_dir, ext, modified, page) and the full
+    metadata as JSON for the rest. Answers "which chunks match these
+    filters" without touching the vector index.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        """read_only: open an existing index with mode=ro (a missing one is created as usual)."""
+        self._lock = threading.Lock()
+        self.read_only = read_only and os.path.exists(path)
+        self.db = connect(path, self.read_only)
+        if self.read_only:
+            return
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY, source TEXT, source_dir TEXT, ext TEXT,
+                modified INTEGER, page INTEGER, metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE INDEX IF NOT EXISTS chunks_source_dir ON chunks (source_dir);
+            CREATE INDEX IF NOT EXISTS chunks_ext ON chunks (ext);
+            CREATE INDEX IF NOT EXISTS chunks_modified ON chunks (modified);
+            CREATE INDEX IF NOT EXISTS chunks_page ON chunks (page);
+        """)
+        self.db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        rows = []
+        for doc_id, meta in zip(ids, metadatas):
+            meta = dict(meta)
+            for field, value in derived_fields(meta.get("source", "")).items():
+                meta.setdefault(field, value)
+            rows.append((
+                doc_id, meta.get("source"), meta["source_dir"], meta["ext"],
+                meta.get("modified"), meta.get("page"), json.dumps(meta)
+            ))
+        with self._lock:
+            self.db.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+
+    def delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                self.db.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self.db.commit()
+
+    def ids(self, conditions: Sequence[Condition], limit: int = -1) -> List[str]:
+        """Ids of the chunks matching every condition (at most limit of them)."""
+        where, params = conditions_sql(conditions)
+        with self._lock:
+            return [r for (r,) in self.db.execute(f"SELECT id FROM chunks WHERE {where} LIMIT ?", params + [limit])]
+
+    def matching(self, ids: Sequence[str], conditions: Sequence[Condition]) -> Set[str]:
+        """The subset of ids that match every condition."""
+        where, params = conditions_sql(conditions)
+        found = set()
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                found.update(r for (r,) in self.db.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(batch))}) AND {where}", batch + params
+                ))
+        return found
+
+class Prefilter:
+    """
+    How one query's filters are applied. Up to max_candidates matching chunks
+    are listed from the metadata index and handed to the dense and BM25
+    lookups as the only rows to consider (cheaper than an unfiltered search
+    when the filter is selective). When more chunks match, the lookups run
+    unfiltered, over-fetching until enough results pass check().
+    """
+
+    def __init__(self, index: MetadataIndex, filters: Dict, max_candidates: int = 10_000):
+        self.index = index
+        self.conditions = parse_filters(filters)
+        found = index.ids(self.conditions, limit=max_candidates + 1)
+        self.candidates: Optional[List[str]] = found if len(found) <= max_candidates else None
+
+    def check(self, ids: Sequence[str]) -> Set[str]:
+        if self.candidates is not None:
+            return set(self.candidates).intersection(ids)
+        return self.index.matching(ids, self.conditions)
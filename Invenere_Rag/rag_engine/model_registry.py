@@ -0,0 +1,121 @@
+# rag_engine/model_registry.py
+
+import gc
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Warm start: local copies of the models (written by save_local), loaded
+# straight from their safetensors files without resolving anything on the Hub
+MODEL_DIR = os.environ.get("INVENERE_MODEL_DIR")
+
+KINDS = ("sentence_transformer", "cross_encoder")
+
+ModelKey = Tuple[str, str, Tuple[Tuple[str, object], ...]]
+
+def local_name(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+def _load(kind: str, source: str, options: Dict):
+    # sentence_transformers pulls in torch and transformers: seconds of import,
+    # paid on first use rather than by every process that imports rag_engine
+    if kind == "sentence_transformer":
+        from sentence_transformers import SentenceTransformer
+        backend = options.get("backend", "torch")
+        if backend == "torch":
+            return SentenceTransformer(source)
+        # e.g. backend="onnx", onnx_file="onnx/model_qint8_avx512_vnni.onnx" for int8
+        onnx_file = options.get("onnx_file")
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(source, backend=backend, model_kwargs=model_kwargs)
+    if kind == "cross_encoder":
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(source, max_length=options.get("max_length"))
+    raise ValueError(f"Unknown model kind {kind!r}; expected one of {', '.join(KINDS)}")
+
+class ModelRegistry:
+    """
+    Process-wide models, one instance per (kind, name, options): every
+    Embedder and Reranker of the process, and anything else asking for the
+    same model, shares its weights. Models load on first get(), unless
+    preloaded.
+
+    For pre-forked servers, preload() in the parent and then freeze(): the
+    workers inherit the loaded weights and share their pages copy-on-write.
+    Preloading only reads weights; no inference may run before the fork,
+    as torch's thread pools do not survive it.
+    """
+
+    def __init__(self, model_dir: Optional[str] = MODEL_DIR):
+        self.model_dir = model_dir
+        self._models: Dict[ModelKey, object] = {}
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, name: str, options: Dict) -> ModelKey:
+        # Defaults are left out so callers passing them share the model with callers that don't
+        options = {k: v for k, v in options.items() if v is not None and not (k == "backend" and v == "torch")}
+        return kind, name, tuple(sorted(options.items()))
+
+    def local_path(self, name: str, options: Dict = None) -> Optional[str]:
+        """The warm-start copy of a model, if model_dir has one (torch backend only)."""
+        if not self.model_dir or (options or {}).get("backend", "torch") != "torch":
+            return None
+        path = os.path.join(self.model_dir, local_name(name))
+        return path if os.path.isdir(path) else None
+
+    def get(self, kind: str, name: str, **options):
+        """
+        The shared model; loaded now if it is not yet (concurrent callers
+        wait for the same load). options: backend and onnx_file for
+        sentence_transformer, max_length for cross_encoder.
+        """
+        key = self._key(kind, name, options)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            model = self._models.get(key)
+            if model is None:
+                model = _load(kind, self.local_path(name, options) or name, options)
+                self._models[key] = model
+        return model
+
+    def loaded(self) -> List[ModelKey]:
+        return list(self._models)
+
+    def preload(self, specs: Iterable[Tuple[str, str, Dict]]):
+        """Loads (kind, name, options) models ahead of first use."""
+        for kind, name, options in specs:
+            self.get(kind, name, **(options or {}))
+
+    def freeze(self):
+        """
+        Moves everything allocated so far out of the garbage collector's
+        reach, so collections in forked workers do not write to (and copy)
+        the pages of the preloaded models' objects.
+        """
+        gc.collect()
+        gc.freeze()
+
+    def save_local(self, model_dir: str = None) -> List[str]:
+        """
+        Writes every loaded torch-backend model to model_dir (safetensors),
+        where a registry with that model_dir loads it at warm start.
+        """
+        model_dir = model_dir or self.model_dir
+        if not model_dir:
+            raise ValueError("No model_dir to save the models to")
+        saved = []
+        for (kind, name, options), model in list(self._models.items()):
+            if dict(options).get("backend", "torch") != "torch":
+                continue
+            path = os.path.join(model_dir, local_name(name))
+            model.save(path)
+            saved.append(path)
+        return saved
+
+MODELS = ModelRegistry()
@@ -1,15 +1,17 @@
+import os
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import fitz
 import docx
 
+from rag_engine.extraction import PAGED_EXTS, ExtractionCache, extract_pages, join_pages
+
+SUPPORTED_EXTS = (".pdf", ".docx", ".txt", ".md")
+
 def extract_text_from_pdf(file_path: str) -> str:
-    try: 
-        doc = fitz.open(file_path)
-        return "\n".join(page.get_text() for page in doc)
-    except Exception as e:
-        print (f"⚠️ Skipping PDF due to error: {file_path} — {e}")
-        return ""
+    # Errors propagate: "" would be indistinguishable from a PDF without text
+    doc = fitz.open(file_path)
+    return "\n".join(page.get_text() for page in doc)
 
 def extract_text_from_docx(file_path: str) -> str:
     doc = docx.Document(file_path)
@@ -27,21 +29,63 @@ def extract_text(file_path: str) -> str:
     elif file_path.endswith(".txt") or file_path.endswith(".md"):
         return extract_text_from_txt(file_path)
     else:
-        print(f"Unsupported file format: {file_path}")
-        return ""
+        raise ValueError(f"Unsupported file format: {file_path}")
+
+def default_roots() -> List[str]:
+    """
+    Roots to index: INVENERE_ROOTS (os.pathsep separated) if set, else ~/Desktop.
+    """
+    env_roots = os.environ.get("INVENERE_ROOTS", "")
+    roots = [r for r in env_roots.split(os.pathsep) if r.strip()]
+    return roots or [str(Path.home() / "Desktop")]
+
+def discover_files(roots: Optional[Iterable[str]] = None) -> Iterator[str]:
+    """
+    Lazily walks the given roots and yields paths of supported documents.
+    """
+    for root in roots or default_roots():
+        for file_path in Path(root).expanduser().rglob("*"):
+            if file_path.suffix.lower() in SUPPORTED_EXTS and not file_path.name.startswith("~$"):
+                if file_path.is_file():
+                    yield str(file_path)
+
+def iter_documents(
+    paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    timeout: float = 120.0,
+    memory_limit_mb: Optional[int] = 2048,
+    cache: Optional[ExtractionCache] = None,
+    hashes: Optional[Dict[str, str]] = None,
+    timer=None,
+    on_failed: Optional[Callable[[str], None]] = None
+) -> Iterator[Tuple[str, str, Optional[List[int]]]]:
+    """
+    Extracts text page by page in isolated worker processes, with a per-file
+    wall-clock timeout and memory limit (see extraction.extract_pages), and
+    yields (path, text, page_offsets) as soon as each file is done
+    (completion order, not input order). page_offsets holds the character
+    offset where each page starts, for PDF/DOCX; None for plain text.
+    Only max_workers files are in flight at a time, so memory is bounded by
+    the pool and not by the number of paths. Empty documents are skipped;
+    files whose extraction failed (error, crash, timeout) are skipped too
+    and passed to on_failed. timer (a StageTimer) gets the parse stage.
+    """
+    for file_path, pages in extract_pages(
+        paths, workers=max_workers, timeout=timeout, memory_limit_mb=memory_limit_mb,
+        cache=cache, hashes=hashes, timer=timer
+    ):
+        if pages is None:
+            if on_failed:
+                on_failed(file_path)
+            continue
+        text, page_offsets = join_pages(pages)
+        if text.strip():
+            yield file_path, text, page_offsets if file_path.lower().endswith(PAGED_EXTS) else None
 
 def load_documents_from_desktop() -> List[Tuple[str, str]]:
+    """
+    Kept for backward compatibility; materializes the whole corpus in memory.
+    Prefer iter_documents(discover_files(roots)) for anything large.
+    """
     desktop_path = Path.home() / "Desktop"
-    supported_exts = (".pdf", ".docx", ".txt", ".md")
-    documents = []
-
-    for file_path in desktop_path.rglob("*"):
-        if file_path.suffix.lower() in supported_exts and not file_path.name.startswith("~$"):
-            try:
-                content = extract_text(str(file_path))
-                if content.strip():
-                    documents.append((str(file_path), content))
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-    
-    return documents
+    return [(path, text) for path, text, _ in iter_documents(discover_files([str(desktop_path)]))]
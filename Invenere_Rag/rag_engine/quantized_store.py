@@ -0,0 +1,616 @@
+# rag_engine/quantized_store.py
+
+import json
+import mmap
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag_engine.sqlite_db import connect
+from rag_engine.vector_backends import VectorBackend
+
+_SQL_BATCH = 900
+_SCAN_BLOCK = 65536  # Rows dequantized per matmul while scanning
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization: vector ~= codes * scale.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each row."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        out[start:start + block] = np.argmax(np.asarray(vectors[start:start + block]) @ centroids.T, axis=1)
+    return out
+
+def kmeans(sample: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means (centroids kept unit-norm, assignment by dot product).
+    Empty clusters are re-seeded from random sample rows.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+    return centroids.astype(np.float32)
+
+class _View:
+    """Memory maps of one committed state; swapped whole on reload."""
+
+    def __init__(self, rows=0, dim=0, gen=0, ivf=0, layout=0, indexed=0):
+        self.rows, self.dim, self.gen, self.ivf = rows, dim, gen, ivf
+        self.layout = layout  # Version of the list-ordered copy of the codes (0 = none)
+        self.indexed = indexed  # Rows covered by it; later rows are scanned directly
+        self.vectors = self.codes = self.scales = self.alive = self.text_index = self.text = None
+        self.centroids = self.lists = None
+        self.order = self.starts = self.lcodes = self.lscales = None
+
+class QuantizedBackend(VectorBackend):
+    """
+    Native dense index for large collections, all in memory-mapped files
+    next to a small SQLite table of ids and metadata:
+
+        codes     int8 vector per row plus a float32 scale (1/4 of float32)
+        vectors   the float32 originals, read only to re-score a shortlist
+        lists     IVF list of each row; k-means centroids are trained once
+                  the collection reaches train_min_rows and retrained when
+                  it has grown 4x
+        lcodes    the codes again, grouped by list (with the row order and
+                  list starts), so a query reads each probed list as one
+                  contiguous slice instead of touching the whole file
+        text      chunk text, with an (offset, length) index, read only for
+                  the final hits
+
+    A query scans the int8 codes of the nprobe closest lists (every row
+    before training) plus the rows appended since the grouped copy was last
+    rebuilt, keeps the best rescore * top_k and ranks those by their exact
+    float32 similarity. Deleted rows are masked and reclaimed by compact(),
+    which runs automatically once a quarter of the rows are dead. Files are
+    append-only or written under a new name and switched to in one SQLite
+    commit, so readers in other processes only need reopen() to see changes.
+    """
+
+    name = "quantized"
+
+    def __init__(
+        self,
+        persist_dir: str,
+        collection_name: str = "mydocs",
+        read_only: bool = False,
+        nprobe: Optional[int] = None,
+        rescore: int = 4,
+        train_min_rows: int = 20_000
+    ):
+        """
+        nprobe: IVF lists scanned per query (default: 1/16 of the lists, at
+        least 8). rescore: shortlist size as a multiple of top_k.
+        """
+        self.dir = os.path.join(persist_dir, f"{collection_name}.quantized")
+        self.read_only = read_only
+        self.nprobe = nprobe
+        self.rescore = rescore
+        self.train_min_rows = train_min_rows
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.RLock()
+        db_path = os.path.join(self.dir, "rows.sqlite")
+        # Readers open an existing file with mode=ro; the writer creates the tables
+        open_read_only = read_only and os.path.exists(db_path)
+        self.db = connect(db_path, open_read_only)
+        if not open_read_only:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, source TEXT, metadata TEXT
+                );
+                CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+                CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER);
+                INSERT OR IGNORE INTO state VALUES
+                    ('rows', 0), ('deleted', 0), ('dim', 0), ('gen', 0), ('ivf', 0), ('trained_rows', 0),
+                    ('layout', 0), ('indexed', 0);
+            """)
+            self.db.commit()
+        self._view = _View()
+        self.reopen()
+
+    # --- files -------------------------------------------------------------
+
+    def _path(self, kind: str, view: _View) -> str:
+        if kind == "centroids":
+            return os.path.join(self.dir, f"centroids.{view.ivf}.npy")
+        if kind == "lists":
+            return os.path.join(self.dir, f"lists.{view.gen}-{view.ivf}.i32")
+        if kind == "starts":
+            return os.path.join(self.dir, f"starts.L{view.layout}.npy")
+        if kind in ("order", "lcodes", "lscales"):
+            return os.path.join(self.dir, f"{kind}.L{view.layout}")
+        return os.path.join(self.dir, f"{kind}.{view.gen}")
+
+    def _map(self, path: str, dtype, shape: Tuple[int, ...], writable: bool = False, random: bool = False):
+        """
+        Maps the first prod(shape) items of a file. random: no read-ahead,
+        for files only read a row at a time (otherwise every fault pulls in
+        its neighbours and a few hundred queries touch the whole file).
+        """
+        count = int(np.prod(shape))
+        if not count or not os.path.exists(path):
+            return np.zeros(shape, dtype=dtype)
+        with open(path, "r+b" if writable else "rb") as f:
+            mapped = mmap.mmap(
+                f.fileno(), count * np.dtype(dtype).itemsize,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+        if random and hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_RANDOM)
+        return np.frombuffer(mapped, dtype=dtype, count=count).reshape(shape)
+
+    def _state(self) -> Dict[str, int]:
+        return dict(self.db.execute("SELECT key, value FROM state"))
+
+    def reopen(self):
+        with self._lock:
+            self._view = self._load_view()
+
+    def _load_view(self, previous: Optional[_View] = None) -> _View:
+        """
+        Maps the committed state. previous: the writer's view before an
+        append (small arrays of the same IVF/layout are reused; no recovery).
+        """
+        state = self._state()
+        view = _View(state["rows"], state["dim"], state["gen"], state["ivf"], state["layout"], state["indexed"])
+        if not self.read_only and previous is None:
+            self._recover(view)
+        self._map_view(view, previous)
+        return view
+
+    def _map_view(self, view: _View, previous: Optional[_View] = None):
+        n, d = view.rows, view.dim
+        view.vectors = self._map(self._path("vectors", view), np.float32, (n, d), random=True)
+        view.codes = self._map(self._path("codes", view), np.int8, (n, d))
+        view.scales = self._map(self._path("scales", view), np.float32, (n,))
+        # The writer flips deleted rows to 0 in place; readers see it at once
+        view.alive = self._map(self._path("alive", view), np.uint8, (n,), writable=not self.read_only)
+        view.text_index = self._map(self._path("text_index", view), np.int64, (n, 2), random=True)
+        text_end = int(view.text_index[-1].sum()) if n else 0
+        view.text = self._map(self._path("text", view), np.uint8, (text_end,), random=True)
+        if view.ivf:
+            view.lists = self._map(self._path("lists", view), np.int32, (n,))
+            same_ivf = previous is not None and previous.ivf == view.ivf
+            view.centroids = previous.centroids if same_ivf else np.load(self._path("centroids", view))
+        if view.layout:
+            same_layout = previous is not None and previous.layout == view.layout
+            view.starts = previous.starts if same_layout else np.load(self._path("starts", view))
+            view.order = self._map(self._path("order", view), np.int64, (view.indexed,))
+            view.lcodes = self._map(self._path("lcodes", view), np.int8, (view.indexed, d))
+            view.lscales = self._map(self._path("lscales", view), np.float32, (view.indexed,))
+
+    def _recover(self, view: _View):
+        """
+        Writer only: cuts files back to the committed row count (a crash can
+        leave a partly appended batch) and removes files of other generations,
+        IVF trainings and layouts.
+        """
+        sizes = {
+            "vectors": view.rows * view.dim * 4, "codes": view.rows * view.dim, "scales": view.rows * 4,
+            "alive": view.rows, "text_index": view.rows * 16, "lists": view.rows * 4 if view.ivf else 0,
+        }
+        for kind, size in sizes.items():
+            path = self._path(kind, view)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        index = self._map(self._path("text_index", view), np.int64, (view.rows, 2))
+        text_end = int(index[-1].sum()) if view.rows else 0
+        del index
+        text_path = self._path("text", view)
+        if os.path.exists(text_path) and os.path.getsize(text_path) > text_end:
+            os.truncate(text_path, text_end)
+
+        kinds = list(sizes) + ["text"]
+        if view.ivf:
+            kinds.append("centroids")
+        if view.layout:
+            kinds += ["starts", "order", "lcodes", "lscales"]
+        current = {os.path.basename(self._path(kind, view)) for kind in kinds}
+        for name in os.listdir(self.dir):
+            if not name.startswith("rows.sqlite") and name not in current:
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except OSError:
+                    pass
+
+    def _append(self, kind: str, view: _View, array: np.ndarray):
+        with open(self._path(kind, view), "ab") as f:
+            np.ascontiguousarray(array).tofile(f)
+
+    def _write_layout(self, view: _View, layout: int) -> Tuple[int, int]:
+        """
+        Writes the list-ordered copy of view's live codes as layout number
+        `layout`. Returns the (layout, indexed) state to commit with it.
+        """
+        target = _View(view.rows, view.dim, view.gen, view.ivf, layout)
+        rows = np.flatnonzero(np.asarray(view.alive))
+        lists = np.asarray(view.lists)[rows]
+        order = rows[np.argsort(lists, kind="stable")]
+        counts = np.bincount(lists, minlength=len(view.centroids))
+        np.save(self._path("starts", target), np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+        for kind in ("order", "lcodes", "lscales"):
+            open(self._path(kind, target), "wb").close()
+        for start in range(0, len(order), _SCAN_BLOCK):
+            block = order[start:start + _SCAN_BLOCK]
+            self._append("order", target, block.astype(np.int64))
+            self._append("lcodes", target, view.codes[block])
+            self._append("lscales", target, view.scales[block])
+        return layout, view.rows
+
+    # --- writes ------------------------------------------------------------
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if self.read_only:
+            raise RuntimeError("Quantized store was opened read-only")
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            view = self._view
+            try:
+                if not view.dim:
+                    view.dim = vectors.shape[1]
+                    self.db.execute("UPDATE state SET value = ? WHERE key = 'dim'", (view.dim,))
+                elif vectors.shape[1] != view.dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {view.dim}")
+
+                codes, scales = quantize(vectors)
+                encoded = [doc.encode("utf-8") for doc in documents]
+                lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+                text_end = int(view.text_index[-1].sum()) if view.rows else 0
+                offsets = text_end + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+                self._append("vectors", view, vectors)
+                self._append("codes", view, codes)
+                self._append("scales", view, scales)
+                self._append("alive", view, np.ones(len(ids), dtype=np.uint8))
+                self._append("text_index", view, np.stack([offsets, lengths], axis=1))
+                with open(self._path("text", view), "ab") as f:
+                    f.write(b"".join(encoded))
+                if view.ivf:
+                    self._append("lists", view, nearest(vectors, view.centroids))
+
+                # Rows become visible when this commits; the files already hold them
+                first = view.rows
+                self.db.executemany(
+                    "INSERT INTO chunks (row, id, source, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (first + i, doc_id, meta.get("source"), json.dumps(meta))
+                        for i, (doc_id, meta) in enumerate(zip(ids, metadatas))
+                    ]
+                )
+                self.db.execute("UPDATE state SET value = ? WHERE key = 'rows'", (first + len(ids),))
+                self.db.commit()
+            except BaseException:
+                # Back to the last commit: the partly appended files are cut
+                # to its row count, so the next add() appends at the right rows
+                self.db.rollback()
+                self._view = self._load_view()
+                raise
+            self._view = view = self._load_view(previous=view)
+
+            live = self.count()
+            if not view.ivf and live >= self.train_min_rows:
+                self.train()
+            elif view.ivf and live >= 4 * self._state()["trained_rows"]:
+                self.train()
+            elif view.ivf and view.rows - view.indexed > max(50_000, view.rows // 10):
+                self.relayout()
+
+    def delete(self, ids):
+        if self.read_only:
+            raise RuntimeError("Quantized store was opened read-only")
+        ids = list(ids)
+        with self._lock:
+            view = self._view
+            rows = []
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows.extend(r for (r,) in self.db.execute(f"SELECT row FROM chunks WHERE id IN ({marks})", batch))
+                self.db.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+            if rows:
+                view.alive[np.asarray(rows, dtype=np.int64)] = 0
+                self.db.execute("UPDATE state SET value = value + ? WHERE key = 'deleted'", (len(rows),))
+            self.db.commit()
+            state = self._state()
+            if state["deleted"] > max(10_000, state["rows"] // 4):
+                self.compact()
+
+    def relayout(self):
+        """Regroups all live rows by IVF list (appended rows are otherwise scanned in full)."""
+        if self.read_only:
+            raise RuntimeError("Quantized store was opened read-only")
+        with self._lock:
+            view = self._view
+            if not view.ivf:
+                return
+            layout, indexed = self._write_layout(view, self._state()["layout"] + 1)
+            self.db.executemany("UPDATE state SET value = ? WHERE key = ?", [
+                (layout, "layout"), (indexed, "indexed")
+            ])
+            self.db.commit()
+            self.reopen()
+
+    def compact(self):
+        """
+        Rewrites the files without deleted rows (a new generation; readers
+        keep their old mappings until they reopen).
+        """
+        if self.read_only:
+            raise RuntimeError("Quantized store was opened read-only")
+        with self._lock:
+            old = self._view
+            keep = np.flatnonzero(np.asarray(old.alive))
+            new = _View(len(keep), old.dim, old.gen + 1, old.ivf)
+            print(f"Compacting quantized index: {old.rows} -> {new.rows} rows")
+            text_end = 0
+            for start in range(0, len(keep), _SCAN_BLOCK):
+                rows = keep[start:start + _SCAN_BLOCK]
+                self._append("vectors", new, old.vectors[rows])
+                self._append("codes", new, old.codes[rows])
+                self._append("scales", new, old.scales[rows])
+                self._append("alive", new, np.ones(len(rows), dtype=np.uint8))
+                if old.ivf:
+                    self._append("lists", new, old.lists[rows])
+                spans = np.asarray(old.text_index[rows])
+                offsets = text_end + np.concatenate(([0], np.cumsum(spans[:, 1])[:-1]))
+                self._append("text_index", new, np.stack([offsets, spans[:, 1]], axis=1))
+                with open(self._path("text", new), "ab") as f:
+                    for offset, length in spans:
+                        f.write(old.text[offset:offset + length].tobytes())
+                text_end += int(spans[:, 1].sum())
+
+            # Row numbers change, so the grouped copy is rebuilt and switched
+            # to in the same commit as the new generation
+            updates = [(new.rows, "rows"), (0, "deleted"), (new.gen, "gen")]
+            if new.ivf:
+                self._map_view(new)
+                layout, indexed = self._write_layout(new, self._state()["layout"] + 1)
+                updates += [(layout, "layout"), (indexed, "indexed")]
+                new = None
+
+            remap = np.empty(old.rows, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+            self.db.execute("CREATE TABLE chunks_new (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, source TEXT, metadata TEXT)")
+            cursor = self.db.execute("SELECT row, id, source, metadata FROM chunks ORDER BY row")
+            while True:
+                batch = cursor.fetchmany(_SCAN_BLOCK)
+                if not batch:
+                    break
+                self.db.executemany(
+                    "INSERT INTO chunks_new VALUES (?, ?, ?, ?)",
+                    [(int(remap[row]), doc_id, source, meta) for row, doc_id, source, meta in batch]
+                )
+            self.db.execute("DROP TABLE chunks")
+            self.db.execute("ALTER TABLE chunks_new RENAME TO chunks")
+            self.db.execute("CREATE INDEX chunks_source ON chunks (source)")
+            self.db.executemany("UPDATE state SET value = ? WHERE key = ?", updates)
+            self.db.commit()
+            self._view = _View()  # Drop the old mappings before their files go
+            del old
+            self.reopen()  # As the writer, this also removes the previous generation's files
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """
+        (Re)trains the IVF centroids on a sample of live rows, assigns every
+        row to its list and groups the codes by list. About sqrt(rows) lists.
+        """
+        if self.read_only:
+            raise RuntimeError("Quantized store was opened read-only")
+        with self._lock:
+            view = self._view
+            live = np.flatnonzero(np.asarray(view.alive))
+            nlist = int(np.clip(round(np.sqrt(len(live))), 16, 16384))
+            if len(live) < nlist * 4:
+                return
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(live, min(len(live), nlist * 64), replace=False))
+            centroids = kmeans(np.asarray(view.vectors[sample]), nlist, iterations=iterations, seed=seed)
+
+            new = _View(view.rows, view.dim, view.gen, view.ivf + 1)
+            np.save(self._path("centroids", new), centroids)
+            for start in range(0, view.rows, _SCAN_BLOCK):
+                self._append("lists", new, nearest(view.vectors[start:start + _SCAN_BLOCK], centroids))
+            new.codes, new.scales, new.alive, new.centroids = view.codes, view.scales, view.alive, centroids
+            new.lists = self._map(self._path("lists", new), np.int32, (new.rows,))
+            layout, indexed = self._write_layout(new, self._state()["layout"] + 1)
+            new = None
+            self.db.executemany("UPDATE state SET value = ? WHERE key = ?", [
+                (view.ivf + 1, "ivf"), (len(live), "trained_rows"), (layout, "layout"), (indexed, "indexed")
+            ])
+            self.db.commit()
+            print(f"Trained IVF index: {nlist} lists over {len(live)} rows")
+            self.reopen()
+
+    # --- reads -------------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            state = self._state()
+        return state["rows"] - state["deleted"]
+
+    def _select(self, view: _View, columns: str, where: str, params: List) -> Optional[List[Tuple]]:
+        """
+        Rows of `SELECT columns FROM chunks WHERE where IN (params)`, read in
+        one snapshot. None if the store was compacted since view was mapped
+        (row numbers changed); the caller reopens and retries.
+        """
+        results = []
+        with self._lock:
+            self.db.execute("BEGIN")
+            try:
+                gen = self.db.execute("SELECT value FROM state WHERE key = 'gen'").fetchone()[0]
+                if gen != view.gen:
+                    return None
+                for start in range(0, len(params), _SQL_BATCH):
+                    batch = params[start:start + _SQL_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    results.extend(self.db.execute(
+                        f"SELECT {columns} FROM chunks WHERE {where} IN ({marks})", batch
+                    ).fetchall())
+            finally:
+                self.db.execute("COMMIT")
+        return results
+
+    def _fetch(self, view: _View, where: str, params: List) -> Optional[List[Tuple[int, str, str, Dict]]]:
+        """(row, id, text, metadata) for matching rows, or None as for _select."""
+        results = self._select(view, "row, id, metadata", where, params)
+        if results is None:
+            return None
+        rows = []
+        for row, doc_id, meta in results:
+            if row >= view.rows:
+                continue  # Committed after this view was mapped
+            offset, length = view.text_index[row]
+            text = view.text[offset:offset + length].tobytes().decode("utf-8")
+            rows.append((row, doc_id, text, json.loads(meta)))
+        return rows
+
+    def _fetch_current(self, where: str, params: List) -> List[Tuple[int, str, str, Dict]]:
+        rows = self._fetch(self._view, where, params)
+        if rows is None:
+            self.reopen()
+            rows = self._fetch(self._view, where, params) or []
+        return rows
+
+    def get(self, ids):
+        return [(doc_id, text, meta) for _, doc_id, text, meta in self._fetch_current("id", list(ids))]
+
+    def existing_ids(self, ids):
+        ids = list(ids)
+        existing = set()
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                existing.update(r for (r,) in self.db.execute(f"SELECT id FROM chunks WHERE id IN ({marks})", batch))
+        return existing
+
+    def ids_for_sources(self, sources):
+        sources = list(sources)
+        found = []
+        with self._lock:
+            for start in range(0, len(sources), _SQL_BATCH):
+                batch = sources[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                found.extend(r for (r,) in self.db.execute(f"SELECT id FROM chunks WHERE source IN ({marks})", batch))
+        return found
+
+    def iter_documents(self, page_size=5000):
+        last = -1
+        while True:
+            with self._lock:
+                rows = [r for (r,) in self.db.execute(
+                    "SELECT row FROM chunks WHERE row > ? ORDER BY row LIMIT ?", (last, page_size)
+                )]
+            if not rows:
+                return
+            page = sorted(self._fetch_current("row", rows))
+            yield [doc_id for _, doc_id, _, _ in page], [text for _, _, text, _ in page]
+            last = rows[-1]
+
+    def _scan(self, view: _View, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, approximate scores) of the live candidates: the nprobe closest
+        IVF lists from the grouped codes plus the rows appended after them
+        (every row before training).
+        """
+        parts = []
+        tail = 0
+        if view.layout:
+            nlist = len(view.centroids)
+            nprobe = min(nlist, self.nprobe or max(8, nlist // 16))
+            probe = np.sort(np.argpartition(-(view.centroids @ query), nprobe - 1)[:nprobe])
+            for l in probe:
+                start, end = int(view.starts[l]), int(view.starts[l + 1])
+                if start < end:
+                    scores = (view.lcodes[start:end].astype(np.float32) @ query) * view.lscales[start:end]
+                    parts.append((view.order[start:end], scores))
+            tail = view.indexed
+        for start in range(tail, view.rows, _SCAN_BLOCK):
+            end = min(start + _SCAN_BLOCK, view.rows)
+            scores = (view.codes[start:end].astype(np.float32) @ query) * view.scales[start:end]
+            parts.append((np.arange(start, end), scores))
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = np.concatenate([p[0] for p in parts])
+        approx = np.concatenate([p[1] for p in parts])
+        live = view.alive[rows] != 0
+        return rows[live], approx[live]
+
+    def _scan_ids(self, view: _View, query: np.ndarray, ids: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """_scan restricted to the rows of ids (no IVF: every candidate is scored)."""
+        found = self._select(view, "row", "id", list(ids))
+        if found is None:
+            return None
+        rows = np.sort(np.fromiter((r for (r,) in found), dtype=np.int64, count=len(found)))
+        rows = rows[rows < view.rows]
+        rows = rows[view.alive[rows] != 0]
+        approx = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), _SCAN_BLOCK):
+            block = rows[start:start + _SCAN_BLOCK]
+            approx[start:start + len(block)] = (view.codes[block].astype(np.float32) @ query) * view.scales[block]
+        return rows, approx
+
+    def query(self, embedding, top_k, ids=None):
+        view = self._view
+        if not view.rows or top_k <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32).ravel()
+        shortlist_size = top_k * max(1, self.rescore)
+
+        if ids is None:
+            rows, approx = self._scan(view, q)
+        else:
+            scanned = self._scan_ids(view, q, ids)
+            if scanned is None:  # Compacted under us
+                self.reopen()
+                return self.query(embedding, top_k, ids)
+            rows, approx = scanned
+        if not len(rows):
+            return []
+        if len(rows) > shortlist_size:
+            rows = rows[np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]]
+        rows = np.sort(rows)
+        exact = view.vectors[rows] @ q
+        best = np.argsort(-exact, kind="stable")[:top_k]
+        scores = {int(rows[i]): float(exact[i]) for i in best}
+
+        fetched = self._fetch(view, "row", list(scores))
+        if fetched is None:  # Compacted under us: row numbers changed
+            self.reopen()
+            return self.query(embedding, top_k, ids)
+        hits = [(doc_id, text, meta, scores[row]) for row, doc_id, text, meta in fetched]
+        hits.sort(key=lambda hit: hit[3], reverse=True)
+        return hits
+
+    def disk_bytes(self) -> Dict[str, int]:
+        """Bytes on disk per file kind (for benchmarks and status)."""
+        sizes: Dict[str, int] = {}
+        for name in os.listdir(self.dir):
+            kind = name.split(".")[0]
+            sizes[kind] = sizes.get(kind, 0) + os.path.getsize(os.path.join(self.dir, name))
+        return sizes
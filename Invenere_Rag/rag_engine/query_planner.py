@@ -0,0 +1,209 @@
+# rag_engine/query_planner.py
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag_engine.bm25 import reciprocal_rank_fusion
+from rag_engine.memory import ConversationMemory, format_turns
+from rag_engine.timing import StageTimer
+
+# Words that only make sense with the previous turn in mind
+_REFERRING = re.compile(
+    r"\b(it|its|they|them|their|these|those|such|same|above|previous|former|latter|both|either)\b"
+    r"|^\s*(and|but|or|also|what about|how about)\b",
+    re.IGNORECASE
+)
+VAGUE_TERMS = ("these", "them", "those", "the above", "such methods", "those methods")
+
+class QueryPlanner:
+    """
+    Plans the retrieval of one conversational turn so that query rewriting
+    no longer sits in front of retrieval:
+
+    1. Retrieval on the raw query starts at once.
+    2. Rewriting (an LLM call) only runs if the query looks like it depends
+       on the conversation: a referring word ("it", "those", "what
+       about"...), a very short query, or an embedding close to the last
+       turn. Otherwise the raw results are final.
+    3. When it does run, the rewritten query is retrieved too, and both
+       result lists are fused with reciprocal rank fusion. If the rewrite
+       takes longer than rewrite_timeout, the raw results are used.
+
+    Entities of each answer are extracted in the background as soon as the
+    answer is known (observe_answer) and cached per answer, so a follow-up
+    about "those methods" finds them ready instead of waiting for a second
+    LLM call.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        rewrite: Callable[[str, str, str], str],
+        extract_entities: Optional[Callable[[str], str]] = None,
+        similarity_threshold: float = 0.5,
+        short_query_words: int = 3,
+        rewrite_timeout: float = None,
+        entity_cache_size: int = 256
+    ):
+        """
+        rewrite(query, recent_history, entity_list) returns the standalone
+        query; extract_entities(answer_text) a comma-separated entity list.
+        similarity_threshold: cosine between the query and the last turn
+        above which it counts as a follow-up.
+        """
+        self.pipeline = pipeline
+        self.rewrite = rewrite
+        self.extract_entities = extract_entities
+        self.similarity_threshold = similarity_threshold
+        self.short_query_words = short_query_words
+        self.rewrite_timeout = rewrite_timeout
+        self.entity_cache_size = entity_cache_size
+        self._entities: "OrderedDict[str, object]" = OrderedDict()  # answer hash -> str or Future
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="invenere-planner")
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    # --- entities ------------------------------------------------------------
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def observe_answer(self, answer: str):
+        """Starts extracting the answer's entities in the background (once per answer)."""
+        if self.extract_entities is None or not answer:
+            return
+        key = self._key(answer)
+        with self._lock:
+            if key in self._entities:
+                self._entities.move_to_end(key)
+                return
+            self._entities[key] = self._pool.submit(self.extract_entities, answer)
+            while len(self._entities) > self.entity_cache_size:
+                self._entities.popitem(last=False)
+
+    def entities(self, answer: str) -> str:
+        """Entity list of answer, from the cache (waiting for a running extraction)."""
+        if self.extract_entities is None or not answer:
+            return ""
+        self.observe_answer(answer)
+        with self._lock:
+            entry = self._entities.get(self._key(answer))
+        if entry is None:
+            return ""
+        try:
+            return (entry.result() if hasattr(entry, "result") else entry).strip()
+        except Exception as e:
+            print(f"Entity extraction failed: {e}")
+            return ""
+
+    # --- planning ------------------------------------------------------------
+
+    def needs_rewrite(self, query: str, history: List[Tuple[str, str]]) -> Tuple[bool, str]:
+        """(rewrite?, reason). Cheap checks first, one cached embedding comparison last."""
+        if not history:
+            return False, "no_history"
+        if _REFERRING.search(query):
+            return True, "referring_word"
+        if len(query.split()) <= self.short_query_words:
+            return True, "short_query"
+        last_q, last_a = history[-1][0], history[-1][1]
+        vectors = self.pipeline.embedder.embed_chunks([query, f"{last_q}\n{last_a}"])
+        similarity = float(np.dot(vectors[0], vectors[1]) / max(np.linalg.norm(vectors[0]) * np.linalg.norm(vectors[1]), 1e-9))
+        if similarity >= self.similarity_threshold:
+            return True, "similar_to_last_turn"
+        return False, "standalone"
+
+    def _rewritten_query(self, query: str, history: List[Tuple[str, str]], recent: str = None) -> str:
+        if recent is None:
+            recent = format_turns(history[-3:])
+        entity_list = ""
+        if any(term in query.lower() for term in VAGUE_TERMS):
+            entity_list = self.entities(history[-1][1])
+        rewritten = (self.rewrite(query, recent, entity_list) or "").strip()
+        return rewritten or query
+
+    def retrieve(
+        self,
+        query: str,
+        history: List[Tuple[str, str]] = None,
+        timer: StageTimer = None,
+        memory: ConversationMemory = None,
+        **retrieve_options
+    ) -> Tuple[str, List[Dict], Dict]:
+        """
+        Returns (query to answer, chunks, plan). The query is the rewrite when
+        one was used. plan records what happened: rewrite reason, whether a
+        rewrite was used, and the rewritten text. retrieve_options go to
+        RAGPipeline.retrieve (top_k, final_k, filters...). With a memory, its
+        turns are the history and its cached block (summary included) is
+        what the rewrite sees.
+        """
+        recent = None
+        if memory is not None:
+            history, recent = memory.turns, memory.block()
+        history = history or []
+        timer = timer or StageTimer()
+        final_k = retrieve_options.get("final_k", 5)
+        raw = self._pool.submit(self.pipeline.retrieve, query, history=history, timer=timer, **retrieve_options)
+
+        with timer.stage("plan"):
+            rewrite, reason = self.needs_rewrite(query, history)
+        plan = {"reason": reason, "rewritten": None, "used_rewrite": False}
+        if not rewrite:
+            return query, raw.result(), plan
+
+        def rewritten_path():
+            started = time.perf_counter()
+            rewritten = self._rewritten_query(query, history, recent)
+            timer.record("rewrite", time.perf_counter() - started)
+            if rewritten.strip().lower() == query.strip().lower():
+                return rewritten, None
+            # Own timer: this retrieval overlaps the raw one and would double its stages
+            started = time.perf_counter()
+            chunks = self.pipeline.retrieve(rewritten, history=history, timer=StageTimer(metrics=None), **retrieve_options)
+            timer.record("retrieve_rewritten", time.perf_counter() - started)
+            return rewritten, chunks
+
+        speculative = self._pool.submit(rewritten_path)
+        raw_chunks = raw.result()
+        try:
+            rewritten, rewritten_chunks = speculative.result(timeout=self.rewrite_timeout)
+        except FutureTimeout:
+            plan["reason"] += "+timeout"
+            return query, raw_chunks, plan
+        except Exception as e:
+            print(f"Query rewrite failed, using the raw query: {e}")
+            return query, raw_chunks, plan
+        plan["rewritten"] = rewritten
+        if rewritten_chunks is None:
+            return query, raw_chunks, plan
+
+        plan["used_rewrite"] = True
+        return rewritten, self.merge(rewritten_chunks, raw_chunks, final_k), plan
+
+    @staticmethod
+    def merge(preferred: List[Dict], other: List[Dict], final_k: int) -> List[Dict]:
+        """
+        Reciprocal rank fusion of two retrieve() results by chunk id; ties
+        go to preferred (the rewritten query's). Rerank scores of different
+        queries are not comparable, ranks are.
+        """
+        def key(chunk):
+            meta = chunk["metadata"]
+            return meta.get("chunk_id") or f"{meta.get('source')}_{meta.get('chunk_index')}"
+
+        by_key = {}
+        for chunk in other + preferred:
+            by_key[key(chunk)] = chunk
+        fused = reciprocal_rank_fusion([[key(c) for c in preferred], [key(c) for c in other]])
+        return [by_key[chunk_key] for chunk_key, _ in fused[:final_k]]
@@ -1,8 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from rag_engine.answer_cache import SemanticAnswerCache
 from rag_engine.chunker import chunk_text
+from rag_engine.context_builder import APPROXIMATE_BUDGET_SHARE, ContextBuilder, approximate_tokens, make_token_counter
 from rag_engine.embedder import Embedder
-from rag_engine.vector_store import VectorStore
+from rag_engine.sharded_store import open_store
 from rag_engine.reranker import Reranker
-from rag_engine.llama_interface import query_llama
+from rag_engine.llama_interface import OllamaClient
+from rag_engine.memory import ConversationMemory
+from rag_engine.model_registry import MODELS
+from rag_engine.timing import StageTimer, timed_stream
 
 def build_history_enhanced_query(query, history, history_turns=1):
     """
@@ -19,17 +26,107 @@ def build_history_enhanced_query(query, history, history_turns=1):
     else:
         return query
 
+def preload_models(
+    embed_model: str = "all-MiniLM-L6-v2",
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    freeze: bool = False
+):
+    """
+    Loads the pipeline's models into the process-wide registry ahead of first
+    use. With freeze=True, for a parent process about to fork workers that
+    should share the weights (see ModelRegistry).
+    """
+    Embedder(embed_model, cache_dir=None).model
+    Reranker(rerank_model).model
+    if freeze:
+        MODELS.freeze()
 
 class RAGPipeline:
-    def __init__(self):
-        self.embedder = Embedder()
-        self.vector_store = VectorStore()
-        self.reranker = Reranker()
+    def __init__(
+        self,
+        embed_workers: int = 1,
+        read_only: bool = False,
+        llm_model: str = "llama3",
+        embed_model: str = "all-MiniLM-L6-v2",
+        rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        persist_dir: str = "./chroma_db",
+        micro_batch_ms: float = None,
+        answer_cache: bool = False,
+        num_ctx: int = 4096,
+        answer_tokens: int = 768,
+        tokenizer_name: str = None,
+        embedder: Embedder = None,
+        reranker: Reranker = None,
+        vector_backend: str = None,
+        shards: int = None,
+        shard_by: str = "hash",
+        shard_roots: list = None,
+        preload: bool = False
+    ):
+        """
+        read_only: open the vector store for querying only (no collection scan,
+        no writes), for processes that never index.
+        llm_model: Ollama model used for answers (server from $OLLAMA_HOST).
+        micro_batch_ms: coalescing window for concurrent query embedding and
+        reranking (for servers; leave None for single-user tools).
+        answer_cache: serve repeated and near-duplicate history-free
+        questions from a semantic answer cache.
+        num_ctx: LLM context window; prompts are packed to num_ctx - answer_tokens
+        tokens, counted with tokenizer_name (a Hugging Face tokenizer matching
+        llm_model) or estimated without one, in which case only
+        APPROXIMATE_BUDGET_SHARE of that is filled.
+        embedder/reranker: ready-made instances (or stand-ins with the same
+        methods) used instead of loading embed_model/rerank_model.
+        vector_backend: dense index of a new store ("chroma" or "quantized");
+        existing stores keep the one they were built with.
+        shards/shard_by/shard_roots: create a new store as that many shards
+        partitioned by "hash" of the file path or by "root" (one shard per
+        shard_roots entry), see ShardedVectorStore. Existing stores, sharded
+        or not, are reopened as they are.
+        preload: load the models and open the dense index now; by default
+        each is loaded on first use, so a process starts in well under a
+        second and only pays for what it uses.
+        """
+        self.llm = OllamaClient(model=llm_model, num_ctx=num_ctx)
+        count_tokens = make_token_counter(tokenizer_name)
+        self.prompt_budget = num_ctx - answer_tokens
+        if count_tokens is approximate_tokens:
+            # Estimated counts can undershoot; keep a margin so the prompt still fits num_ctx
+            self.prompt_budget = int(self.prompt_budget * APPROXIMATE_BUDGET_SHARE)
+        self.context_builder = ContextBuilder(count_tokens)
+        self.embedder = embedder or Embedder(embed_model, workers=embed_workers, micro_batch_ms=micro_batch_ms)
+        self.vector_store = open_store(
+            persist_dir, read_only=read_only, backend=vector_backend,
+            shards=shards, partition=shard_by, roots=shard_roots
+        )
+        self.reranker = reranker or Reranker(rerank_model, micro_batch_ms=micro_batch_ms)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="invenere-writer")
+        self._pending_write = None
+        self.answer_cache = SemanticAnswerCache() if answer_cache else None
+        self._changes_seen = self.vector_store.changes.latest()
+        if preload:
+            for component in (self.embedder, self.reranker):
+                getattr(component, "model", None)  # Stand-ins may have no model
+            self.vector_store.count()
 
-    def index_documents(self, documents: list[tuple[str, str, dict]]):
+    def index_documents(
+        self,
+        documents: list[tuple[str, str, dict]],
+        replace: bool = False,
+        wait: bool = True,
+        timer: StageTimer = None
+    ):
         """
         Accepts: list of (file_path, chunk_text, chunk_metadata)
+        With replace=True, existing chunks of every file in the batch are deleted
+        first, so re-indexed files never keep stale chunks.
+        Embedding runs on the calling thread; the write runs on a single writer
+        thread, after any previously submitted write. With wait=False the write
+        Future is returned immediately, so the caller can embed the next batch
+        while this one is committed. With wait=True returns the rows written.
+        timer, if given, gets the embed and write stages.
         """
+        timer = timer or StageTimer("index", metrics=None)
         all_chunks = []
         all_filepaths = []
         all_metadatas = []
@@ -42,40 +139,85 @@ class RAGPipeline:
             all_filepaths.append(file_path)
             all_metadatas.append(chunk_metadata if chunk_metadata else {})
 
-        if all_chunks:
-            embeddings = self.embedder.embed_chunks(all_chunks)
-            self.vector_store.add(
-                embeddings,
-                all_chunks,
-                all_filepaths,
-                metadatas=all_metadatas
-            )
-            print(f"Indexed {len(all_chunks)} chunks in this batch.")
-        else:
+        replaced_files = set(file_path for file_path, _, _ in documents) if replace else set()
+        with timer.stage("embed"):
+            embeddings = self.embedder.embed_bulk(all_chunks) if all_chunks else None
+        timer.count("embedded_chunks", len(all_chunks))
+        if not all_chunks:
             print("No valid chunks to index in this batch!")
 
-    def query(
+        def write():
+            with timer.stage("write"):
+                if replaced_files:
+                    self.delete_files(replaced_files)
+                if not all_chunks:
+                    return 0
+                written = self.vector_store.add(
+                    embeddings,
+                    all_chunks,
+                    all_filepaths,
+                    metadatas=all_metadatas
+                )
+            timer.count("written_chunks", written)
+            return written
+
+        # One write in flight at most: bounds memory and keeps writes ordered
+        if self._pending_write is not None:
+            wait_futures([self._pending_write])
+        self._pending_write = self._writer.submit(write)
+        if wait:
+            return self._pending_write.result()
+        return self._pending_write
+
+    def flush(self):
+        """
+        Waits for the last submitted write, re-raising its error if it failed.
+        """
+        if self._pending_write is not None:
+            self._pending_write.result()
+
+    def delete_files(self, file_paths):
+        removed = self.vector_store.delete_files(file_paths)
+        if removed:
+            print(f"Removed {removed} stale chunks.")
+        return removed
+
+    def retrieve(
         self,
         user_query: str,
         top_k: int = 10,
         final_k: int = 5,
-        return_sources: bool = False,
         use_hybrid: bool = True,
         history: list = None,
-        history_turns: int = 1
-    ):
+        history_turns: int = 1,
+        rerank_budget_ms: float = None,
+        timer: StageTimer = None,
+        filters: dict = None
+    ) -> list[dict]:
+        """
+        Retrieval only, no generation: embeds the query, searches, reranks.
+        Returns up to final_k {"text", "metadata", "score"} dicts, best first.
+        filters restricts the search to matching chunks, e.g.
+        {"ext": ".pdf", "modified": {"$gte": "2024-01-01"}} (see
+        metadata_index.parse_filters). Stage timings (embed, dense_search,
+        sparse_search, rerank) are added to timer if one is given.
+        """
         if history is None:
             history = []
+        timer = timer or StageTimer()
 
-        query_embedding = self.embedder.embed_chunks([user_query])
+        with timer.stage("embed"):
+            query_embedding = self.embedder.embed_query(user_query)
 
         # Step 1: Retrieve top-k with metadata
+        self.vector_store.refresh()  # Pick up chunks written by another process
         if use_hybrid:
             retrieved = self.vector_store.hybrid_search(
-                user_query, query_embedding[0], top_k=top_k
+                user_query, query_embedding, top_k=top_k, timer=timer, filters=filters
             )
         else:
-            retrieved = self.vector_store.search(query_embedding, top_k=top_k)
+            with timer.stage("dense_search"):
+                retrieved = self.vector_store.search([query_embedding], top_k=top_k, filters=filters)
 
         # retrieved: list of (chunk_text, metadata)
         # For reranker, pass both chunk_text and metadata!
@@ -83,51 +225,198 @@ class RAGPipeline:
             user_query, history, history_turns=history_turns
         )
 
-        reranked = self.reranker.rerank(
-            history_enhanced_query,
-            retrieved,
-            top_n=final_k
-        )
+        with timer.stage("rerank"):
+            reranked = self.reranker.rerank(
+                history_enhanced_query,
+                retrieved,
+                top_n=final_k,
+                latency_budget_ms=rerank_budget_ms
+            )
         # reranked: List[(chunk_text, metadata, score)]
-        reranked_texts = [chunk for chunk, meta, score in reranked]
-        reranked_sources = [meta.get('source', 'unknown') for chunk, meta, score in reranked]
-        reranked_metadata = [meta for chunk, meta, score in reranked]
-
-        # Build context string for LLM, including heading/section info
-        context = "\n\n".join([
-            f"[Section: {meta.get('heading', 'Unknown')}] {chunk}"
-            if meta.get("heading") else chunk
-            for chunk, meta in zip(reranked_texts, reranked_metadata)
-        ])
-
-        conversation_history = "\n".join([
-    f"Q: {item[0]}\nA: {item[1]}"
-    for item in history[-history_turns:]
-    if isinstance(item, (tuple, list)) and len(item) > 1
-])
+        return [{"text": chunk, "metadata": meta, "score": score} for chunk, meta, score in reranked]
+
+    def build_prompt(
+        self,
+        user_query: str,
+        chunks: list[dict],
+        history: list = None,
+        history_turns: int = 1,
+        report: dict = None,
+        timer: StageTimer = None,
+        memory: ConversationMemory = None
+    ) -> str:
+        """
+        Builds the answer prompt from retrieve() results and recent history.
+        The context is packed into whatever the instructions, history and
+        question leave of the prompt budget. If report is a dict it is filled
+        with the budget use (see ContextBuilder.build) plus prompt_tokens.
+        memory, if given, replaces history: its cached block (rolling summary
+        and token-bounded window) is the previous conversation.
+        """
+        history = history or []
+        timer = timer or StageTimer()
+        if memory is not None:
+            conversation_history = memory.block()
+        else:
+            conversation_history = "\n".join([
+                f"Q: {item[0]}\nA: {item[1]}"
+                for item in history[-history_turns:]
+                if isinstance(item, (tuple, list)) and len(item) > 1
+            ])
         memory_block = (
             f"Previous Conversation:\n{conversation_history}\n\n"
             if conversation_history else ""
         )
 
-        prompt = (
+        prefix = (
             "You are a helpful expert assistant. Carefully read the previous conversation and the context below. "
             "Answer the user's latest question by linking it to any relevant prior topics or examples. "
             "Use ONLY the information in the context for facts, but you may refer to previous Q&As to maintain coherence or connect ideas. "
             "If the context contains multiple relevant methods or ideas, name and compare them directly, with examples if possible. "
             "If the answer cannot be found in the context, reply with 'Not enough information in the context.'\n\n"
             f"{memory_block}"
-            f"Context:\n{context}\n\n"
-            f"Question: {user_query}\nDetailed Answer:"
+            "Context:\n"
+        )
+        suffix = f"\n\nQuestion: {user_query}\nDetailed Answer:"
+        with timer.stage("context"):
+            frame_tokens = self.context_builder.count_tokens(prefix + suffix)
+            context, budget_report = self.context_builder.build(
+                user_query, chunks, max(0, self.prompt_budget - frame_tokens)
+            )
+        budget_report["prompt_tokens"] = frame_tokens + budget_report["used_tokens"]
+        if report is not None:
+            report.update(budget_report)
+        return prefix + context + suffix
+
+    def generate(self, prompt: str, stream: bool = False, timer: StageTimer = None):
+        """
+        The single LLM call of a turn. Returns the answer string, or a token
+        iterator with stream=True. timer gets llm_total (and llm_first_token
+        when streaming).
+        """
+        timer = timer or StageTimer()
+        if stream:
+            return timed_stream(self.llm.generate_stream(prompt), timer)
+        try:
+            with timer.stage("llm_total"):
+                return self.llm.generate(prompt)
+        except Exception as e:
+            print("Error querying LLaMA:", e)
+            return f"❌ Error querying LLaMA: {e}"
+
+    def cached_answer(
+        self,
+        user_query: str,
+        history: list = None,
+        timer: StageTimer = None,
+        filters: dict = None,
+        top_k: int = 10,
+        final_k: int = 5,
+        use_hybrid: bool = True,
+        rerank_budget_ms: float = None
+    ):
+        """
+        Looks the question up in the answer cache. Returns (entry, cache key
+        for remember_answer); entry is None on a miss, and both are None when
+        the cache is off or the question depends on history or filters.
+        Answers only match questions asked with the same retrieval settings
+        (top_k, final_k, use_hybrid, rerank_budget_ms). Entries whose sources were
+        re-indexed or deleted since the last call (by any process) are
+        dropped first.
+        """
+        if self.answer_cache is None or history or filters:
+            return None, None
+        partition = (top_k, final_k, use_hybrid, rerank_budget_ms)
+        timer = timer or StageTimer()
+        with timer.stage("answer_cache"):
+            seq, changed = self.vector_store.changes.since(self._changes_seen)
+            if seq != self._changes_seen:
+                self.answer_cache.invalidate_sources(changed)
+                self._changes_seen = seq
+            query_embedding = self.embedder.embed_query(user_query)
+            return self.answer_cache.lookup(query_embedding, partition), (query_embedding, partition)
+
+    def remember_answer(self, cache_key, user_query: str, answer, sources: list[str]):
+        """
+        Stores a generated answer for cached_answer(), under the cache key it
+        returned. answer may be a token iterator; it is then wrapped and
+        stored once fully consumed.
+        """
+        if self.answer_cache is None or cache_key is None:
+            return answer
+        query_embedding, partition = cache_key
+        if isinstance(answer, str):
+            if not answer.startswith("❌"):
+                self.answer_cache.store(query_embedding, user_query, answer, sources, partition)
+            return answer
+
+        def tee():
+            parts = []
+            for token in answer:
+                parts.append(token)
+                yield token
+            self.answer_cache.store(query_embedding, user_query, "".join(parts).strip(), sources, partition)
+        return tee()
+
+    def query(
+        self,
+        user_query: str,
+        top_k: int = 10,
+        final_k: int = 5,
+        return_sources: bool = False,
+        use_hybrid: bool = True,
+        history: list = None,
+        history_turns: int = 1,
+        rerank_budget_ms: float = None,
+        stream: bool = False,
+        timer: StageTimer = None,
+        filters: dict = None,
+        memory: ConversationMemory = None
+    ):
+        """
+        retrieve() + build_prompt() + generate(), short-circuited by the answer
+        cache when enabled (unfiltered questions only). filters as for
+        retrieve(). With stream=True the answer
+        is an iterator of tokens instead of a string (returned together with
+        the sources when return_sources=True). The turn's stage timings go to
+        timer (a new one if not given), which is finished once the answer is
+        complete. memory (a ConversationMemory) stands in for history; the
+        caller adds the finished turn to it.
+        """
+        timer = timer or StageTimer()
+        if memory is not None:
+            history = memory.turns
+        # A memory holding only a summary still makes the question history-dependent
+        hit, cache_key = self.cached_answer(
+            user_query, history or memory, timer=timer, filters=filters,
+            top_k=top_k, final_k=final_k, use_hybrid=use_hybrid, rerank_budget_ms=rerank_budget_ms
         )
+        if hit is not None:
+            timer.finish(cached=True)
+            answer = iter([hit["answer"]]) if stream else hit["answer"]
+            return (answer, hit["sources"]) if return_sources else answer
 
-        print("\n--- Prompt passed to LLM ---")
-        print(prompt)
-        print("Prompt length (chars):", len(prompt))
-        print("\n--- End of prompt ---")
+        chunks = self.retrieve(
+            user_query, top_k=top_k, final_k=final_k, use_hybrid=use_hybrid,
+            history=history, history_turns=history_turns, rerank_budget_ms=rerank_budget_ms,
+            timer=timer, filters=filters
+        )
+        prompt = self.build_prompt(
+            user_query, chunks, history=history, history_turns=history_turns, timer=timer, memory=memory
+        )
 
-        answer = query_llama(prompt)
-        print("LLM Raw Answer:", answer)
+        sources = [chunk["metadata"].get("source", "unknown") for chunk in chunks]
+        answer = self.generate(prompt, stream=stream, timer=timer)
+        if stream:
+            def finish_after(tokens):
+                try:
+                    yield from tokens
+                finally:
+                    timer.finish(cached=False)
+            answer = finish_after(answer)
+        else:
+            timer.finish(cached=False)
+        answer = self.remember_answer(cache_key, user_query, answer, sources)
         if return_sources:
-            return answer, reranked_sources
+            return answer, sources
         return answer
@@ -1,27 +1,137 @@
 # rag_engine/reranker.py
 
-from sentence_transformers import CrossEncoder
-from typing import List, Tuple, Dict
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Dict
+
+from rag_engine.batching import MicroBatcher
+from rag_engine.model_registry import MODELS
 
 class Reranker:
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        self.model = CrossEncoder(model_name)
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        max_passage_tokens: int = 256,
+        batch_size: int = 32,
+        cache_size: int = 50_000,
+        min_dense_score: Optional[float] = 0.1,
+        latency_budget_ms: Optional[float] = None,
+        micro_batch_ms: Optional[float] = None,
+        heading_boost: float = 0.3
+    ):
+        """
+        max_passage_tokens: query + passage are truncated to this many tokens.
+        cache_size: entries in the (query hash, passage hash) -> score LRU cache.
+        min_dense_score: first stage; passages whose dense_score (from
+        VectorStore metadata) is below it are not sent to the cross-encoder.
+        latency_budget_ms: default time budget for cross-encoder scoring.
+        micro_batch_ms: if set, pair batches from concurrent rerank calls
+        arriving within this window share one forward pass.
+        heading_boost: added to the score of passages whose heading shares a
+        word with the query (rerank's boost_on_heading).
+        The cross-encoder is loaded on first use and shared process-wide
+        (see model_registry).
+        """
+        self.model_name = model_name
+        self.max_passage_tokens = max_passage_tokens
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.min_dense_score = min_dense_score
+        self.latency_budget_ms = latency_budget_ms
+        self.heading_boost = heading_boost
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # rerank may run on several threads
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._batcher = (
+            MicroBatcher(self._predict_many, max_batch=16, max_wait_ms=micro_batch_ms, name="invenere-rerank-batcher")
+            if micro_batch_ms else None
+        )
+
+    @property
+    def model(self):
+        return MODELS.get("cross_encoder", self.model_name, max_length=self.max_passage_tokens)
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if self._batcher is not None:
+            return self._batcher(pairs)
+        return self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    def _predict_many(self, pair_lists: List[List[Tuple[str, str]]]) -> List[List[float]]:
+        # One forward pass for every caller's pairs, split back per caller
+        flat = [pair for pairs in pair_lists for pair in pairs]
+        scores = self.model.predict(flat, batch_size=len(flat), show_progress_bar=False)
+        results = []
+        offset = 0
+        for pairs in pair_lists:
+            results.append(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+        return results
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _truncate(self, passage: str) -> str:
+        # Cheap pre-cut so huge heading chunks are never fully tokenized;
+        # the tokenizer applies the exact token limit.
+        return passage[: self.max_passage_tokens * 8]
 
     def rerank(
         self,
         query: str,
         passages: List[Tuple[str, Dict]],
         top_n: int = 3,
-        boost_on_heading: bool = True
+        boost_on_heading: bool = True,
+        latency_budget_ms: Optional[float] = None
     ) -> List[Tuple[str, Dict, float]]:
         """
         passages: list of (text, metadata) tuples
         Returns top_n (text, metadata, score), sorted by score descending.
         Optionally boosts passages whose heading matches query keywords.
+        Cached scores are reused; passages failing the first stage, or left
+        over when the latency budget runs out, are not cross-encoded and rank
+        after every scored passage, in retrieval order, with score -inf.
         """
-        # Standard cross-encoder scoring
-        pairs = [(query, passage) for passage, _ in passages]
-        scores = self.model.predict(pairs)
+        start = time.perf_counter()
+        budget = latency_budget_ms if latency_budget_ms is not None else self.latency_budget_ms
+        query_key = self._key(query)
+        scores = [float("-inf")] * len(passages)
+
+        to_score = []
+        with self._cache_lock:
+            for idx, (passage, meta) in enumerate(passages):
+                dense_score = meta.get("dense_score")
+                if self.min_dense_score is not None and dense_score is not None and dense_score < self.min_dense_score:
+                    continue
+                # Keyed by text, not chunk id: ids are stable per file, so a
+                # re-indexed chunk must not get the score of its old text
+                cache_key = (query_key, self._key(passage))
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    self._cache.move_to_end(cache_key)
+                    scores[idx] = cached
+                    self.cache_hits += 1
+                else:
+                    to_score.append((idx, cache_key))
+                    self.cache_misses += 1
+
+        # Similar lengths per batch means little padding
+        to_score.sort(key=lambda item: len(passages[item[0]][0]))
+        for batch_start in range(0, len(to_score), self.batch_size):
+            if budget is not None and (time.perf_counter() - start) * 1000 >= budget:
+                break
+            batch = to_score[batch_start:batch_start + self.batch_size]
+            pairs = [(query, self._truncate(passages[idx][0])) for idx, _ in batch]
+            batch_scores = self._predict(pairs)
+            with self._cache_lock:
+                for (idx, cache_key), score in zip(batch, batch_scores):
+                    scores[idx] = float(score)
+                    self._cache[cache_key] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
 
         # Optional: boost passages with heading match
         if boost_on_heading:
@@ -29,9 +139,10 @@ class Reranker:
             for idx, (_, meta) in enumerate(passages):
                 heading = meta.get("heading", "")
                 if heading and any(word in heading.lower() for word in query_keywords):
-                    scores[idx] += 0.3  # Boost: tune as desired
+                    scores[idx] += self.heading_boost
 
-        # Return sorted by (text, metadata, score)
+        # Return sorted by (text, metadata, score); the sort is stable, so
+        # unscored passages keep their retrieval order
         scored_passages = sorted(
             [(passages[i][0], passages[i][1], scores[i]) for i in range(len(passages))],
             key=lambda x: x[2],
@@ -0,0 +1,367 @@
+# rag_engine/sharded_store.py
+
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_engine.bm25 import reciprocal_rank_fusion, tokenize
+from rag_engine.change_log import ChangeLog
+from rag_engine.metadata_index import parse_filters
+from rag_engine.timing import StageTimer
+from rag_engine.vector_store import RELOAD_INTERVAL
+
+PARTITIONS = ("hash", "root")
+_CONFIG = "shards.json"
+
+_shard_store = None
+
+def _init_shard(shard_dir: str, collection_name: str, read_only: bool, backend: Optional[str]):
+    global _shard_store
+    from rag_engine.vector_store import VectorStore
+    _shard_store = VectorStore(collection_name, persist_dir=shard_dir, read_only=read_only, backend=backend)
+
+def _call_shard(method: str, *args, **kwargs):
+    return getattr(_shard_store, method)(*args, **kwargs)
+
+def _shard_dense(embedding: np.ndarray, top_k: int, terms: List[str], filters: Optional[Dict] = None):
+    """Scatter phase 1: this shard's dense hits and its BM25 statistics for terms."""
+    found = _shard_store._dense_hits(embedding, top_k, _shard_store.prefilter(filters))
+    hits = [(doc_id, doc, meta) for doc_id, (doc, meta) in found.items()]
+    return hits, _shard_store.bm25.term_stats(terms)
+
+def _shard_sparse(user_query: str, top_k: int, stats: Tuple[int, int, Dict[str, int]], filters: Optional[Dict] = None):
+    """Scatter phase 2: this shard's BM25 top_k under global statistics, with the chunks."""
+    ranked = _shard_store._sparse_hits(user_query, top_k, _shard_store.prefilter(filters), stats=stats)
+    if not ranked:
+        return []  # Chroma's get() refuses an empty id list
+    rows = {doc_id: (doc, meta) for doc_id, doc, meta in _shard_store.backend.get([doc_id for doc_id, _ in ranked])}
+    return [(doc_id, score, *rows[doc_id]) for doc_id, score in ranked if doc_id in rows]
+
+def source_of(chunk_id: str) -> str:
+    """The file path part of a "<path>_<chunk_index>" chunk id."""
+    return chunk_id.rsplit("_", 1)[0]
+
+def read_config(persist_dir: str) -> Optional[dict]:
+    path = os.path.join(persist_dir, _CONFIG)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class ShardedVectorStore:
+    """
+    VectorStore split over N shards, each a complete store (dense backend,
+    BM25, change log) in its own directory, served by its own worker
+    process. Chunks are placed by their source file: by a hash of the path,
+    or by the indexing root it lives under (files outside every root fall
+    back to the hash). Writes are routed to their shards and run in
+    parallel; searches scatter to all shards at once and gather a global
+    top-k, so per-query work per shard stays about 1/N of the corpus.
+
+    The layout (shards.json next to the shard directories) is fixed when the
+    store is created; reopening needs only persist_dir.
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_db",
+        shards: int = None,
+        partition: str = "hash",
+        roots: Sequence[str] = None,
+        read_only: bool = False,
+        backend: str = None,
+        collection_name: str = "mydocs"
+    ):
+        """
+        shards/partition/roots describe a new store ("root" partitioning
+        puts each of roots in its own shard, so shards defaults to
+        len(roots)); an existing store keeps its layout and asking for a
+        different one is an error. backend: dense index of new shards.
+        """
+        self.persist_dir = persist_dir
+        self.read_only = read_only
+        self.collection_name = collection_name
+        self.backend_name = backend
+        config = read_config(persist_dir)
+        if config is None:
+            if read_only:
+                raise ValueError(f"{persist_dir} is not a sharded store")
+            config = self._create_config(shards, partition, roots)
+        elif shards and (shards, partition) != (config["shards"], config["partition"]):
+            raise ValueError(
+                f"{persist_dir} has {config['shards']} shards partitioned by {config['partition']}; "
+                f"cannot open it with {shards} by {partition}"
+            )
+        self.shards = config["shards"]
+        self.partition = config["partition"]
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in config.get("roots", [])]
+        self.changes = ChangeLog(os.path.join(persist_dir, "changes.sqlite"), read_only=read_only)
+        self._opened_seq = self.changes.latest()
+        self._next_refresh = self._next_reload = 0.0
+        self._refresh_lock = threading.Lock()
+        self._pools = [self._start(shard) for shard in range(self.shards)]
+        # Workers start in parallel; this also surfaces a shard that fails to open
+        self._scatter({shard: ("count",) for shard in range(self.shards)})
+
+    def _create_config(self, shards: Optional[int], partition: str, roots: Optional[Sequence[str]]) -> dict:
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partitioning {partition!r}; expected one of {', '.join(PARTITIONS)}")
+        roots = list(roots or [])
+        if partition == "root":
+            if not roots:
+                raise ValueError("Root partitioning needs the indexing roots")
+            shards = shards or len(roots)
+        if not shards or shards < 1:
+            raise ValueError("A sharded store needs at least one shard")
+        config = {"shards": shards, "partition": partition, "roots": roots}
+        os.makedirs(self.persist_dir, exist_ok=True)
+        with open(os.path.join(self.persist_dir, _CONFIG), "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        return config
+
+    def shard_dir(self, shard: int) -> str:
+        return os.path.join(self.persist_dir, f"shard-{shard:03d}")
+
+    def _start(self, shard: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard,
+            initargs=(self.shard_dir(shard), self.collection_name, self.read_only, self.backend_name)
+        )
+
+    def close(self):
+        for pool in self._pools:
+            pool.shutdown()
+
+    def shard_for(self, source: str) -> int:
+        """Shard holding source's chunks."""
+        if self.partition == "root":
+            path = os.path.abspath(source)
+            best = None
+            for shard, root in enumerate(self.roots):
+                if (path == root or path.startswith(root + os.sep)) and (best is None or len(root) > len(self.roots[best])):
+                    best = shard
+            if best is not None:
+                return best % self.shards
+        return zlib.crc32(source.encode("utf-8")) % self.shards
+
+    def _scatter(self, calls: Dict[int, tuple], function=_call_shard) -> Dict[int, object]:
+        """Runs function(*args) on each shard's worker concurrently; {shard: result}."""
+        futures = {shard: self._pools[shard].submit(function, *args) for shard, args in calls.items()}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def _group(self, sources: Sequence[str]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for idx, source in enumerate(sources):
+            groups.setdefault(self.shard_for(source), []).append(idx)
+        return groups
+
+    # --- VectorStore interface ----------------------------------------------
+
+    def refresh(self, min_interval: float = 1.0, reload_interval: float = None) -> bool:
+        """
+        Read-only stores: has the shards reopen their dense indexes if another
+        process wrote to the store (see VectorStore.refresh).
+        """
+        now = time.monotonic()
+        if not self.read_only or now < self._next_refresh:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_refresh = now + min_interval
+            if now < self._next_reload:
+                return False
+            seq = self.changes.latest()
+            if seq == self._opened_seq:
+                return False
+            # The interval is enforced here, once for all shards
+            reopened = self._scatter({shard: ("refresh", 0, 0) for shard in range(self.shards)})
+            self._opened_seq = seq
+            self._next_reload = now + (RELOAD_INTERVAL if reload_interval is None else reload_interval)
+            return any(reopened.values())
+        finally:
+            self._refresh_lock.release()
+
+    def count(self) -> int:
+        return sum(self._scatter({shard: ("count",) for shard in range(self.shards)}).values())
+
+    def stats(self) -> dict:
+        per_shard = self._scatter({shard: ("stats",) for shard in range(self.shards)})
+        return {
+            "chunks": sum(s["chunks"] for s in per_shard.values()),
+            "lexical_chunks": sum(s["lexical_chunks"] for s in per_shard.values()),
+            "vector_backend": per_shard[0]["vector_backend"],
+            "shards": self.shards,
+            "partition": self.partition,
+            "chunks_per_shard": [per_shard[shard]["chunks"] for shard in range(self.shards)],
+        }
+
+    def existing_ids(self, ids):
+        ids = list(ids)
+        groups = self._group([source_of(doc_id) for doc_id in ids])
+        found = self._scatter({
+            shard: ("existing_ids", [ids[i] for i in members]) for shard, members in groups.items()
+        })
+        return set().union(*found.values()) if found else set()
+
+    def rebuild_bm25(self, page_size=5000):
+        self._scatter({shard: ("rebuild_bm25", page_size) for shard in range(self.shards)})
+
+    def add(self, embeddings, chunks, filepaths, metadatas=None):
+        """
+        VectorStore.add, split by shard; the shards write concurrently.
+        Returns the number of rows written.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        if metadatas is None:
+            metadatas = [{} for _ in chunks]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        groups = self._group(filepaths)
+        written = self._scatter({
+            shard: (
+                "add", embeddings[members], [chunks[i] for i in members],
+                [filepaths[i] for i in members], [metadatas[i] for i in members]
+            )
+            for shard, members in groups.items()
+        })
+        self.changes.record(filepaths)
+        return sum(written.values())
+
+    def add_bulk(self, ids, embeddings, documents, metadatas, batch_size=5000):
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        sources = [meta.get("source", source_of(doc_id)) for doc_id, meta in zip(ids, metadatas)]
+        groups = self._group(sources)
+        written = self._scatter({
+            shard: (
+                "add_bulk", [ids[i] for i in members], embeddings[members],
+                [documents[i] for i in members], [metadatas[i] for i in members], batch_size
+            )
+            for shard, members in groups.items()
+        })
+        self.changes.record(sources)
+        return sum(written.values())
+
+    def delete_files(self, filepaths):
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        filepaths = list(filepaths)
+        groups = self._group(filepaths)
+        removed = self._scatter({
+            shard: ("delete_files", [filepaths[i] for i in members]) for shard, members in groups.items()
+        })
+        total = sum(removed.values())
+        if total:
+            self.changes.record(filepaths)
+        return total
+
+    def _gather_dense(self, embedding, top_k: int, terms: List[str], filters: Optional[Dict] = None):
+        gathered = self._scatter(
+            {shard: (embedding, top_k, terms, filters) for shard in range(self.shards)}, function=_shard_dense
+        )
+        hits = [hit for shard_hits, _ in gathered.values() for hit in shard_hits]
+        hits.sort(key=lambda hit: hit[2]["dense_score"], reverse=True)
+        n_docs, total_length, dfs = 0, 0, {}
+        for _, (shard_docs, shard_length, shard_dfs) in gathered.values():
+            n_docs += shard_docs
+            total_length += shard_length
+            for term, df in shard_dfs.items():
+                dfs[term] = dfs.get(term, 0) + df
+        return {doc_id: (doc, meta) for doc_id, doc, meta in hits[:top_k]}, (n_docs, total_length, dfs)
+
+    def search(self, embedding, top_k=5, filters=None):
+        found, _ = self._gather_dense(np.asarray(embedding[0], dtype=np.float32), top_k, [], filters)
+        return list(found.values())
+
+    def hybrid_search(
+        self, user_query: str, query_embedding: list, top_k: int = 10, rrf_k: int = 60,
+        timer: StageTimer = None, filters: dict = None
+    ):
+        """
+        VectorStore.hybrid_search over every shard, in two parallel rounds:
+        dense top_k plus BM25 term statistics from each shard, then each
+        shard's BM25 top_k scored with the summed statistics (so scores are
+        comparable across shards). The global top_k of both lists is fused
+        with reciprocal rank fusion, exactly as for a single store. Each
+        shard applies filters inside its own lookups.
+        """
+        timer = timer or StageTimer(metrics=None)
+        parse_filters(filters)  # Reject bad filters here rather than in every worker
+        terms = list(dict.fromkeys(tokenize(user_query)))
+        with timer.stage("dense_search"):
+            found, stats = self._gather_dense(np.asarray(query_embedding, dtype=np.float32), top_k, terms, filters)
+        with timer.stage("sparse_search"):
+            sparse = []
+            if terms and stats[0]:
+                gathered = self._scatter(
+                    {shard: (user_query, top_k, stats, filters) for shard in range(self.shards)},
+                    function=_shard_sparse
+                )
+                sparse = sorted((hit for hits in gathered.values() for hit in hits), key=lambda hit: hit[1], reverse=True)
+            sparse = sparse[:top_k]
+
+        fused = reciprocal_rank_fusion([list(found), [doc_id for doc_id, _, _, _ in sparse]], k=rrf_k)[:top_k]
+        for doc_id, _, doc, meta in sparse:
+            if doc_id not in found:
+                meta["chunk_id"] = doc_id
+                found[doc_id] = (doc, meta)
+        merged = []
+        for doc_id, score in fused:
+            found[doc_id][1]["fused_score"] = score
+            merged.append(found[doc_id])
+        return merged
+
+    # --- maintenance ---------------------------------------------------------
+
+    def reset_shard(self, shard: int):
+        """
+        Empties one shard (its worker is restarted on a fresh directory) so it
+        can be re-indexed on its own; the other shards keep serving. Readers
+        in other processes keep the old shard's files open until they are
+        restarted.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        if not 0 <= shard < self.shards:
+            raise ValueError(f"No shard {shard}; the store has {self.shards}")
+        self._pools[shard].shutdown()
+        shutil.rmtree(self.shard_dir(shard), ignore_errors=True)
+        self._pools[shard] = self._start(shard)
+        self._scatter({shard: ("count",)})
+        self.changes.record([self.shard_dir(shard)])
+
+def open_store(
+    persist_dir: str = "./chroma_db",
+    read_only: bool = False,
+    backend: str = None,
+    shards: int = None,
+    partition: str = "hash",
+    roots: Sequence[str] = None
+):
+    """
+    A ShardedVectorStore if persist_dir holds one or shards is given for a
+    new store, else a plain VectorStore.
+    """
+    from rag_engine.vector_store import VectorStore
+
+    if read_config(persist_dir) is not None:
+        return ShardedVectorStore(persist_dir, shards, partition, roots, read_only=read_only, backend=backend)
+    if shards or (partition == "root" and roots):
+        if any(os.path.exists(os.path.join(persist_dir, name)) for name in ("backend.txt", "chroma.sqlite3")):
+            raise ValueError(f"{persist_dir} holds an unsharded index; re-index into a new directory to shard it")
+        return ShardedVectorStore(persist_dir, shards, partition, roots, read_only=read_only, backend=backend)
+    if os.path.isdir(persist_dir) and any(name.startswith("shard-") for name in os.listdir(persist_dir)):
+        raise ValueError(f"{persist_dir} has shard directories but no {_CONFIG}")
+    return VectorStore(persist_dir=persist_dir, read_only=read_only, backend=backend)
@@ -0,0 +1,15 @@
+# rag_engine/sqlite_db.py
+
+import os
+import sqlite3
+from urllib.parse import quote
+
+def connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    """
+    Connection usable from any thread. read_only opens the file with
+    mode=ro: the process never takes a write lock or creates the file, so
+    the caller skips its DDL and PRAGMAs (the writer has set them up).
+    """
+    if read_only:
+        return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True, check_same_thread=False)
+    return sqlite3.connect(path, check_same_thread=False)
@@ -0,0 +1,221 @@
+# rag_engine/timing.py
+
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds: from a cached embedding lookup up to a long generation or a big PDF
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Structured traces: one JSON line per sampled request/indexing run
+TRACE_LOG = os.environ.get("INVENERE_TRACE_LOG")
+TRACE_SAMPLE = float(os.environ.get("INVENERE_TRACE_SAMPLE", "1.0"))
+_trace_lock = threading.Lock()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus semantics: a value lands in the first
+    bucket whose upper bound is >= the value).
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate by linear interpolation inside the bucket holding the q-th
+        observation (what Prometheus' histogram_quantile does).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+class Metrics:
+    """
+    Process-wide histograms and counters, exported in the Prometheus text
+    format. Each uvicorn worker process has its own registry.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        def fmt(labels: LabelKey, extra: str = "") -> str:
+            parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for labels, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        bucket = fmt(labels, f'le="{le}"')
+                        lines.append(f"{name}_bucket{bucket} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                    lines.append(f"{name}_count{fmt(labels)} {h.count}")
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def write_trace(record: dict):
+    with _trace_lock:
+        with open(TRACE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+class StageTimer:
+    """
+    Collects wall-clock seconds per named stage, plus item counts, for one
+    request or indexing run. Every stage is also observed in METRICS as
+    invenere_stage_seconds{pipeline, stage} and every count as
+    invenere_<name>_total. finish() writes the run as one JSON line to
+    $INVENERE_TRACE_LOG for a sample ($INVENERE_TRACE_SAMPLE) of runs.
+    Thread-safe: indexing threads share one timer.
+    """
+
+    def __init__(self, pipeline: str = "query", metrics: Metrics = METRICS, sample_rate: Optional[float] = None):
+        self.pipeline = pipeline
+        self.metrics = metrics
+        self.stages: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counts: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        rate = TRACE_SAMPLE if sample_rate is None else sample_rate
+        self.sampled = bool(TRACE_LOG) and random.random() < rate
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.metrics is not None:
+            self.metrics.observe("invenere_stage_seconds", seconds, pipeline=self.pipeline, stage=name)
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+        if self.metrics is not None:
+            self.metrics.inc(f"invenere_{name}_total", n, pipeline=self.pipeline)
+
+    def report(self) -> str:
+        return "  ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages.items())
+
+    def breakdown(self) -> str:
+        """
+        Per-stage table for --profile output. Share is of the run's wall
+        time; stages running in parallel (parse workers, the writer thread)
+        can add up to more than 100%.
+        """
+        wall = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        lines = [f"{'stage':<18}{'total ms':>11}{'calls':>8}{'avg ms':>10}{'share':>8}"]
+        for name, seconds in self.stages.items():
+            calls = self.calls.get(name, 1)
+            share = seconds / wall * 100 if wall else 0.0
+            lines.append(f"{name:<18}{seconds * 1000:>11.1f}{calls:>8}{seconds * 1000 / calls:>10.1f}{share:>7.0f}%")
+        lines.append(f"{'wall':<18}{wall * 1000:>11.1f}")
+        if self.counts:
+            lines.append("  ".join(f"{name}={value:g}" for name, value in self.counts.items()))
+        return "\n".join(lines)
+
+    def finish(self, **fields) -> dict:
+        """
+        Ends the run (idempotent) and returns its record; sampled runs are
+        also appended to the trace log.
+        """
+        with self._lock:
+            first = self.elapsed is None
+            if first:
+                self.elapsed = time.perf_counter() - self.started
+        record = {
+            "ts": time.time(),
+            "pipeline": self.pipeline,
+            "wall_ms": round(self.elapsed * 1000, 2),
+            "stages_ms": {name: round(s * 1000, 2) for name, s in self.stages.items()},
+            "counts": dict(self.counts),
+            **fields,
+        }
+        if first and self.sampled:
+            try:
+                write_trace(record)
+            except OSError as e:
+                print(f"Could not write trace: {e}")
+        return record
+
+def timed_stream(tokens: Iterable[str], timer: StageTimer) -> Iterator[str]:
+    """
+    Passes tokens through, recording llm_first_token and llm_total (from the
+    first pull) on timer.
+    """
+    start = time.perf_counter()
+    first = True
+    try:
+        for token in tokens:
+            if first:
+                timer.record("llm_first_token", time.perf_counter() - start)
+                first = False
+            yield token
+    finally:
+        timer.record("llm_total", time.perf_counter() - start)
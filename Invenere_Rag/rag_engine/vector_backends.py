@@ -0,0 +1,187 @@
+# rag_engine/vector_backends.py
+
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+
+_ID_LOOKUP_BATCH = 5000
+BACKENDS = ("chroma", "quantized")
+_MARKER = "backend.txt"
+
+# (id, text, metadata) and, for query results, (id, text, metadata, dense_score)
+Row = Tuple[str, str, Dict]
+Hit = Tuple[str, str, Dict, float]
+
+class VectorBackend:
+    """
+    What VectorStore needs from a dense index. Rows are (id, embedding,
+    text, metadata); ids are unique. query() returns hits best first with
+    dense_score = cosine similarity (embeddings are unit-norm). Writes come
+    from a single process; readers in other processes call reopen() to
+    see them.
+    """
+
+    name = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        raise NotImplementedError
+
+    def get(self, ids: List[str]) -> List[Row]:
+        """Rows for the ids that exist, in no particular order."""
+        raise NotImplementedError
+
+    def existing_ids(self, ids: Iterable[str]) -> Set[str]:
+        raise NotImplementedError
+
+    def ids_for_sources(self, sources: List[str]) -> List[str]:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def query(self, embedding: np.ndarray, top_k: int, ids: List[str] = None) -> List[Hit]:
+        """
+        Best top_k hits; with ids, only among those rows (candidates from a
+        metadata pre-filter, so the cost follows len(ids), not the corpus).
+        """
+        raise NotImplementedError
+
+    def iter_documents(self, page_size: int = 5000) -> Iterator[Tuple[List[str], List[str]]]:
+        """(ids, texts) pages covering every row."""
+        raise NotImplementedError
+
+    def reopen(self):
+        """Drops in-memory state so rows written by another process are seen."""
+
+class ChromaBackend(VectorBackend):
+    """
+    Chroma persistent collection: float32 vectors in an HNSW index, chunk
+    text and metadata in Chroma's SQLite.
+    """
+
+    name = "chroma"
+
+    def __init__(self, persist_dir: str, collection_name: str = "mydocs", read_only: bool = False):
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self._collection = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def collection(self):
+        # Opened on first use: importing chromadb and loading the HNSW index
+        # is most of a cold start, and hybrid search may not need it yet
+        if self._collection is None:
+            with self._open_lock:
+                if self._collection is None:
+                    self._open()
+        return self._collection
+
+    def _open(self):
+        import chromadb
+        self.client = chromadb.PersistentClient(path=self.persist_dir)
+        self._collection = self.client.get_or_create_collection(self.collection_name)
+
+    def reopen(self):
+        if self._collection is None:
+            return  # Not opened yet; the first use reads the index from disk
+        from chromadb.api.client import SharedSystemClient
+
+        # Forget only this store's cached Chroma system (keyed by its path) so
+        # the new client loads the index from disk. Other clients in the
+        # process keep theirs; queries already running keep the old collection.
+        identifier = self.client._identifier
+        with SharedSystemClient._refcount_lock:
+            SharedSystemClient._identifier_to_system.pop(identifier, None)
+            SharedSystemClient._identifier_to_refcount.pop(identifier, None)
+        self._open()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(embeddings=embeddings, documents=documents, metadatas=metadatas, ids=ids)
+
+    def get(self, ids):
+        result = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return [
+            (doc_id, doc, dict(meta or {}))
+            for doc_id, doc, meta in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    def existing_ids(self, ids):
+        # Looked up in batches instead of keeping every id in memory
+        ids = list(ids)
+        existing = set()
+        for start in range(0, len(ids), _ID_LOOKUP_BATCH):
+            batch = ids[start:start + _ID_LOOKUP_BATCH]
+            existing.update(self.collection.get(ids=batch, include=[])["ids"])
+        return existing
+
+    def ids_for_sources(self, sources):
+        where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": list(sources)}}
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def delete(self, ids):
+        self.collection.delete(ids=list(ids))
+
+    def query(self, embedding, top_k, ids=None):
+        if ids is not None:
+            if not ids:
+                return []
+            top_k = min(top_k, len(ids))
+        # Chroma restricts the HNSW search to ids itself (brute force when few)
+        result = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=top_k,
+            ids=ids,
+            include=["documents", "metadatas", "distances"]
+        )
+        # Squared-L2 distance between unit vectors -> cosine similarity
+        return [
+            (doc_id, doc, dict(meta or {}), 1.0 - distance / 2.0)
+            for doc_id, doc, meta, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def iter_documents(self, page_size=5000):
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"]
+            offset += len(page["ids"])
+
+def open_backend(persist_dir: str, collection_name: str = "mydocs", read_only: bool = False, backend: str = None):
+    """
+    Opens the store's dense backend. A store remembers the backend it was
+    created with, so readers need not be told; asking for a different one
+    than an existing store uses is an error. New stores default to chroma.
+    """
+    marker = os.path.join(persist_dir, _MARKER)
+    recorded = None
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            recorded = f.read().strip()
+    elif os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")):
+        recorded = "chroma"  # Created before backends were selectable
+    name = backend or recorded or "chroma"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown vector backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    if recorded and name != recorded:
+        raise ValueError(f"{persist_dir} holds a {recorded} index; cannot open it as {name}")
+    if recorded is None and not read_only:
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(name)
+
+    if name == "quantized":
+        from rag_engine.quantized_store import QuantizedBackend
+        return QuantizedBackend(persist_dir, collection_name, read_only=read_only)
+    return ChromaBackend(persist_dir, collection_name, read_only=read_only)
@@ -1,78 +1,291 @@
 # rag_engine/vector_store.py
 
-import chromadb
+import os
+import threading
+import time
+
+import numpy as np
+
+from rag_engine.bm25 import BM25Index, reciprocal_rank_fusion
+from rag_engine.change_log import ChangeLog
+from rag_engine.metadata_index import MetadataIndex, Prefilter, derived_fields
+from rag_engine.timing import StageTimer
+from rag_engine.vector_backends import open_backend
+
+# Minimum seconds between two reloads of the dense index by refresh(): a
+# reload rereads the whole index, and a writer may commit every few seconds
+RELOAD_INTERVAL = float(os.environ.get("INVENERE_RELOAD_INTERVAL", "30"))
 
 class VectorStore:
-    def __init__(self, collection_name="mydocs", persist_dir="./chroma_db"):
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        if collection_name in [c.name for c in self.client.list_collections()]:
-            self.collection = self.client.get_collection(collection_name)
-        else:
-            self.collection = self.client.create_collection(collection_name)
-        self.ids = set(self.collection.get()["ids"])  # Avoid duplicate IDs
+    def __init__(self, collection_name="mydocs", persist_dir="./chroma_db", read_only=False, backend=None):
+        """
+        Opening the store never scans the collection. read_only=True is for
+        query-only processes (app.py, query.py): writes are refused and no
+        index maintenance is attempted.
+        backend: dense index for a new store, "chroma" (default) or
+        "quantized" (int8 IVF in memory-mapped files, see quantized_store);
+        an existing store is reopened with the backend it was created with.
+        """
+        self.persist_dir = persist_dir
+        self.read_only = read_only
+        self.collection_name = collection_name
+        os.makedirs(persist_dir, exist_ok=True)
+        # Lexical index for hybrid search, kept next to the Chroma files
+        self.bm25 = BM25Index(os.path.join(persist_dir, "bm25.sqlite"), read_only=read_only)
+        # Typed, indexed metadata for filtered search
+        self.metadata = MetadataIndex(os.path.join(persist_dir, "metadata.sqlite"), read_only=read_only)
+        # Which sources changed, for caches in other processes (see answer_cache)
+        self.changes = ChangeLog(os.path.join(persist_dir, "changes.sqlite"), read_only=read_only)
+        self._opened_seq = self.changes.latest()
+        self._next_refresh = self._next_reload = 0.0
+        self._refresh_lock = threading.Lock()
+        self.backend = open_backend(persist_dir, collection_name, read_only=read_only, backend=backend)
+        if not self.bm25.count() and self.backend.count():
+            if read_only:
+                print("BM25 index is empty; run index_documents.py to build it. Hybrid search is dense-only.")
+            else:
+                self.rebuild_bm25()
+        if not self.metadata.count() and self.backend.count():
+            if read_only:
+                print("Metadata index is empty; run index_documents.py to build it. Filters match nothing.")
+            else:
+                self.rebuild_metadata_index()
+
+    def refresh(self, min_interval: float = 1.0, reload_interval: float = None) -> bool:
+        """
+        Read-only stores: reopens the dense index if another process (e.g.
+        watch_index.py) has written to it since it was opened. Backends keep
+        the dense index in memory (or mapped) per process, so a long-running
+        reader would otherwise never see new chunks; BM25 is read from SQLite
+        and is always current. Checks at most once per min_interval seconds
+        and reloads at most once per reload_interval (default
+        $INVENERE_RELOAD_INTERVAL, 30s). Returns True if the index was reopened.
+        """
+        now = time.monotonic()
+        if not self.read_only or now < self._next_refresh:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False  # Another thread is already checking
+        try:
+            self._next_refresh = now + min_interval
+            if now < self._next_reload:
+                return False
+            seq = self.changes.latest()
+            if seq == self._opened_seq:
+                return False
+            self.backend.reopen()
+            self._opened_seq = seq
+            self._next_reload = now + (RELOAD_INTERVAL if reload_interval is None else reload_interval)
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def count(self):
+        return self.backend.count()
+
+    def stats(self) -> dict:
+        return {"chunks": self.count(), "lexical_chunks": self.bm25.count(), "vector_backend": self.backend.name}
+
+    def existing_ids(self, ids):
+        """
+        Returns the subset of ids already in the collection.
+        """
+        return self.backend.existing_ids(ids)
+
+    def rebuild_bm25(self, page_size=5000):
+        """
+        Backfills the BM25 index from the collection (for stores created
+        before it existed).
+        """
+        print("Building BM25 index from the existing collection...")
+        for ids, documents in self.backend.iter_documents(page_size):
+            self.bm25.add(ids, documents)
+
+    def rebuild_metadata_index(self, page_size=5000):
+        """
+        Backfills the metadata index from the collection (for stores created
+        before it existed). Their values stay as they were stored (strings);
+        source_dir and ext are derived from the source path.
+        """
+        print("Building metadata index from the existing collection...")
+        for ids, _ in self.backend.iter_documents(page_size):
+            rows = self.backend.get(ids)
+            self.metadata.add([doc_id for doc_id, _, _ in rows], [meta for _, _, meta in rows])
 
     def sanitize_metadata(self, meta):
         """
-        Ensure all metadata values are strings (and not None).
+        Keeps ints, floats and bools (so filters can compare them); every
+        other value becomes a string, None an empty one.
         """
-        return {str(k): ("" if v is None else str(v)) for k, v in meta.items()}
+        return {
+            str(k): v if isinstance(v, (int, float, bool)) else ("" if v is None else str(v))
+            for k, v in meta.items()
+        }
 
     def add(self, embeddings, chunks, filepaths, metadatas=None):
-        ids = []
-        documents = []
-        all_metadatas = []
+        """
+        Adds chunks with their embeddings (an (n, dim) array), skipping ids
+        already in the collection. Vectors stay aligned with their chunks when
+        duplicates are skipped. Metadata gets source, source_dir, ext and the
+        file's modified time (epoch seconds) for filtering. Returns the number
+        of rows written.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
         if metadatas is None:
             metadatas = [{} for _ in chunks]
-        for idx, (emb, chunk, filepath, meta) in enumerate(zip(embeddings, chunks, filepaths, metadatas)):
-            id_str = f"{filepath}_{idx}"
-            if id_str in self.ids:
-                continue
-            ids.append(id_str)
-            documents.append(chunk)
-            meta_with_source = dict(meta)
+        # Stable per-file id: chunk_index is the chunk's position within its file
+        candidate_ids = [
+            f"{filepath}_{meta.get('chunk_index', idx)}"
+            for idx, (filepath, meta) in enumerate(zip(filepaths, metadatas))
+        ]
+        existing = self.existing_ids(candidate_ids)
+        keep = []
+        for idx, id_str in enumerate(candidate_ids):
+            if id_str not in existing:
+                existing.add(id_str)
+                keep.append(idx)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(keep) < len(candidate_ids):
+            embeddings = embeddings[keep]
+        all_metadatas = []
+        file_fields = {}
+        for idx in keep:
+            filepath = filepaths[idx]
+            if filepath not in file_fields:
+                file_fields[filepath] = derived_fields(filepath)
+                try:
+                    file_fields[filepath]["modified"] = int(os.path.getmtime(filepath))
+                except OSError:
+                    pass
+            meta_with_source = dict(metadatas[idx])
             meta_with_source["source"] = filepath
-            sanitized = self.sanitize_metadata(meta_with_source)
-            all_metadatas.append(sanitized)
-            self.ids.add(id_str)
-        batch_size = 5000
+            meta_with_source.update(file_fields[filepath])
+            all_metadatas.append(self.sanitize_metadata(meta_with_source))
+        return self.add_bulk(
+            [candidate_ids[idx] for idx in keep],
+            embeddings,
+            [chunks[idx] for idx in keep],
+            all_metadatas
+        )
+
+    def add_bulk(self, ids, embeddings, documents, metadatas, batch_size=5000):
+        """
+        Writes pre-aligned rows: ids[i], embeddings[i], documents[i] and
+        metadatas[i] describe the same chunk. embeddings is a contiguous
+        float32 array handed to the backend as-is (no per-row list conversion).
+        No duplicate check; use add() for that. Returns the rows written.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(ids) != len(embeddings) or len(ids) != len(documents) or len(ids) != len(metadatas):
+            raise ValueError("ids, embeddings, documents and metadatas must have the same length")
         total = len(ids)
         for start in range(0, total, batch_size):
             end = min(start + batch_size, total)
-            batch_embeddings = [e.tolist() for e in embeddings[start:end]]
-            batch_documents = documents[start:end]
-            batch_metadatas = all_metadatas[start:end]
-            batch_ids = ids[start:end]
-            self.collection.add(
-                embeddings=batch_embeddings,
-                documents=batch_documents,
-                metadatas=batch_metadatas,
-                ids=batch_ids
-            )
-
-    def search(self, embedding, top_k=5):
-        result = self.collection.query(
-            query_embeddings=[embedding[0].tolist()],
-            n_results=top_k
-        )
-        return list(zip(result["documents"][0], result["metadatas"][0]))
+            self.backend.add(ids[start:end], embeddings[start:end], documents[start:end], metadatas[start:end])
+            self.bm25.add(ids[start:end], documents[start:end])
+            self.metadata.add(ids[start:end], metadatas[start:end])
+        self.changes.record(meta.get("source", "") for meta in metadatas)
+        return total
 
-    def hybrid_search(self, user_query: str, query_embedding: list, top_k: int = 10):
-        dense_results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
-        )
-        dense_docs = list(zip(dense_results["documents"][0], dense_results["metadatas"][0]))
-        sparse_results = self.collection.query(
-            query_texts=[user_query],
-            n_results=top_k
-        )
-        sparse_docs = list(zip(sparse_results["documents"][0], sparse_results["metadatas"][0]))
-        seen = set()
+    def delete_files(self, filepaths):
+        """
+        Removes every chunk whose source is one of filepaths.
+        Returns the number of chunks deleted.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        filepaths = list(filepaths)
+        if not filepaths:
+            return 0
+        stale_ids = self.backend.ids_for_sources(filepaths)
+        if stale_ids:
+            self.backend.delete(stale_ids)
+            self.bm25.delete(stale_ids)
+            self.metadata.delete(stale_ids)
+            self.changes.record(filepaths)
+        return len(stale_ids)
+
+    def prefilter(self, filters) -> Prefilter:
+        """A Prefilter for filters (see metadata_index.parse_filters), or None without any."""
+        return Prefilter(self.metadata, filters) if filters else None
+
+    def _overfetch(self, lookup, prefilter: Prefilter, top_k: int):
+        """
+        For filters matching too many chunks to list: runs lookup(k) for
+        growing k until top_k of its (id, ...) results pass the filter.
+        """
+        fetch = top_k * 4
+        while True:
+            found = lookup(fetch)
+            allowed = prefilter.check([item[0] for item in found])
+            kept = [item for item in found if item[0] in allowed]
+            if len(kept) >= top_k or len(found) < fetch:
+                return kept[:top_k]
+            fetch *= 4
+
+    def _dense_hits(self, embedding, top_k, prefilter: Prefilter = None):
+        """
+        Dense lookup as an ordered {id: (doc, meta)}. Each meta gets chunk_id
+        and dense_score, the cosine similarity (embeddings are unit-norm).
+        """
+        if prefilter is None:
+            found = self.backend.query(embedding, top_k)
+        elif prefilter.candidates is not None:
+            found = self.backend.query(embedding, top_k, ids=prefilter.candidates)
+        else:
+            found = self._overfetch(lambda k: self.backend.query(embedding, k), prefilter, top_k)
+        hits = {}
+        for doc_id, doc, meta, score in found:
+            meta["chunk_id"] = doc_id
+            meta["dense_score"] = score
+            hits[doc_id] = (doc, meta)
+        return hits
+
+    def _sparse_hits(self, user_query: str, top_k: int, prefilter: Prefilter = None, stats=None):
+        """BM25 (id, score) list, best first, within the filter."""
+        if prefilter is None:
+            return self.bm25.search(user_query, top_k=top_k, stats=stats)
+        if prefilter.candidates is not None:
+            return self.bm25.search(user_query, top_k=top_k, stats=stats, ids=prefilter.candidates)
+        return self._overfetch(lambda k: self.bm25.search(user_query, top_k=k, stats=stats), prefilter, top_k)
+
+    def search(self, embedding, top_k=5, filters=None):
+        return list(self._dense_hits(embedding[0], top_k, self.prefilter(filters)).values())
+
+    def hybrid_search(
+        self, user_query: str, query_embedding: list, top_k: int = 10, rrf_k: int = 60,
+        timer: StageTimer = None, filters: dict = None
+    ):
+        """
+        One dense ANN lookup plus one BM25 lookup, merged with reciprocal rank
+        fusion. Chunks found only by BM25 are fetched from the backend by id.
+        Returned metadata carries chunk_id, fused_score, and dense_score for
+        chunks the dense lookup found. filters (see parse_filters) are applied
+        inside both lookups. timer gets dense_search and sparse_search (BM25
+        plus the fetch of sparse-only chunks).
+        """
+        timer = timer or StageTimer(metrics=None)
+        prefilter = self.prefilter(filters)
+        with timer.stage("dense_search"):
+            found = self._dense_hits(query_embedding, top_k, prefilter)
+        with timer.stage("sparse_search"):
+            sparse_ids = [doc_id for doc_id, _ in self._sparse_hits(user_query, top_k, prefilter)]
+
+        fused = reciprocal_rank_fusion([list(found), sparse_ids], k=rrf_k)[:top_k]
+        missing = [doc_id for doc_id, _ in fused if doc_id not in found]
+        if missing:
+            with timer.stage("sparse_search"):
+                sparse_only = self.backend.get(missing)
+            for doc_id, doc, meta in sparse_only:
+                meta["chunk_id"] = doc_id
+                found[doc_id] = (doc, meta)
         merged = []
-        for doc, meta in dense_docs + sparse_docs:
-            if doc not in seen:
-                seen.add(doc)
-                merged.append((doc, meta))
-            if len(merged) >= top_k:
-                break
+        for doc_id, score in fused:
+            if doc_id in found:
+                found[doc_id][1]["fused_score"] = score
+                merged.append(found[doc_id])
         return merged
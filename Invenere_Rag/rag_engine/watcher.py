@@ -0,0 +1,305 @@
+# rag_engine/watcher.py
+
+import heapq
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from rag_engine.indexer import incremental_index, sync_files
+from rag_engine.manifest import Manifest
+from rag_engine.parser import SUPPORTED_EXTS, discover_files
+from rag_engine.timing import StageTimer
+
+def is_watched(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.lower().endswith(SUPPORTED_EXTS) and not name.startswith("~$")
+
+class ChangeQueue:
+    """
+    Debounced, prioritized set of changed paths, fed by a watcher thread.
+    A path is ready once no event has touched it for `debounce` seconds, so
+    a burst of saves becomes one re-index. Ready paths come out deletions
+    first (stale results disappear quickly), then smallest files first.
+    Past max_pending paths, individual paths are dropped and a full rescan
+    is requested instead, which bounds memory while indexing falls behind.
+    """
+
+    def __init__(self, debounce: float = 2.0, max_pending: int = 10_000):
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self._pending: Dict[str, float] = {}  # path -> time of its last event
+        self._rescan = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def push(self, path: str):
+        with self._cond:
+            if self._rescan:
+                return
+            if path not in self._pending and len(self._pending) >= self.max_pending:
+                print(f"More than {self.max_pending} pending changes; falling back to a full rescan.")
+                self._pending.clear()
+                self._rescan = True
+            else:
+                self._pending[path] = time.monotonic()
+            self._cond.notify()
+
+    def request_rescan(self):
+        with self._cond:
+            self._pending.clear()
+            self._rescan = True
+            self._cond.notify()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def wait_ready(self, max_items: int, timeout: Optional[float] = None) -> Tuple[List[str], bool]:
+        """
+        Blocks until paths are ready, a rescan is requested or timeout
+        elapses. Returns (up to max_items paths, rescan).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._rescan:
+                    self._rescan = False
+                    return [], True
+                now = time.monotonic()
+                ready = [p for p, t in self._pending.items() if now - t >= self.debounce]
+                if ready:
+                    chosen = heapq.nsmallest(max_items, ready, key=_priority)
+                    for path in chosen:
+                        del self._pending[path]
+                    return chosen, False
+                wait = None
+                if self._pending:
+                    wait = min(self._pending.values()) + self.debounce - now
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return [], False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+def _priority(path: str) -> Tuple[int, int]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (0, 0)  # Gone: deleting its chunks is cheap and removes stale results
+    return (1, 0 if os.path.isdir(path) else stat.st_size)
+
+class PollingWatcher:
+    """
+    Finds changes by re-walking the roots every `interval` seconds and
+    comparing (mtime, size); used where watchdog/inotify is unavailable.
+    """
+
+    def __init__(self, roots: Iterable[str], on_change: Callable[[str], None], interval: float = 5.0):
+        self.roots = list(roots)
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _snapshot(self) -> Dict[str, Tuple[float, int]]:
+        snapshot = {}
+        for file_path in discover_files(self.roots):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def _run(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.interval):
+            current = self._snapshot()
+            for file_path, signature in current.items():
+                if previous.get(file_path) != signature:
+                    self.on_change(file_path)
+            for file_path in previous.keys() - current.keys():
+                self.on_change(file_path)
+            previous = current
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="invenere-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+class WatchdogWatcher:
+    """
+    Filesystem events from watchdog (inotify on Linux, FSEvents on macOS,
+    ReadDirectoryChangesW on Windows). Directory events are passed on as the
+    directory path; the indexer rescans that subtree, since moving a folder
+    in or out produces no per-file events.
+    """
+
+    def __init__(self, roots: Iterable[str], on_change: Callable[[str], None]):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                if event.is_directory and event.event_type == "modified":
+                    return  # Fires for every change inside; the file events cover it
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path and (event.is_directory or is_watched(path)):
+                        watcher.on_change(os.fsdecode(path))
+
+        self.on_change = on_change
+        self.observer = Observer()
+        for root in roots:
+            self.observer.schedule(Handler(), str(Path(root).expanduser()), recursive=True)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+def make_watcher(
+    roots: Iterable[str],
+    on_change: Callable[[str], None],
+    poll_interval: float = 5.0,
+    force_polling: bool = False
+):
+    """
+    A watchdog-based watcher when the package is installed, else polling.
+    """
+    roots = list(roots)
+    if not force_polling:
+        try:
+            return WatchdogWatcher(roots, on_change)
+        except ImportError:
+            print("watchdog is not installed; polling for changes instead (pip install watchdog).")
+        except OSError as e:  # e.g. inotify watch limit reached
+            print(f"Filesystem events unavailable ({e}); polling for changes instead.")
+    return PollingWatcher(roots, on_change, interval=poll_interval)
+
+class WatchIndexer:
+    """
+    Keeps the collection in sync with the roots: one catch-up incremental
+    pass at start, then changed paths from the watcher are debounced and
+    indexed in small rounds through sync_files (parse -> chunk -> embed ->
+    upsert/delete). A round runs to completion before the next is taken, so
+    the bounded ingest queue inside stream_index plus the ChangeQueue cap
+    are the only buffers between the filesystem and the store.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        roots: Iterable[str],
+        manifest: Optional[Manifest] = None,
+        debounce: float = 2.0,
+        max_files_per_round: int = 256,
+        max_pending: int = 10_000,
+        poll_interval: float = 5.0,
+        force_polling: bool = False,
+        **index_options
+    ):
+        self.pipeline = pipeline
+        self.roots = [str(Path(root).expanduser()) for root in roots]
+        self._abs_roots = [os.path.abspath(root) for root in self.roots]
+        self.manifest = manifest or Manifest(os.path.join(pipeline.vector_store.persist_dir, "manifest.json"))
+        self.max_files_per_round = max_files_per_round
+        self.index_options = index_options
+        self.queue = ChangeQueue(debounce=debounce, max_pending=max_pending)
+        self.watcher = make_watcher(self.roots, self.queue.push, poll_interval, force_polling)
+        self._stop = threading.Event()
+
+    def _in_roots(self, path: str) -> bool:
+        if not path:
+            return False
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self._abs_roots)
+
+    def _resolve(self, paths: List[str]) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Turns event paths into a manifest diff. A directory stands for every
+        supported file under it, on disk or in the manifest. Paths outside
+        the roots (e.g. the destination of a move out of them) are ignored:
+        nothing would ever remove what was indexed there.
+        """
+        existing, deleted = set(), set()
+        for path in filter(self._in_roots, paths):
+            if os.path.isdir(path):
+                existing.update(discover_files([path]))
+                deleted.update(p for p in self.manifest.paths_under([path]) if not os.path.exists(p))
+            elif os.path.isfile(path):
+                if is_watched(path):
+                    existing.add(path)
+            else:
+                if self.manifest.get(path):
+                    deleted.add(path)
+                deleted.update(self.manifest.paths_under([path]))  # A removed directory
+        changed, _ = self.manifest.diff(sorted(existing), roots=[])
+        return changed, sorted(deleted)
+
+    def run_once(self, timeout: Optional[float] = None) -> Optional[Dict[str, int]]:
+        """
+        Waits for the next ready round of changes and indexes it. Returns
+        the round's stats, or None if nothing was ready before timeout.
+        Each round is timed and traced as one "index" run.
+        """
+        paths, rescan = self.queue.wait_ready(self.max_files_per_round, timeout=timeout)
+        if rescan:
+            timer = StageTimer("index")
+            stats = incremental_index(
+                self.pipeline, self.roots, manifest=self.manifest, timer=timer, **self.index_options
+            )
+            timer.finish(watch="rescan", **stats)
+            return stats
+        if not paths:
+            return None
+        timer = StageTimer("index")
+        changed, deleted = self._resolve(paths)
+        if not changed and not deleted:
+            return None
+        stats = sync_files(self.pipeline, self.manifest, changed, deleted, timer=timer, **self.index_options)
+        record = timer.finish(watch="round", pending=len(self.queue), **stats)
+        print(f"[watch] {stats['files']} files re-indexed ({stats['chunks']} chunks), "
+              f"{stats['deleted_files']} removed in {record['wall_ms'] / 1000:.1f}s; "
+              f"{record['pending']} changes pending.")
+        return stats
+
+    def run(self):
+        """
+        Catch-up pass, then index changes until stop() is called.
+        """
+        # Start watching first so edits made during the catch-up pass are not missed
+        self.watcher.start()
+        print(f"Catching up on changes under: {', '.join(self.roots)}")
+        incremental_index(self.pipeline, self.roots, manifest=self.manifest, **self.index_options)
+        print("Watching for changes (Ctrl+C to stop)...")
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_once(timeout=1.0)
+                except Exception as e:
+                    print(f"[watch] round failed, rescanning: {e}")
+                    self.queue.request_rescan()
+                    self._stop.wait(5.0)
+        finally:
+            self.watcher.stop()
+            self.pipeline.flush()
+
+    def stop(self):
+        self._stop.set()
+        self.queue.wake()
@@ -0,0 +1,21 @@
+import os
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import argparse
+
+from rag_engine.model_registry import MODELS
+from rag_engine.rag_pipeline import preload_models
+
+# Saves local copies of the models for warm starts; then run the tools with
+#   INVENERE_MODEL_DIR=<model_dir>
+# to load them from these safetensors files instead of the Hugging Face cache.
+parser = argparse.ArgumentParser(description="Save local copies of the Invenere models for warm starts.")
+parser.add_argument("model_dir", help="Directory to save the models into")
+parser.add_argument("--embed-model", default="all-MiniLM-L6-v2")
+parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+args = parser.parse_args()
+
+MODELS.model_dir = None  # Load the originals, not earlier copies
+preload_models(args.embed_model, args.rerank_model)
+for path in MODELS.save_local(args.model_dir):
+    print(f"✅ Saved {path}")
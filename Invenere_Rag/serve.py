@@ -0,0 +1,226 @@
+import os
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import asyncio
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from rag_engine.metadata_index import parse_filters
+from rag_engine.rag_pipeline import RAGPipeline, preload_models
+from rag_engine.timing import METRICS, StageTimer
+
+# Run with:  uvicorn serve:app --workers 4 --port 8000
+# Each uvicorn worker process loads the models once, at startup. To load them
+# once for all workers instead, pre-fork with INVENERE_PRELOAD_MODELS=1:
+#   INVENERE_PRELOAD_MODELS=1 gunicorn serve:app --preload -w 4 -k uvicorn.workers.UvicornWorker -b :8000
+# The workers then share the weights copy-on-write. $INVENERE_MODEL_DIR (see
+# save_models.py) loads them from local safetensors copies.
+CPU_WORKERS = int(os.environ.get("INVENERE_CPU_WORKERS", os.cpu_count() or 4))
+MAX_QUEUED = int(os.environ.get("INVENERE_MAX_QUEUED", 64))
+STREAM_WORKERS = int(os.environ.get("INVENERE_STREAM_WORKERS", 32))
+MICRO_BATCH_MS = float(os.environ.get("INVENERE_MICRO_BATCH_MS", 5))
+CORS_ORIGINS = os.environ.get("INVENERE_CORS_ORIGINS", "http://localhost:5173").split(",")
+PIPELINE_OPTIONS = {
+    name: os.environ[env] for name, env in (
+        ("embed_model", "INVENERE_EMBED_MODEL"),
+        ("rerank_model", "INVENERE_RERANK_MODEL"),
+        ("llm_model", "INVENERE_LLM_MODEL"),
+        ("persist_dir", "INVENERE_PERSIST_DIR"),
+        # Hugging Face tokenizer matching the LLM, for exact prompt budgets
+        ("tokenizer_name", "INVENERE_TOKENIZER"),
+    ) if env in os.environ
+}
+
+if os.environ.get("INVENERE_PRELOAD_MODELS"):
+    # Imported in the parent before forking (gunicorn --preload); no inference runs here
+    preload_models(
+        **{name: PIPELINE_OPTIONS[name] for name in ("embed_model", "rerank_model") if name in PIPELINE_OPTIONS},
+        freeze=True
+    )
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 10
+    final_k: int = 5
+    use_hybrid: bool = True
+    rerank_budget_ms: Optional[float] = None
+    # e.g. {"ext": {"$in": [".pdf", ".docx"]}, "source_dir": {"$under": "/docs/specs"}}
+    filters: Optional[dict] = None
+
+class AnswerRequest(SearchRequest):
+    history: list[tuple[str, str]] = []
+
+class BoundedExecutor:
+    """
+    Runs blocking calls on a fixed thread pool and refuses work once
+    max_queued calls are waiting, so a burst gets fast 503s instead of an
+    ever-growing queue in front of the models.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="invenere-cpu")
+        self.slots = asyncio.Semaphore(workers + max_queued)
+
+    async def run(self, fn, *args, **kwargs):
+        if self.slots.locked():
+            raise HTTPException(status_code=503, detail="Search service is busy, retry shortly")
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, lambda: fn(*args, **kwargs))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.pipeline = RAGPipeline(
+        read_only=True, micro_batch_ms=MICRO_BATCH_MS or None, answer_cache=True, preload=True, **PIPELINE_OPTIONS
+    )
+    app.state.cpu = BoundedExecutor(CPU_WORKERS, MAX_QUEUED)
+    # LLM streams mostly wait on the network; they get their own threads so
+    # they never hold a CPU slot
+    app.state.streams = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="invenere-llm")
+    yield
+    app.state.cpu.pool.shutdown()
+    app.state.streams.shutdown()
+
+app = FastAPI(title="Invenere search service", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["*"], allow_headers=["*"])
+
+def relevance(score: float) -> float:
+    # Cross-encoder scores are logits; squash them for display
+    return 0.0 if score == float("-inf") else 1.0 / (1.0 + math.exp(-score))
+
+def serialize(chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "text": chunk["text"],
+            "source": chunk["metadata"].get("source", "unknown"),
+            "metadata": chunk["metadata"],
+            "score": None if chunk["score"] == float("-inf") else float(chunk["score"]),
+            "relevance": relevance(float(chunk["score"])),
+        }
+        for chunk in chunks
+    ]
+
+async def retrieve(request: SearchRequest, history=None, timer: StageTimer = None) -> list[dict]:
+    pipeline = app.state.pipeline
+    try:
+        parse_filters(request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await app.state.cpu.run(
+        pipeline.retrieve, request.query, top_k=request.top_k, final_k=request.final_k,
+        use_hybrid=request.use_hybrid, history=history, rerank_budget_ms=request.rerank_budget_ms,
+        timer=timer, filters=request.filters
+    )
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """
+    Retrieval only: ranked chunks with metadata and scores, no generation.
+    """
+    timer = StageTimer("search")
+    chunks = await retrieve(request, timer=timer)
+    timer.finish(endpoint="search", results=len(chunks))
+    return {"query": request.query, "results": serialize(chunks)}
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    """
+    Server-sent events: one "sources" event, then "token" events as the LLM
+    produces them, then "done" (or "error"). Answers served from the semantic
+    answer cache arrive as a single token, with "cached": true on "done".
+    """
+    history = [tuple(turn) for turn in request.history]
+    pipeline = app.state.pipeline
+    timer = StageTimer("answer")
+    hit, cache_key = await app.state.cpu.run(
+        pipeline.cached_answer, request.query, history, timer=timer, filters=request.filters,
+        top_k=request.top_k, final_k=request.final_k, use_hybrid=request.use_hybrid,
+        rerank_budget_ms=request.rerank_budget_ms
+    )
+    if hit is not None:
+        timer.finish(endpoint="answer", cached=True)
+        async def cached_events():
+            yield sse("sources", [{"source": source} for source in hit["sources"]])
+            yield sse("token", {"token": hit["answer"]})
+            yield sse("done", {"cached": True})
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    chunks = await retrieve(request, history=history, timer=timer)
+    prompt = pipeline.build_prompt(request.query, chunks, history=history, timer=timer)
+    sources = [chunk["metadata"].get("source", "unknown") for chunk in chunks]
+    loop = asyncio.get_running_loop()
+    tokens: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    end = object()
+
+    def produce():
+        generated = pipeline.generate(prompt, stream=True, timer=timer)
+        try:
+            answer_tokens = pipeline.remember_answer(cache_key, request.query, generated, sources)
+            for token in answer_tokens:
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(tokens.put_nowait, token)
+        except Exception as e:
+            loop.call_soon_threadsafe(tokens.put_nowait, e)
+        finally:
+            generated.close()  # Records llm_total now, also when the client left early
+            timer.finish(endpoint="answer", cached=False, cancelled=cancelled.is_set())
+            loop.call_soon_threadsafe(tokens.put_nowait, end)
+
+    async def events():
+        yield sse("sources", serialize(chunks))
+        app.state.streams.submit(produce)
+        try:
+            while True:
+                item = await tokens.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    yield sse("error", {"detail": str(item)})
+                    break
+                yield sse("token", {"token": item})
+            yield sse("done", {})
+        finally:
+            cancelled.set()  # Client went away: stop pulling from the LLM
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/status")
+async def status():
+    """
+    Index status: chunk counts, index layout and the cache hit rates.
+    """
+    pipeline = app.state.pipeline
+    store = pipeline.vector_store
+    stats = await app.state.cpu.run(store.stats)
+    manifest_path = os.path.join(store.persist_dir, "manifest.json")
+    return {
+        "chunks": stats.pop("chunks"),
+        "bm25_chunks": stats.pop("lexical_chunks"),
+        **stats,  # vector_backend, and the shard layout for sharded stores
+        "manifest_updated": os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None,
+        "embedding_cache": pipeline.embedder.cache.stats() if pipeline.embedder.cache else None,
+        "reranker_cache": {"hits": pipeline.reranker.cache_hits, "misses": pipeline.reranker.cache_misses},
+        "answer_cache": pipeline.answer_cache.stats() if pipeline.answer_cache else None,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Per-stage latency histograms and counters in the Prometheus text format.
+    Each uvicorn worker keeps its own registry, so with --workers > 1 a
+    scrape sees one worker's share.
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Tests import rag_engine and benchmarks the way the scripts do, from Invenere_Rag/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
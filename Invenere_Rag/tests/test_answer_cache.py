@@ -0,0 +1,16 @@
+# tests/test_answer_cache.py
+
+import numpy as np
+
+from rag_engine.answer_cache import SemanticAnswerCache
+
+def test_answers_are_partitioned_by_retrieval_settings():
+    cache = SemanticAnswerCache()
+    vector = np.ones(8, dtype=np.float32)
+    cache.store(vector, "question", "top five", ["/a"], (10, 5, True, None))
+    assert cache.lookup(vector, (10, 5, True, None))["answer"] == "top five"
+    assert cache.lookup(vector, (10, 3, True, None)) is None
+    assert cache.lookup(vector, (10, 5, False, None)) is None
+    cache.store(vector, "question", "top three", ["/a"], (10, 3, True, None))
+    assert cache.lookup(vector, (10, 3, True, None))["answer"] == "top three"
+    assert cache.lookup(vector, (10, 5, True, None))["answer"] == "top five"
@@ -0,0 +1,38 @@
+# tests/test_chunker.py
+
+import pytest
+
+from rag_engine.chunker import DEFAULT_MAX_TOKENS, iter_chunks
+
+MAX_CHARS = 4 * DEFAULT_MAX_TOKENS
+RUNS = {
+    "base64": "QUJD" * 5000,
+    "cjk": "漢字" * 5000,
+    "url": "https://example.com/" + "a" * 8000,
+}
+
+@pytest.mark.parametrize("kind", sorted(RUNS))
+def test_long_run_in_heading_section_is_cut(kind):
+    text = "# Intro\nSome intro text.\n# Data\n" + RUNS[kind] + "\n# End\nThe end."
+    chunks = list(iter_chunks(text))
+    assert max(len(c["text"]) for c in chunks) <= MAX_CHARS
+    assert [c["metadata"]["heading"] for c in chunks][-1] == "# End"
+
+@pytest.mark.parametrize("kind", sorted(RUNS))
+def test_long_run_without_headings_is_cut(kind):
+    text = "A short sentence first. " + RUNS[kind] + " And a tail."
+    chunks = list(iter_chunks(text))
+    assert max(len(c["text"]) for c in chunks) <= 350
+    # Every character of the run ends up in some chunk
+    covered = set()
+    for c in chunks:
+        covered.update(range(c["metadata"]["chunk_start"], c["metadata"]["chunk_end"]))
+    start = text.index(RUNS[kind])
+    assert covered >= set(range(start, start + len(RUNS[kind])))
+
+def test_prose_chunks_keep_their_offsets():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    for chunk in iter_chunks(text):
+        meta = chunk["metadata"]
+        assert text[meta["chunk_start"]:meta["chunk_end"]] == chunk["text"]
+        assert len(chunk["text"]) <= 350
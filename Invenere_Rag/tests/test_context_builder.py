@@ -0,0 +1,28 @@
+# tests/test_context_builder.py
+
+from rag_engine.context_builder import ContextBuilder
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliett kilo lima mike november oscar papa".split()
+
+def chunk(start: int, end: int, source: str = "/docs/a.txt") -> dict:
+    # Distinct text per span, so only the span check can call them duplicates
+    text = " ".join(f"{WORDS[(start + i) % len(WORDS)]}{start}x{i}" for i in range(40))
+    return {"text": text, "metadata": {"source": source, "chunk_start": start, "chunk_end": end}}
+
+def test_neighbouring_chunks_with_small_overlap_are_kept():
+    chunks = [chunk(0, 155), chunk(106, 366), chunk(321, 612), chunk(563, 760)]
+    _, report = ContextBuilder().build("alpha", chunks, budget_tokens=10_000)
+    assert report["chunks_used"] == 4
+    assert report["dropped_duplicate"] == 0
+
+def test_mostly_overlapping_windows_are_duplicates():
+    chunks = [chunk(0, 400), chunk(50, 380), chunk(200, 600), chunk(400, 800, source="/docs/b.txt")]
+    _, report = ContextBuilder().build("alpha", chunks, budget_tokens=10_000)
+    assert report["dropped_duplicate"] == 2  # Contained, then half covered
+    assert report["chunks_used"] == 2
+
+def test_sentence_spans_are_inclusive():
+    first = {"text": "one two three four", "metadata": {"source": "/a", "chunk_start_sentence": 0, "chunk_end_sentence": 1}}
+    second = {"text": "five six seven eight", "metadata": {"source": "/a", "chunk_start_sentence": 1, "chunk_end_sentence": 1}}
+    _, report = ContextBuilder(min_chunk_tokens=1).build("one", [first, second], budget_tokens=1_000)
+    assert report["dropped_duplicate"] == 1
@@ -0,0 +1,67 @@
+# tests/test_llama_interface.py
+
+import socket
+
+import pytest
+
+from benchmarks.stub_ollama import ERROR, ERROR_MODEL, REPLY, start_stub_server
+from rag_engine.llama_interface import LLM_ERRORS, OllamaClient, OllamaError
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_server_down_raises_an_llm_error():
+    # query.py and app.py catch LLM_ERRORS around the stream to keep the session alive
+    client = OllamaClient(host=f"http://127.0.0.1:{free_port()}", connect_timeout=1.0)
+    with pytest.raises(LLM_ERRORS):
+        list(client.generate_stream("hello"))
+    with pytest.raises(LLM_ERRORS):
+        client.generate("hello")
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_server()
+    yield server, url
+    server.shutdown()
+
+def test_streaming_yields_the_whole_answer(stub):
+    _, url = stub
+    assert "".join(OllamaClient(model="stub", host=url).generate_stream("hello")).strip() == REPLY
+
+def test_non_streaming_call_returns_the_answer(stub):
+    _, url = stub
+    assert OllamaClient(model="stub", host=url).generate("hello") == REPLY
+
+def test_sequential_calls_reuse_one_connection(stub):
+    server, url = stub
+    client = OllamaClient(model="stub", host=url)
+    for _ in range(5):
+        client.generate("again")
+        list(client.generate_stream("again"))
+    assert server.requests == 10
+    assert server.connections == 1
+
+def test_abandoned_stream_is_not_reused(stub):
+    server, url = stub
+    client = OllamaClient(model="stub", host=url)
+    stream = client.generate_stream("stop early")
+    next(stream)
+    stream.close()  # The rest of the response is unread
+    assert client.generate("next") == REPLY
+    assert server.connections == 2
+
+def test_error_event_in_a_stream_raises(stub):
+    server, url = stub
+    client = OllamaClient(model=ERROR_MODEL, host=url)
+    tokens = []
+    with pytest.raises(OllamaError, match=ERROR):
+        tokens.extend(client.generate_stream("hello"))
+    assert len(tokens) == 1
+    assert client._pool.empty()  # The failed stream's connection was closed
+
+def test_error_reply_raises(stub):
+    _, url = stub
+    with pytest.raises(OllamaError, match=ERROR):
+        OllamaClient(model=ERROR_MODEL, host=url).generate("hello")
@@ -0,0 +1,26 @@
+# tests/test_metadata_index.py
+
+import datetime
+
+import pytest
+
+from rag_engine.metadata_index import parse_filters
+
+def epoch(*date) -> int:
+    return int(datetime.datetime(*date).timestamp())
+
+def test_iso_dates_in_modified_lists_are_converted():
+    conditions = parse_filters({"modified": {"$in": ["2024-01-01", datetime.date(2024, 2, 1)]}})
+    assert conditions == [("modified", "$in", [epoch(2024, 1, 1), epoch(2024, 2, 1)])]
+    assert parse_filters({"modified": {"$nin": ["2024-03-01T12:00:00"]}}) == [
+        ("modified", "$nin", [epoch(2024, 3, 1, 12)])
+    ]
+
+@pytest.mark.parametrize("op", ["$prefix", "$under"])
+def test_string_operators_are_rejected_on_modified(op):
+    with pytest.raises(ValueError, match="modified"):
+        parse_filters({"modified": {op: "2024"}})
+
+def test_invalid_modified_date_is_reported():
+    with pytest.raises(ValueError, match="ISO date"):
+        parse_filters({"modified": {"$gte": "last week"}})
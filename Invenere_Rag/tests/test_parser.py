@@ -0,0 +1,45 @@
+# tests/test_parser.py
+
+from pathlib import Path
+
+import pytest
+
+from rag_engine import parser
+from rag_engine.extraction import extract_pages
+
+@pytest.fixture
+def files(tmp_path):
+    good = tmp_path / "good.txt"
+    good.write_text("hello world")
+    empty = tmp_path / "empty.md"
+    empty.write_text("")
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    return good, empty, broken
+
+def test_failed_extraction_is_marked_not_empty(files):
+    good, empty, broken = files
+    pages = dict(extract_pages([str(good), str(empty), str(broken)], workers=2))
+    assert pages[str(good)] == ["hello world"]
+    assert pages[str(empty)] == [""]  # A document without text...
+    assert pages[str(broken)] is None  # ...is not a failure, which callers retry
+
+def test_iter_documents_reports_failed_files(files):
+    good, empty, broken = files
+    failed = []
+    documents = list(parser.iter_documents([str(good), str(empty), str(broken)], on_failed=failed.append))
+    assert [(path, text) for path, text, _ in documents] == [(str(good), "hello world")]
+    assert failed == [str(broken)]
+
+def test_extract_text_raises_instead_of_returning_nothing(files, tmp_path):
+    _, _, broken = files
+    with pytest.raises(Exception):
+        parser.extract_text(str(broken))
+    with pytest.raises(ValueError, match="Unsupported"):
+        parser.extract_text(str(tmp_path / "notes.xyz"))
+
+def test_load_documents_from_desktop_returns_pairs(tmp_path, monkeypatch):
+    (tmp_path / "Desktop").mkdir()
+    (tmp_path / "Desktop" / "a.txt").write_text("alpha")
+    monkeypatch.setattr(Path, "home", classmethod(lambda cls: tmp_path))
+    assert parser.load_documents_from_desktop() == [(str(tmp_path / "Desktop" / "a.txt"), "alpha")]
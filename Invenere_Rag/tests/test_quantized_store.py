@@ -0,0 +1,22 @@
+# tests/test_quantized_store.py
+
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from rag_engine.quantized_store import QuantizedBackend
+
+def vectors(n: int) -> np.ndarray:
+    return np.random.default_rng(n).random((n, 8), dtype=np.float32)
+
+def test_failed_add_is_rolled_back(tmp_path):
+    backend = QuantizedBackend(str(tmp_path))
+    backend.add(["a"], vectors(1), ["alpha"], [{"source": "/a"}])
+    with pytest.raises(sqlite3.IntegrityError):
+        backend.add(["b", "a"], vectors(2), ["beta", "again"], [{"source": "/b"}, {"source": "/a"}])
+    assert backend.count() == 1
+    assert os.path.getsize(os.path.join(backend.dir, "vectors.0")) == 8 * 4  # Partial append cut off
+    backend.add(["c"], vectors(1), ["gamma"], [{"source": "/c"}])
+    assert sorted(backend.get(["a", "b", "c"])) == [("a", "alpha", {"source": "/a"}), ("c", "gamma", {"source": "/c"})]
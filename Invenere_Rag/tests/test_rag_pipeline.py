@@ -0,0 +1,8 @@
+# tests/test_rag_pipeline.py
+
+from rag_engine.context_builder import APPROXIMATE_BUDGET_SHARE
+from rag_engine.rag_pipeline import RAGPipeline
+
+def test_estimated_token_counts_keep_a_margin(tmp_path):
+    pipeline = RAGPipeline(persist_dir=str(tmp_path), embedder=object(), reranker=object(), num_ctx=4096, answer_tokens=768)
+    assert pipeline.prompt_budget == int((4096 - 768) * APPROXIMATE_BUDGET_SHARE)
@@ -0,0 +1,14 @@
+# tests/test_reranker.py
+
+from rag_engine.reranker import Reranker
+
+def test_cached_scores_follow_the_passage_text(monkeypatch):
+    reranker = Reranker(min_dense_score=None)
+    # Stand-in for the cross-encoder: longer passages score higher
+    monkeypatch.setattr(reranker, "_predict", lambda pairs: [float(len(passage)) for _, passage in pairs])
+    meta = {"chunk_id": "/docs/a.txt_0", "source": "/docs/a.txt"}
+    assert reranker.rerank("query", [("old text", dict(meta))], top_n=1)[0][2] == len("old text")
+    # Same chunk id after a re-index, new text: scored again, not served from the cache
+    assert reranker.rerank("query", [("the new, longer text", dict(meta))], top_n=1)[0][2] == len("the new, longer text")
+    assert reranker.rerank("query", [("old text", dict(meta))], top_n=1)[0][2] == len("old text")
+    assert (reranker.cache_hits, reranker.cache_misses) == (1, 2)
@@ -0,0 +1,29 @@
+# tests/test_sharded_store.py
+
+import numpy as np
+import pytest
+
+from rag_engine.sharded_store import ShardedVectorStore
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    base = tmp_path_factory.mktemp("sharded")
+    roots = [str(base / "alpha"), str(base / "beta")]
+    store = ShardedVectorStore(str(base / "store"), partition="root", roots=roots)
+    rng = np.random.default_rng(0)
+    texts = ["quantum annealing schedules", "annealing of steel beams", "lunch menu for friday", "friday team meeting"]
+    sources = [f"{roots[0]}/a.txt", f"{roots[0]}/b.txt", f"{roots[1]}/c.txt", f"{roots[1]}/d.txt"]
+    metadatas = [{"chunk_index": 0} for _ in texts]
+    store.add(rng.random((len(texts), 8), dtype=np.float32), texts, sources, metadatas)
+    yield store
+    store.close()
+
+def test_hybrid_search_when_one_shard_has_no_sparse_hits(store):
+    # Only the first shard has "annealing"; the second must not fail its BM25 round
+    results = store.hybrid_search("annealing", np.ones(8, dtype=np.float32), top_k=4)
+    assert len(results) == 4
+    assert {doc for doc, _ in results[:2]} == {"quantum annealing schedules", "annealing of steel beams"}
+
+def test_hybrid_search_when_no_shard_has_sparse_hits(store):
+    results = store.hybrid_search("zeppelin", np.ones(8, dtype=np.float32), top_k=4)
+    assert len(results) == 4  # Dense hits only
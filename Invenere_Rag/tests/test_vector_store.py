@@ -0,0 +1,47 @@
+# tests/test_vector_store.py
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+from rag_engine.vector_backends import ChromaBackend
+from rag_engine.vector_store import VectorStore
+
+def test_refresh_reloads_at_most_once_per_reload_interval(tmp_path):
+    writer = VectorStore(persist_dir=str(tmp_path))
+    reader = VectorStore(persist_dir=str(tmp_path), read_only=True)
+    writer.changes.record(["/a.txt"])
+    assert reader.refresh(0, reload_interval=60)
+    writer.changes.record(["/b.txt"])
+    assert not reader.refresh(0, reload_interval=60)  # Seen, but too soon after the last reload
+    reader._next_reload = 0.0
+    assert reader.refresh(0, reload_interval=60)
+    assert not reader.refresh(0, reload_interval=0)  # Nothing new
+
+def test_chroma_reopen_keeps_other_clients(tmp_path):
+    from chromadb.api.client import SharedSystemClient
+
+    first, second = ChromaBackend(str(tmp_path / "one")), ChromaBackend(str(tmp_path / "two"))
+    first.add(["a"], np.ones((1, 4), dtype=np.float32), ["alpha"], [{"source": "/a"}])
+    second.count()
+    system = SharedSystemClient._identifier_to_system[second.client._identifier]
+    first.reopen()
+    assert SharedSystemClient._identifier_to_system[second.client._identifier] is system
+    assert first.count() == 1 and second.count() == 0
+
+def test_read_only_store_opens_sqlite_indexes_read_only(tmp_path):
+    writer = VectorStore(persist_dir=str(tmp_path))
+    writer.bm25.add(["/a.txt_0"], ["alpha beta"])
+    writer.metadata.add(["/a.txt_0"], [{"source": "/a.txt"}])
+    writer.changes.record(["/a.txt"])
+    reader = VectorStore(persist_dir=str(tmp_path), read_only=True)
+    assert (reader.bm25.count(), reader.metadata.count(), reader.changes.latest()) == (1, 1, 1)
+    for index in (reader.bm25, reader.metadata, reader.changes):
+        assert index.read_only
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        reader.bm25.add(["/b.txt_0"], ["gamma"])
+
+def test_read_only_store_on_a_fresh_directory_still_opens(tmp_path):
+    reader = VectorStore(persist_dir=str(tmp_path / "new"), read_only=True)
+    assert reader.count() == 0
@@ -0,0 +1,20 @@
+# tests/test_watcher.py
+
+from types import SimpleNamespace
+
+from rag_engine.watcher import WatchIndexer
+
+def make_indexer(tmp_path, root):
+    pipeline = SimpleNamespace(vector_store=SimpleNamespace(persist_dir=str(tmp_path)))
+    return WatchIndexer(pipeline, [str(root)], force_polling=True)
+
+def test_events_outside_the_roots_are_ignored(tmp_path):
+    root, outside, sibling = tmp_path / "docs", tmp_path / "elsewhere", tmp_path / "docs-old"
+    for folder in (root, outside, sibling):
+        folder.mkdir()
+        (folder / "note.txt").write_text("text")
+    indexer = make_indexer(tmp_path, root)
+    # e.g. src and dest_path of a move out of the root, and a prefix-named sibling
+    changed, deleted = indexer._resolve([str(root / "note.txt"), str(outside / "note.txt"), str(sibling / "note.txt"), ""])
+    assert list(changed) == [str(root / "note.txt")]
+    assert deleted == []
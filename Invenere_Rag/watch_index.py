@@ -0,0 +1,56 @@
+import os
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import argparse
+import signal
+
+from rag_engine.extraction import ExtractionCache
+from rag_engine.parser import default_roots
+from rag_engine.rag_pipeline import RAGPipeline
+from rag_engine.vector_backends import BACKENDS
+from rag_engine.watcher import WatchIndexer
+
+# Query processes (app.py, serve.py, query.py) open the store read-only and
+# reopen the collection when this daemon writes, so they keep serving while it
+# indexes. Run only one writer (this or index_documents.py) at a time.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Keep the Invenere index in sync with a set of folders.")
+    parser.add_argument("roots", nargs="*", help="Directories to watch (default: $INVENERE_ROOTS or ~/Desktop)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Seconds a file must be quiet before indexing")
+    parser.add_argument("--max-files", type=int, default=256, help="Files indexed per round")
+    parser.add_argument("--max-pending", type=int, default=10_000,
+                        help="Pending changes before falling back to a full rescan")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using filesystem events")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between polls")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Embedding processes")
+    parser.add_argument("--extract-timeout", type=float, default=120.0, help="Seconds allowed to extract one file")
+    parser.add_argument("--extract-memory-mb", type=int, default=2048, help="Memory per extraction worker (0: no limit)")
+    parser.add_argument("--extraction-cache", default="./extraction_cache",
+                        help="Cache directory for extracted PDF/DOCX text ('' to disable)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="Dense index for a new store (default: chroma); existing stores keep theirs")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    roots = args.roots or default_roots()
+    pipeline = RAGPipeline(embed_workers=args.embed_workers, vector_backend=args.backend)
+    indexer = WatchIndexer(
+        pipeline, roots,
+        debounce=args.debounce, max_files_per_round=args.max_files, max_pending=args.max_pending,
+        poll_interval=args.poll_interval, force_polling=args.poll,
+        workers=args.workers, batch_size=args.batch_size,
+        extraction_cache=ExtractionCache(args.extraction_cache) if args.extraction_cache else None,
+        extract_timeout=args.extract_timeout, extract_memory_mb=args.extract_memory_mb or None
+    )
+    signal.signal(signal.SIGTERM, lambda *_: indexer.stop())
+    try:
+        indexer.run()
+    except KeyboardInterrupt:
+        indexer.stop()
+    finally:
+        pipeline.embedder.close()
+    print("\nWatcher stopped.")